@@ -0,0 +1,245 @@
+import math
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import httpx
+from flask import jsonify, request
+
+import metrics
+from ttl_cache import TTLCache
+
+# Per-user budgets, in requests per second with a burst allowance (a rate of 0 disables the limit).
+# Reads are GET/HEAD; everything else spends the separate, smaller write budget.
+READ_RATE = float(os.getenv('RATE_LIMIT_READ_RATE', 20))
+READ_BURST = float(os.getenv('RATE_LIMIT_READ_BURST', 60))
+WRITE_RATE = float(os.getenv('RATE_LIMIT_WRITE_RATE', 2))
+WRITE_BURST = float(os.getenv('RATE_LIMIT_WRITE_BURST', 20))
+RATE_LIMIT_MAX_USERS = int(os.getenv('RATE_LIMIT_MAX_USERS', 10000))
+
+# Supabase calls allowed in flight at once from this worker (0 disables the limit). Callers beyond
+# that wait up to UPSTREAM_QUEUE_TIMEOUT_MS, and are refused outright once UPSTREAM_MAX_QUEUE wait.
+UPSTREAM_MAX_CONCURRENCY = int(os.getenv('UPSTREAM_MAX_CONCURRENCY', 32))
+UPSTREAM_MAX_QUEUE = int(os.getenv('UPSTREAM_MAX_QUEUE', 64))
+UPSTREAM_QUEUE_TIMEOUT = float(os.getenv('UPSTREAM_QUEUE_TIMEOUT_MS', 500)) / 1000
+
+# Shed a growing share of new /api requests while smoothed upstream latency is above the target
+# (0 disables shedding). Some requests always get through, so the latency estimate keeps updating.
+SHED_TARGET = float(os.getenv('SHED_LATENCY_TARGET_MS', 0)) / 1000
+SHED_MAX_FRACTION = float(os.getenv('SHED_MAX_FRACTION', 0.9))
+RETRY_AFTER = int(os.getenv('ADMISSION_RETRY_AFTER', 2))
+
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Set per request; fanout.gather copies it into worker threads, so a refusal there is seen too
+_request_state: ContextVar = ContextVar('admission', default=None)
+
+
+class UpstreamUnavailable(Exception):
+    """A Supabase call that was refused or failed in a way the client should retry later."""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after or RETRY_AFTER
+
+
+class UpstreamOverloaded(UpstreamUnavailable):
+    """Raised instead of making a Supabase call when too many are already in flight."""
+
+
+# ----------------- Per-user rate limits -----------------
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self):
+        """Spend one token; returns 0 if allowed, otherwise the seconds until one is available."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """Token buckets per (user, read/write). Idle buckets expire once they would be full again."""
+
+    def __init__(self, limits, max_users=10000):
+        self.limits = limits  # kind -> (rate, burst)
+        self.buckets = TTLCache(maxsize=max_users * len(limits), ttl=max(
+            (burst / rate for rate, burst in limits.values() if rate > 0), default=1))
+        self._lock = threading.Lock()
+
+    def check(self, user_id, kind):
+        rate, burst = self.limits[kind]
+        if rate <= 0:
+            return 0
+        key = (user_id, kind)
+        with self._lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                bucket = TokenBucket(rate, max(burst, 1))
+            # Re-set on every use so active users' buckets are never evicted mid-burst
+            self.buckets.set(key, bucket, ttl=bucket.burst / rate)
+        return bucket.take()
+
+
+rate_limiter = RateLimiter({'read': (READ_RATE, READ_BURST), 'write': (WRITE_RATE, WRITE_BURST)},
+                           max_users=RATE_LIMIT_MAX_USERS)
+
+
+def _refused(message, status, retry_after, reason):
+    metrics.ADMISSION_REJECTED.inc(reason)
+    response = jsonify({'message': message, 'retry_after': retry_after})
+    response.status_code = status
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+
+def rate_limit(user_id):
+    """Spend one of the user's tokens for this request; returns a 429 response when they have none."""
+    kind = 'read' if request.method in READ_METHODS else 'write'
+    wait = rate_limiter.check(user_id, kind)
+    if wait:
+        return _refused('Too many requests, slow down', 429, math.ceil(wait), f'rate_limit_{kind}')
+    return None
+
+
+# ----------------- Upstream concurrency -----------------
+class UpstreamLimiter:
+    """A semaphore on in-flight Supabase calls with a bounded, time-limited wait."""
+
+    def __init__(self, limit, max_queue, timeout):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.in_flight = 0
+        self.waiting = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            if self.in_flight < self.limit:
+                self.in_flight += 1
+                return
+            if self.waiting >= self.max_queue:
+                raise UpstreamOverloaded('Too many upstream calls queued')
+            self.waiting += 1
+            try:
+                if not self._condition.wait_for(lambda: self.in_flight < self.limit, timeout=self.timeout):
+                    raise UpstreamOverloaded('Timed out waiting for an upstream slot')
+                self.in_flight += 1
+            finally:
+                self.waiting -= 1
+
+    def release(self):
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify()
+
+
+upstream_limiter = UpstreamLimiter(UPSTREAM_MAX_CONCURRENCY, UPSTREAM_MAX_QUEUE, UPSTREAM_QUEUE_TIMEOUT)
+
+
+# ----------------- Latency-based shedding -----------------
+class LatencyMonitor:
+    """Exponentially weighted moving average of upstream call latency."""
+
+    def __init__(self, alpha=0.1):
+        self.alpha = alpha
+        self.average = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self._lock:
+            self.average += self.alpha * (seconds - self.average)
+
+    def shed_fraction(self, target, maximum):
+        """Share of new requests to refuse: 0 at the target latency, rising to `maximum` at twice it."""
+        if target <= 0 or self.average <= target:
+            return 0.0
+        return min(maximum, (self.average - target) / target)
+
+
+latency_monitor = LatencyMonitor()
+
+
+@contextmanager
+def upstream_slot():
+    """Hold one upstream concurrency slot for a Supabase call, timing it for the shedder."""
+    if UPSTREAM_MAX_CONCURRENCY > 0:
+        try:
+            upstream_limiter.acquire()
+        except UpstreamOverloaded as e:
+            note_unavailable('upstream_overloaded', e.retry_after)
+            raise
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        latency_monitor.observe(time.perf_counter() - start)
+        if UPSTREAM_MAX_CONCURRENCY > 0:
+            upstream_limiter.release()
+
+
+class AdmissionTransport(httpx.BaseTransport):
+    """Makes every PostgREST call through the shared pool wait for an upstream slot."""
+
+    def __init__(self, transport):
+        self._transport = transport
+
+    def handle_request(self, http_request):
+        with upstream_slot():
+            return self._transport.handle_request(http_request)
+
+    def close(self):
+        self._transport.close()
+
+
+# ----------------- Request hooks -----------------
+def note_unavailable(reason, retry_after):
+    """Record that this request lost an upstream call, so its 500 is reported as a 503."""
+    state = _request_state.get()
+    if state is not None and state['unavailable'] is None:
+        state['unavailable'] = (reason, retry_after)
+
+
+def _before_request():
+    _request_state.set({'unavailable': None})
+    if not request.path.startswith('/api/') or request.method == 'OPTIONS':
+        return None
+    fraction = latency_monitor.shed_fraction(SHED_TARGET, SHED_MAX_FRACTION)
+    if fraction and random.random() < fraction:
+        return _refused('Service is busy, try again shortly', 503, RETRY_AFTER, 'shed')
+    return None
+
+
+def _after_request(response):
+    state = _request_state.get()
+    # Handlers turn any exception into a 500 that echoes the error; one caused by a refused or
+    # failed upstream call is really a 503, and its details are not the client's business
+    if state and state['unavailable'] and response.status_code == 500:
+        reason, retry_after = state['unavailable']
+        refusal = _refused('Service is temporarily unavailable, try again shortly', 503, retry_after, reason)
+        # Rewrite the response in place: headers other hooks already added (CORS) must survive
+        response.status_code = refusal.status_code
+        response.set_data(refusal.get_data())
+        response.content_type = refusal.content_type
+        response.headers['Retry-After'] = refusal.headers['Retry-After']
+    return response
+
+
+def init_admission(app):
+    """Shed load before handlers run and report refused upstream calls as 503s."""
+    app.before_request(_before_request)
+    app.after_request(_after_request)
@@ -9,6 +9,18 @@ import logging
 from auth import auth_bp, init_auth
 from issues import issues_bp, init_issues
 from dashboard import dashboard_bp, init_dashboard
+from uploads import uploads_bp, init_uploads
+import clients
+from clients import init_clients
+from json_provider import OrjsonProvider
+from compression import init_compression
+from metrics import init_metrics
+from admission import init_admission
+from counters import init_counters
+from duplicates import init_duplicate_index
+from search import init_search_index
+from geo import init_spatial_index
+from write_queue import init_write_queue
 
 # Load environment variables
 load_dotenv()
@@ -16,6 +28,16 @@ load_dotenv()
 # Initialize Flask app
 app = Flask(__name__)
 
+# orjson for every jsonify/response body, and gzip/brotli for large responses
+app.json = OrjsonProvider(app)
+init_compression(app)
+
+# Request/upstream latency histograms, exposed at /metrics
+init_metrics(app)
+
+# Per-user rate limits, a cap on concurrent Supabase calls and latency-based load shedding
+init_admission(app)
+
 # Configure CORS
 CORS(app, resources={r"/*": {"origins": "*"}})  # Allow all origins for development
 
@@ -30,13 +52,49 @@ supabase_url = os.getenv('SUPABASE_URL')
 # API endpoints always verify user permissions before performing any action.
 # The anon key is meant for client-side (browser) usage.
 supabase_key = os.getenv('SUPABASE_SERVICE_ROLE_KEY')
-
-if not supabase_url or not supabase_key:
-    logger.error("Missing Supabase environment variables (SUPABASE_URL or SUPABASE_SERVICE_ROLE_KEY)")
-    raise ValueError("Missing Supabase environment variables")
-
-from supabase import create_client, Client
-supabase: Client = create_client(supabase_url, supabase_key)
+# Signs the short-lived tokens the write-behind queue writes each user's rows with
+jwt_secret = os.getenv('SUPABASE_JWT_SECRET')
+postgrest_transport = None
+
+if os.getenv('SUPABASE_FAKE', 'false').lower() == 'true':
+    # In-memory auth and PostgREST with synthetic data, for local runs and benchmarks/load.py.
+    # Never set SUPABASE_FAKE in production: anyone can sign in as the seeded users.
+    from fake_supabase import FakeSupabase
+    supabase = FakeSupabase.from_env()
+    supabase_url, supabase_key = supabase.url, supabase.service_key
+    postgrest_transport = supabase.transport
+    jwt_secret = supabase.jwt_secret
+    logger.warning("SUPABASE_FAKE is set: using the in-memory Supabase stand-in")
+else:
+    if not supabase_url or not supabase_key:
+        logger.error("Missing Supabase environment variables (SUPABASE_URL or SUPABASE_SERVICE_ROLE_KEY)")
+        raise ValueError("Missing Supabase environment variables")
+
+    from supabase import create_client, Client
+    supabase: Client = create_client(supabase_url, supabase_key)
+
+# Start the image processing workers first, while the process has no other threads to copy
+init_uploads()
+
+# Pooled, per-request PostgREST clients. Handlers never mutate the shared
+# client's auth, so the app can run with many threads per worker.
+init_clients(supabase_url, supabase_key, transport=postgrest_transport)
+
+# Write-behind mode (WRITE_BEHIND=true): replay the local journal of accepted reports and
+# comments, and start the workers that flush them to Supabase in batches
+init_write_queue(jwt_secret)
+
+# Periodically rebuild the dashboard counters from the issues table to correct drift
+init_counters()
+
+# Load open issues into the in-memory duplicate-report index (in the background)
+init_duplicate_index()
+
+# Restore the full-text search index from its snapshot (or build it) in the background
+init_search_index()
+
+# Load located issues into the geohash index that serves the map view (in the background)
+init_spatial_index()
 
 # Initialize blueprint modules with Supabase client
 init_auth(supabase)
@@ -47,6 +105,7 @@ init_dashboard(supabase)
 app.register_blueprint(auth_bp, url_prefix='/api/auth')
 app.register_blueprint(issues_bp, url_prefix='/api/issues')
 app.register_blueprint(dashboard_bp, url_prefix='/api/dashboard')
+app.register_blueprint(uploads_bp, url_prefix='/api/uploads')
 
 @app.route('/health', methods=['GET'])
 def health_check():
@@ -61,7 +120,7 @@ def test_database():
     """Test database connection"""
     try:
         # Test Supabase connection
-        response = supabase.table('profiles').select('*').limit(1).execute()
+        response = clients.service().table('profiles').select('*').limit(1).execute()
         return jsonify({
             'status': 'success',
             'message': 'Database connection successful'
@@ -2,13 +2,21 @@ from flask import Blueprint, request, jsonify
 from supabase import Client
 from functools import wraps
 from datetime import datetime
+from token_verifier import TokenVerifier
+import clients
+import profiles
+import admission
+import resilience
 
 auth_bp = Blueprint('auth', __name__)
 supabase: Client = None
+token_verifier: TokenVerifier = None
 
 def init_auth(supabase_client: Client):
-    global supabase
+    global supabase, token_verifier
     supabase = supabase_client
+    resilience.init_auth_client(supabase_client.auth)
+    token_verifier = TokenVerifier.from_env(supabase_client)
 
 # ----------------- Token Decorator -----------------
 def token_required(f):
@@ -25,21 +33,51 @@ def token_required(f):
             return jsonify({'message': 'Token is missing!'}), 401
 
         try:
-            user_response = supabase.auth.get_user(token)
-            user = user_response.user
-            if not user:
-                return jsonify({'message': 'User not found for this token'}), 401
-            
-            # Attach user_id to the request for endpoint functions to use
-            request.user_id = user.id
-            if not request.user_id:
-                return jsonify({'message': 'Token is valid but user ID is missing'}), 401
+            # Verified locally against the JWT secret/key set when configured,
+            # otherwise (or as an opt-in fallback) via supabase.auth.get_user
+            request.user_id = token_verifier.verify(token)
+            # Kept so handlers can build an RLS-scoped client with clients.user_client()
+            request.access_token = token
+        except admission.UpstreamUnavailable:
+            # Not the token's fault; reported as a 503
+            raise
         except Exception as e:
             return jsonify({'message': 'Token is invalid', 'error': str(e)}), 401
 
+        # Per-user read/write budgets, before the handler makes any Supabase calls
+        limited = admission.rate_limit(request.user_id)
+        if limited is not None:
+            return limited
+
         return f(*args, **kwargs)
     return decorated
 
+# ----------------- Role Decorator -----------------
+def role_required(*roles):
+    """Restrict an endpoint to users whose profile user_type is one of `roles`.
+
+    Stack it below @token_required. Roles come from the shared profile cache,
+    so most calls cost no database round trip.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            if request.method == 'OPTIONS':
+                return f(*args, **kwargs)
+
+            try:
+                role = profiles.get_role(request.user_id)
+            except Exception as e:
+                return jsonify({'message': 'Failed to check permissions', 'error': str(e)}), 500
+
+            if role not in roles:
+                required = ' or '.join(r.capitalize() for r in roles)
+                return jsonify({'message': f'Access denied. {required} access required.'}), 403
+
+            return f(*args, **kwargs)
+        return decorated
+    return decorator
+
 # ----------------- Register -----------------
 @auth_bp.route('/register', methods=['POST'])
 def register():
@@ -54,16 +92,17 @@ def register():
         if not email or not password:
             return jsonify({'message': 'Email and password are required'}), 400
 
-        auth_response = supabase.auth.sign_up({
-            'email': email,
-            'password': password,
-            'options': {
-                'data': {
-                    'full_name': full_name,
-                    'user_type': user_type
+        with resilience.auth_call('user', 'sign_up'):
+            auth_response = supabase.auth.sign_up({
+                'email': email,
+                'password': password,
+                'options': {
+                    'data': {
+                        'full_name': full_name,
+                        'user_type': user_type
+                    }
                 }
-            }
-        })
+            })
 
         # --- FIX: Check for both user and session objects ---
         if auth_response.user and auth_response.session:
@@ -73,7 +112,7 @@ def register():
                 'full_name': full_name,
                 'role': user_type,
             }
-            supabase.table('users').insert(profile_data).execute()
+            clients.service().table('users').insert(profile_data).execute()
 
             # --- FIX: Return session tokens for automatic login on the frontend ---
             return jsonify({
@@ -103,14 +142,14 @@ def login():
         if not email or not password:
             return jsonify({'message': 'Email and password are required'}), 400
 
-        auth_response = supabase.auth.sign_in_with_password({
-            'email': email,
-            'password': password
-        })
+        with resilience.auth_call('token', 'sign_in_with_password'):
+            auth_response = supabase.auth.sign_in_with_password({
+                'email': email,
+                'password': password
+            })
 
         if auth_response.user and auth_response.session:
-            profile_response = supabase.table('profiles').select('*').eq('id', auth_response.user.id).execute()
-            profile = profile_response.data[0] if profile_response.data else {}
+            profile = profiles.get_profile(auth_response.user.id) or {}
 
             return jsonify({
                 'message': 'Login successful',
@@ -137,10 +176,10 @@ def logout():
 def get_profile():
     try:
         user_id = request.user_id
-        profile_response = supabase.table('profiles').select('*').eq('id', user_id).execute()
+        profile = profiles.get_profile(user_id)
 
-        if profile_response.data:
-            return jsonify({'user': profile_response.data[0]}), 200
+        if profile:
+            return jsonify({'user': profile}), 200
         return jsonify({'message': 'Profile not found'}), 404
 
     except Exception as e:
@@ -164,7 +203,8 @@ def update_profile():
         # This should be a separate, admin-only process.
 
         if update_data:
-            supabase.table('profiles').update(update_data).eq('id', user_id).execute()
+            clients.service().table('profiles').update(update_data).eq('id', user_id).execute()
+            profiles.invalidate_profile(user_id)
             return jsonify({'message': 'Profile updated', 'user': update_data}), 200
         else:
             return jsonify({'message': 'No valid fields to update'}), 400
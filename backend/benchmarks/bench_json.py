@@ -0,0 +1,106 @@
+"""Serialization time and bytes on the wire for issue listing payloads.
+
+Compares the stdlib encoder with Flask's default settings against orjson (the app's
+JSON provider), and the encoded size before and after gzip/brotli compression.
+
+    python benchmarks/bench_json.py [--rows 20,100,1000,10000]
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+import orjson
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import compression  # noqa: E402
+from fields import ISSUE_COLUMNS, ISSUE_LIST_DEFAULT  # noqa: E402
+
+CATEGORIES = ['roads', 'water', 'electricity', 'sanitation', 'streetlights', 'others']
+WORDS = ('pothole broken streetlight overflowing garbage bin water leak main road junction near '
+         'school market bus stop drain blocked since last week dangerous for traffic at night').split()
+
+
+def fake_issue(issue_id, rng):
+    created = datetime(2024, 1, 1, tzinfo=timezone.utc) + timedelta(minutes=rng.randrange(500000))
+    return {
+        'id': issue_id,
+        'user_id': f'{rng.getrandbits(128):032x}',
+        'title': ' '.join(rng.choices(WORDS, k=rng.randint(3, 8))).capitalize(),
+        'description': ' '.join(rng.choices(WORDS, k=rng.randint(20, 80))).capitalize() + '.',
+        'category': rng.choice(CATEGORIES),
+        'location_text': f'{rng.randint(1, 400)} {rng.choice(WORDS).capitalize()} Street, Ward {rng.randint(1, 60)}',
+        'priority': rng.choice(['low', 'medium', 'high']),
+        'status': rng.choice(['reported', 'verified', 'in_progress', 'resolved']),
+        'image_url': [f'/api/uploads/files/images/{rng.getrandbits(128):032x}.jpg'] if rng.random() < 0.6 else [],
+        'thumbnail_url': [f'/api/uploads/files/thumbs/{rng.getrandbits(128):032x}.jpg'] if rng.random() < 0.6 else [],
+        'is_anonymous': rng.random() < 0.1,
+        'language': 'english',
+        'assigned_to': None,
+        'notes': None,
+        'latitude': round(12.9 + rng.random() / 5, 6),
+        'longitude': round(77.5 + rng.random() / 5, 6),
+        'comment_count': rng.randint(0, 12),
+        'idempotency_key': None,
+        'created_at': created.isoformat(),
+        'updated_at': (created + timedelta(hours=rng.randint(0, 200))).isoformat(),
+    }
+
+
+def stdlib_dumps(obj):
+    # What Flask's DefaultJSONProvider does for jsonify outside debug mode
+    return (json.dumps(obj, ensure_ascii=True, sort_keys=True, separators=(',', ':')) + '\n').encode()
+
+
+def orjson_dumps(obj):
+    return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS) + b'\n'
+
+
+def best_time(fn, arg, budget=0.5):
+    """Best per-call time over repeated runs within roughly `budget` seconds."""
+    best, spent = float('inf'), 0.0
+    while spent < budget:
+        start = time.perf_counter()
+        fn(arg)
+        elapsed = time.perf_counter() - start
+        best, spent = min(best, elapsed), spent + elapsed
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', default='20,100,1000,10000')
+    args = parser.parse_args()
+    rng = random.Random(42)
+
+    print(f"{'payload':<22}{'rows':>7}{'json ms':>10}{'orjson ms':>11}{'speedup':>9}"
+          f"{'raw KB':>10}{'gzip KB':>9}{'br KB':>8}{'gzip ms':>9}{'br ms':>8}")
+    for count in (int(n) for n in args.rows.split(',')):
+        rows = [fake_issue(i, rng) for i in range(1, count + 1)]
+        payloads = {
+            'list (default fields)': [{k: row[k] for k in ISSUE_LIST_DEFAULT} for row in rows],
+            'full rows': [{k: row[k] for k in ISSUE_COLUMNS} for row in rows],
+        }
+        for name, issues in payloads.items():
+            body = {'issues': issues, 'next_cursor': 'WyIyMDI0LTAxLTAxIiwxMDBd', 'count': None}
+            assert json.loads(stdlib_dumps(body)) == json.loads(orjson_dumps(body))
+            std_ms = best_time(stdlib_dumps, body) * 1000
+            orj_ms = best_time(orjson_dumps, body) * 1000
+            raw = orjson_dumps(body)
+            gzip_ms = best_time(lambda data: compression.compress(data, 'gzip'), raw) * 1000
+            gzipped = len(gzip.compress(raw, compresslevel=compression.GZIP_LEVEL))
+            if compression.brotli is not None:
+                br_ms = best_time(lambda data: compression.compress(data, 'br'), raw) * 1000
+                br_kb, br_ms = f'{len(compression.compress(raw, "br")) / 1024:8.1f}', f'{br_ms:8.2f}'
+            else:
+                br_kb, br_ms = f"{'n/a':>8}", f"{'n/a':>8}"
+            print(f'{name:<22}{count:>7}{std_ms:>10.2f}{orj_ms:>11.2f}{std_ms / orj_ms:>8.1f}x'
+                  f'{len(raw) / 1024:>10.1f}{gzipped / 1024:>9.1f}{br_kb}{gzip_ms:>9.2f}{br_ms}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,348 @@
+"""Concurrent load test of every /api endpoint against the in-memory Supabase stand-in.
+
+Starts `python app.py` with SUPABASE_FAKE=true (see fake_supabase.py) and seeded data, signs in
+as seeded citizens and an official, then sends each endpoint --requests requests from
+--concurrency threads, followed by a mixed phase that interleaves all of them. Reports
+p50/p95/p99 latency and throughput per endpoint and the server's peak RSS.
+
+    python benchmarks/load.py [--requests 200] [--concurrency 16] [--issues 10000]
+    python benchmarks/load.py --json results.json        # save for later comparison
+    python benchmarks/load.py --compare results.json     # diff against a saved run
+
+Pass --url to load an already running server instead (its users must match the seed).
+The SSE stream (/api/dashboard/stream) is long-lived and not load tested here.
+"""
+import argparse
+import io
+import itertools
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, BACKEND_DIR)
+from fake_supabase import DEFAULT_JWT_SECRET, SEED_PASSWORD  # noqa: E402
+
+
+def tiny_jpeg():
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.new('RGB', (640, 480), (120, 160, 200)).save(buffer, 'JPEG', quality=80)
+    return buffer.getvalue()
+
+
+# ----------------- Server -----------------
+def start_server(args):
+    port = args.port
+    env = {
+        **os.environ,
+        'SUPABASE_FAKE': 'true',
+        'PORT': str(port),
+        'FAKE_SUPABASE_CITIZENS': str(args.citizens),
+        'FAKE_SUPABASE_OFFICIALS': str(args.officials),
+        'FAKE_SUPABASE_ISSUES': str(args.issues),
+        'FAKE_SUPABASE_COMMENTS': str(args.comments),
+        'FAKE_SUPABASE_LATENCY_MS': str(args.latency_ms),
+        'FAKE_SUPABASE_SEED': str(args.seed),
+        # Verify tokens locally, as production should
+        'SUPABASE_JWT_SECRET': os.getenv('SUPABASE_JWT_SECRET') or DEFAULT_JWT_SECRET,
+        'UPLOAD_DIR': tempfile.mkdtemp(prefix='civiceye-load-'),
+        'FLASK_ENV': 'production',
+    }
+    if not args.rate_limits:
+        # A handful of tokens send all the traffic, so per-user limits would measure nothing but 429s
+        env.setdefault('RATE_LIMIT_READ_RATE', '0')
+        env.setdefault('RATE_LIMIT_WRITE_RATE', '0')
+    if args.write_behind:
+        env['WRITE_BEHIND'] = 'true'
+        env['WRITE_QUEUE_DIR'] = tempfile.mkdtemp(prefix='civiceye-load-queue-')
+    log = tempfile.NamedTemporaryFile(prefix='civiceye-load-', suffix='.log', delete=False)
+    process = subprocess.Popen([sys.executable, 'app.py'], cwd=BACKEND_DIR, env=env,
+                               stdout=log, stderr=subprocess.STDOUT)
+    url = f'http://127.0.0.1:{port}'
+    deadline = time.time() + args.startup_timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            sys.exit(f'Server exited with {process.returncode}; see {log.name}')
+        try:
+            if httpx.get(f'{url}/health', timeout=1).status_code == 200:
+                return process, url, log.name
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    process.kill()
+    sys.exit(f'Server did not become healthy in {args.startup_timeout}s; see {log.name}')
+
+
+def peak_rss_kb(pid):
+    """The process's high-water resident set size (Linux only)."""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+# ----------------- Scenarios -----------------
+class Context:
+    """Tokens and ids gathered before the measured phases."""
+
+    def __init__(self, client, args):
+        self.client = client
+        self.citizens = [self.login(f'citizen{i}@example.com') for i in range(min(args.users, args.citizens))]
+        self.official = self.login('official0@example.com')
+        self.own_issues = {}
+        for token in self.citizens:
+            issues = client.get('/api/issues/', params={'limit': 20}, headers=self.auth(token)).json()['issues']
+            self.own_issues[token] = [issue['id'] for issue in issues]
+        self.citizens = [token for token in self.citizens if self.own_issues[token]]
+        if not self.citizens:
+            sys.exit('No seeded citizen has any issues; raise --issues')
+        first = client.get('/api/issues/', params={'limit': 50}, headers=self.auth(self.official)).json()
+        self.cursor = first['next_cursor']
+        self.all_issues = [issue['id'] for issue in first['issues']]
+        self.image = tiny_jpeg()
+        upload = client.post('/api/uploads/', content=self.image, headers={
+            **self.auth(self.citizens[0]), 'Content-Type': 'image/jpeg'}).json()
+        self.upload_id = upload['id']
+
+    def login(self, email):
+        response = self.client.post('/api/auth/login', json={'email': email, 'password': SEED_PASSWORD})
+        response.raise_for_status()
+        return response.json()['access_token']
+
+    @staticmethod
+    def auth(token):
+        return {'Authorization': f'Bearer {token}'}
+
+    def citizen(self, rng):
+        token = rng.choice(self.citizens)
+        return token, rng.choice(self.own_issues[token])
+
+
+def _report(rng, n):
+    return {
+        'title': f'Load test report {n}',
+        'description': 'Pothole near the bus stop, getting worse after the rain',
+        'category': rng.choice(['roads', 'water', 'electricity', 'sanitation']),
+        'location_text': f'{rng.randint(1, 300)} Station Road',
+        'latitude': 12.97 + rng.uniform(-0.1, 0.1),
+        'longitude': 77.59 + rng.uniform(-0.1, 0.1),
+    }
+
+
+def scenarios(ctx):
+    """name -> fn(client, rng, n) returning an httpx.Response."""
+    auth = ctx.auth
+    gov = auth(ctx.official)
+
+    def as_citizen(rng):
+        token, issue_id = ctx.citizen(rng)
+        return auth(token), issue_id
+
+    return {
+        'GET /api/issues (citizen)': lambda c, rng, n: c.get('/api/issues/', headers=as_citizen(rng)[0]),
+        'GET /api/issues (government)': lambda c, rng, n: c.get('/api/issues/', headers=gov),
+        'GET /api/issues?count=exact': lambda c, rng, n: c.get('/api/issues/', params={'count': 'exact'}, headers=gov),
+        'GET /api/issues?cursor': lambda c, rng, n: c.get('/api/issues/', params={'cursor': ctx.cursor}, headers=gov),
+        'GET /api/issues/<id>': lambda c, rng, n: c.get(f'/api/issues/{rng.choice(ctx.all_issues)}', headers=gov),
+        'GET /api/issues/<id>/comments': lambda c, rng, n: c.get(
+            f'/api/issues/{rng.choice(ctx.all_issues)}/comments', headers=gov),
+        'GET /api/issues/search': lambda c, rng, n: c.get(
+            '/api/issues/search', params={'q': rng.choice(['pothole', 'water leak', 'garbage', 'streetlight'])},
+            headers=gov),
+        'GET /api/issues/map (bbox)': lambda c, rng, n: c.get(
+            '/api/issues/map', params={'bbox': '77.4,12.8,77.8,13.2'}, headers=gov),
+        'GET /api/issues/map (radius)': lambda c, rng, n: c.get(
+            '/api/issues/map', params={'lat': 12.97, 'lng': 77.59, 'radius_km': 2}, headers=gov),
+        'GET /api/issues/export': lambda c, rng, n: c.get('/api/issues/export', params={
+            'status': rng.choice(['reported', 'verified', 'in_progress', 'resolved'])}, headers=gov),
+        'GET /api/dashboard/citizen': lambda c, rng, n: c.get('/api/dashboard/citizen', headers=as_citizen(rng)[0]),
+        'GET /api/dashboard/government': lambda c, rng, n: c.get('/api/dashboard/government', headers=gov),
+        'GET /api/auth/profile': lambda c, rng, n: c.get('/api/auth/profile', headers=as_citizen(rng)[0]),
+        'POST /api/auth/login': lambda c, rng, n: c.post('/api/auth/login', json={
+            'email': f'citizen{rng.randrange(len(ctx.citizens))}@example.com', 'password': SEED_PASSWORD}),
+        'POST /api/auth/register': lambda c, rng, n: c.post('/api/auth/register', json={
+            'email': f'load-{uuid.uuid4().hex}@example.com', 'password': SEED_PASSWORD, 'full_name': 'Load Test'}),
+        'POST /api/issues': lambda c, rng, n: c.post('/api/issues/', json=_report(rng, n), headers=as_citizen(rng)[0]),
+        'POST /api/issues/batch': lambda c, rng, n: c.post('/api/issues/batch', json={'issues': [
+            {**_report(rng, n), 'idempotency_key': uuid.uuid4().hex} for _ in range(10)]},
+            headers=as_citizen(rng)[0]),
+        'POST /api/issues/<id>/comments': lambda c, rng, n: (lambda headers, issue_id: c.post(
+            f'/api/issues/{issue_id}/comments', json={'comment': f'Still not fixed ({n})'}, headers=headers)
+        )(*as_citizen(rng)),
+        'PUT /api/issues/<id>': lambda c, rng, n: c.put(f'/api/issues/{rng.choice(ctx.all_issues)}', json={
+            'status': rng.choice(['verified', 'in_progress', 'resolved'])}, headers=gov),
+        'PUT /api/issues/bulk': lambda c, rng, n: c.put('/api/issues/bulk', json={
+            'updates': [{'id': issue_id, 'priority': rng.choice(['low', 'medium', 'high'])}
+                        for issue_id in rng.sample(ctx.all_issues, 10)]}, headers=gov),
+        'POST /api/uploads': lambda c, rng, n: c.post('/api/uploads/', content=ctx.image, headers={
+            **as_citizen(rng)[0], 'Content-Type': 'image/jpeg'}),
+        'GET /api/uploads/<id>': lambda c, rng, n: c.get(f'/api/uploads/{ctx.upload_id}', headers=gov),
+    }
+
+
+# ----------------- Measurement -----------------
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def run_phase(client, fns, requests, concurrency, seed):
+    """Send `requests` requests (cycling through `fns`) from `concurrency` threads."""
+    counter = itertools.count()
+    lock = threading.Lock()
+    latencies, statuses = [], {}
+
+    def worker(worker_id):
+        rng = random.Random(seed * 1000 + worker_id)
+        while True:
+            n = next(counter)
+            if n >= requests:
+                return
+            fn = fns[n % len(fns)]
+            start = time.perf_counter()
+            try:
+                response = fn(client, rng, n)
+                response.read()
+                status = response.status_code
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                statuses[status] = statuses.get(status, 0) + 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, range(concurrency)))
+    wall = time.perf_counter() - start
+
+    latencies.sort()
+    errors = sum(count for status, count in statuses.items() if not (isinstance(status, int) and status < 400))
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'statuses': {str(status): count for status, count in sorted(statuses.items(), key=str)},
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'max_ms': latencies[-1] * 1000,
+        'rps': len(latencies) / wall,
+    }
+
+
+def print_results(results, baseline=None):
+    header = f"{'endpoint':<34}{'reqs':>6}{'err':>5}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'req/s':>9}"
+    print(header + ('  vs baseline (p95, req/s)' if baseline else ''))
+    for name, result in results.items():
+        line = (f"{name:<34}{result['requests']:>6}{result['errors']:>5}{result['p50_ms']:>9.1f}"
+                f"{result['p95_ms']:>9.1f}{result['p99_ms']:>9.1f}{result['rps']:>9.1f}")
+        old = (baseline or {}).get(name)
+        if old:
+            line += (f"  {(result['p95_ms'] / old['p95_ms'] - 1) * 100:+6.1f}%"
+                     f" {(result['rps'] / old['rps'] - 1) * 100:+6.1f}%")
+        print(line)
+        unexpected = {status: count for status, count in result['statuses'].items() if not status.startswith(('2', '3'))}
+        if unexpected:
+            print(f"{'':<34}statuses: {unexpected}")
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=200, help='requests per endpoint')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--mixed', type=int, default=2000, help='requests in the mixed phase (0 skips it)')
+    parser.add_argument('--only', help='run only endpoints whose name contains this text')
+    parser.add_argument('--citizens', type=int, default=200)
+    parser.add_argument('--officials', type=int, default=5)
+    parser.add_argument('--issues', type=int, default=10000)
+    parser.add_argument('--comments', type=int, default=20000)
+    parser.add_argument('--latency-ms', type=float, default=0, help='simulated Supabase round trip')
+    parser.add_argument('--users', type=int, default=50, help='seeded citizens to sign in as')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--port', type=int, default=5077)
+    parser.add_argument('--rate-limits', action='store_true', help='keep per-user rate limits enabled')
+    parser.add_argument('--write-behind', action='store_true', help='queue new issues and comments (202s)')
+    parser.add_argument('--url', help='load an already running server instead of starting one')
+    parser.add_argument('--startup-timeout', type=float, default=60)
+    parser.add_argument('--json', help='write results to this file')
+    parser.add_argument('--compare', help='a --json file from an earlier run to compare against')
+    args = parser.parse_args()
+
+    process = None
+    if args.url:
+        url = args.url.rstrip('/')
+    else:
+        process, url, log_path = start_server(args)
+        print(f'Server pid {process.pid} on {url} (log: {log_path})')
+
+    try:
+        limits = httpx.Limits(max_connections=args.concurrency * 2, max_keepalive_connections=args.concurrency * 2)
+        with httpx.Client(base_url=url, limits=limits, timeout=60) as client:
+            ctx = Context(client, args)
+            all_fns = scenarios(ctx)
+            selected = {name: fn for name, fn in all_fns.items() if not args.only or args.only in name}
+
+            results = {}
+            for name, fn in selected.items():
+                # A few unmeasured requests first, so caches and pools are warm
+                run_phase(client, [fn], min(20, args.requests), args.concurrency, args.seed)
+                results[name] = run_phase(client, [fn], args.requests, args.concurrency, args.seed)
+                print(f'  {name}: {results[name]["rps"]:.0f} req/s', file=sys.stderr)
+            if args.mixed and len(selected) > 1:
+                results['mixed'] = run_phase(client, list(selected.values()), args.mixed, args.concurrency, args.seed)
+
+        rss = peak_rss_kb(process.pid) if process else None
+    finally:
+        if process:
+            process.terminate()
+            process.wait(timeout=10)
+
+    report = {
+        'revision': git_revision(),
+        'settings': {key: value for key, value in vars(args).items() if key not in ('json', 'compare')},
+        'peak_rss_kb': rss,
+        'results': results,
+    }
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            old = json.load(f)
+        baseline = old['results']
+        print(f"Comparing against {old.get('revision') or args.compare}")
+    print_results(results, baseline)
+    if rss is not None:
+        line = f'Peak server RSS: {rss / 1024:.1f} MB'
+        if baseline is not None and old.get('peak_rss_kb'):
+            line += f" ({(rss / old['peak_rss_kb'] - 1) * 100:+.1f}%)"
+        print(line)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
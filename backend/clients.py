@@ -0,0 +1,77 @@
+import os
+
+import httpx
+from flask import g, request
+from postgrest import SyncPostgrestClient
+from postgrest.constants import DEFAULT_POSTGREST_CLIENT_HEADERS, DEFAULT_POSTGREST_CLIENT_TIMEOUT
+from postgrest.utils import SyncClient
+
+from admission import AdmissionTransport
+from metrics import InstrumentedTransport
+from resilience import ResilientTransport, breakers
+
+# One keep-alive connection pool shared by every PostgREST client in this process.
+# httpx transports are thread-safe, so per-request clients can borrow it freely.
+_transport: httpx.BaseTransport = None
+_rest_url: str = None
+_api_key: str = None
+_service_client = None
+
+
+class ScopedPostgrestClient(SyncPostgrestClient):
+    """A PostgREST client bound to a single bearer token.
+
+    Unlike `supabase.postgrest`, its auth header is fixed at construction time and
+    never mutated, so concurrent requests can't leak credentials into each other.
+    The underlying HTTP session borrows the shared pooled transport; do not close
+    these clients (or use them as context managers), as that would close the pool.
+    """
+
+    def create_session(self, base_url, headers, timeout, verify=True):
+        return SyncClient(
+            base_url=base_url,
+            headers=headers,
+            timeout=timeout,
+            transport=_transport,
+            follow_redirects=True,
+        )
+
+
+def init_clients(supabase_url: str, supabase_key: str, transport: httpx.BaseTransport = None):
+    """Set up the shared pool. `transport` replaces the network one (e.g. fake_supabase's)."""
+    global _transport, _rest_url, _api_key, _service_client
+    _rest_url = f"{supabase_url}/rest/v1"
+    _api_key = supabase_key
+    if transport is None:
+        transport = httpx.HTTPTransport(
+            limits=httpx.Limits(
+                max_connections=int(os.getenv('POSTGREST_POOL_SIZE', 100)),
+                max_keepalive_connections=int(os.getenv('POSTGREST_POOL_KEEPALIVE', 20)),
+            )
+        )
+    # Every PostgREST query gets a timeout, retries and the circuit breaker; each attempt then
+    # waits for an upstream slot and is timed by table and operation
+    _transport = ResilientTransport(AdmissionTransport(InstrumentedTransport(transport)), breakers['postgrest'])
+    _service_client = for_token(supabase_key)
+
+
+def for_token(token: str) -> ScopedPostgrestClient:
+    """Create a PostgREST client that runs queries as the holder of `token`."""
+    headers = {
+        **DEFAULT_POSTGREST_CLIENT_HEADERS,
+        'apiKey': _api_key,
+        'Authorization': f'Bearer {token}',
+    }
+    return ScopedPostgrestClient(_rest_url, headers=headers, timeout=DEFAULT_POSTGREST_CLIENT_TIMEOUT)
+
+
+def user_client() -> ScopedPostgrestClient:
+    """The current request's RLS-scoped client, created once per request."""
+    if 'user_client' not in g:
+        g.user_client = for_token(request.access_token)
+    return g.user_client
+
+
+def service() -> ScopedPostgrestClient:
+    """The shared service-role client. It bypasses RLS, so check permissions first."""
+    return _service_client
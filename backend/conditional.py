@@ -0,0 +1,47 @@
+import hashlib
+from datetime import datetime
+
+from flask import request, make_response
+
+
+def make_etag(*parts):
+    """An entity tag derived from a resource's version fields (and the query string)."""
+    raw = '|'.join(str(part) for part in parts) + '|' + request.query_string.decode()
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def parse_timestamp(value):
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+
+
+def has_validators():
+    return bool(request.if_none_match) or request.if_modified_since is not None
+
+
+def is_not_modified(etag, last_modified=None):
+    """Evaluate If-None-Match (preferred) or If-Modified-Since against the current version."""
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if request.if_modified_since is not None and last_modified is not None:
+        # HTTP dates only have second precision
+        return last_modified.replace(microsecond=0) <= request.if_modified_since
+    return False
+
+
+def with_validators(response, etag, last_modified=None):
+    """Attach ETag/Last-Modified; clients must revalidate before reusing the response."""
+    response = make_response(response)
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def not_modified(etag, last_modified=None):
+    return with_validators(('', 304), etag, last_modified)
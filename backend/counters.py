@@ -0,0 +1,147 @@
+import copy
+import os
+import threading
+from collections import OrderedDict
+
+import clients
+
+DIMENSIONS = ('status', 'priority', 'category')
+
+
+def summarize(rows):
+    """Fold grouped `issue_stats` rows (status, priority, category, total) into a rollup."""
+    rollup = _empty_rollup()
+    for row in rows:
+        _apply(rollup, row, row.get('total') or 0)
+    return rollup
+
+
+def delta(changes):
+    """Rollup of signed (row, delta) changes, e.g. for publishing alongside an event."""
+    rollup = _empty_rollup()
+    for row, change in changes:
+        _apply(rollup, row, change)
+    return rollup
+
+
+def created_changes(issue):
+    return [(issue, 1)]
+
+
+def updated_changes(old, new):
+    """Changes that move an issue between buckets; empty when status, priority and category are unchanged."""
+    if all(_key(old, d) == _key({**old, **new}, d) for d in DIMENSIONS):
+        return []
+    return [(old, -1), ({**old, **new}, 1)]
+
+
+def _empty_rollup():
+    return {'total': 0, 'status': {}, 'priority': {}, 'category': {}}
+
+
+def _key(issue, dimension):
+    value = issue.get(dimension)
+    if dimension == 'category':
+        return value or 'others'
+    return value or ''
+
+
+def _apply(rollup, issue, delta):
+    rollup['total'] += delta
+    for dimension in DIMENSIONS:
+        value = _key(issue, dimension)
+        counts = rollup[dimension]
+        counts[value] = counts.get(value, 0) + delta
+        if counts[value] == 0:
+            del counts[value]
+
+
+class DashboardCounters:
+    """Pre-aggregated issue counts, globally and per user.
+
+    Rollups are adjusted by deltas from the issue write paths and rebuilt from the
+    `issue_stats` RPC by `reconcile()` to correct drift (including writes made by
+    other workers). Per-user rollups are loaded on first use and bounded in number.
+    """
+
+    def __init__(self, loader, max_users=10000):
+        self._loader = loader
+        self._max_users = max_users
+        self._global = None
+        self._users = OrderedDict()
+        self._lock = threading.Lock()
+
+    def snapshot(self, user_id=None):
+        """Return a copy of the global rollup, or of `user_id`'s rollup."""
+        with self._lock:
+            rollup = self._global if user_id is None else self._users.get(user_id)
+            if rollup is not None:
+                if user_id is not None:
+                    self._users.move_to_end(user_id)
+                return copy.deepcopy(rollup)
+
+        rollup = summarize(self._loader(user_id))
+        with self._lock:
+            if user_id is None:
+                if self._global is None:
+                    self._global = rollup
+                rollup = self._global
+            else:
+                rollup = self._users.setdefault(user_id, rollup)
+                self._users.move_to_end(user_id)
+                while len(self._users) > self._max_users:
+                    self._users.popitem(last=False)
+            return copy.deepcopy(rollup)
+
+    def record_created(self, issue):
+        self._record(issue, created_changes(issue))
+
+    def record_updated(self, old, new):
+        """Move an issue between buckets when its status or priority changed."""
+        changes = updated_changes(old, new)
+        if changes:
+            self._record(old, changes)
+
+    def _record(self, issue, changes):
+        with self._lock:
+            rollups = [self._global, self._users.get(issue.get('user_id'))]
+            for rollup in rollups:
+                if rollup is None:
+                    # Not loaded yet; it will be read fresh from the table on first use
+                    continue
+                for row, delta in changes:
+                    _apply(rollup, row, delta)
+
+    def reconcile(self):
+        """Rebuild the global rollup from the table and drop per-user rollups."""
+        rollup = summarize(self._loader(None))
+        with self._lock:
+            self._global = rollup
+            self._users.clear()
+
+    def run_reconciler(self, interval):
+        stop = threading.Event()
+
+        def loop():
+            while not stop.wait(interval):
+                try:
+                    self.reconcile()
+                except Exception as e:
+                    print(f"ERROR in counter reconciliation: {e}")
+
+        threading.Thread(target=loop, name='counter-reconciler', daemon=True).start()
+        return stop
+
+
+def _load_stats(user_id=None):
+    params = {'p_user_id': user_id} if user_id else {}
+    return clients.service().rpc('issue_stats', params).execute().data or []
+
+
+dashboard_counters = DashboardCounters(_load_stats, max_users=int(os.getenv('COUNTER_MAX_USERS', 10000)))
+
+
+def init_counters():
+    interval = int(os.getenv('COUNTER_RECONCILE_SECONDS', 300))
+    if interval > 0:
+        dashboard_counters.run_reconciler(interval)
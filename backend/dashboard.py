@@ -1,7 +1,13 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify
 from supabase import Client
-import os
-from auth import token_required
+from auth import token_required, role_required
+import clients
+import profiles
+from fanout import gather
+from counters import dashboard_counters
+from fields import ISSUE_LIST_DEFAULT, CITIZEN_RECENT_DEFAULT
+from events import event_bus, sse_stream, format_sse, SubscriberLimitReached
+from response_cache import dashboard_cache, citizen_dashboard_key, GOVERNMENT_DASHBOARD_KEY
 
 dashboard_bp = Blueprint('dashboard', __name__)
 supabase: Client = None
@@ -10,66 +16,65 @@ def init_dashboard(supabase_client):
     global supabase
     supabase = supabase_client
 
+def _cached_response(payload, hit):
+    response = jsonify(payload)
+    response.headers['X-Cache'] = 'HIT' if hit else 'MISS'
+    return response, 200
+
 # ------------------ CITIZEN DASHBOARD ------------------ #
 @dashboard_bp.route('/citizen', methods=['GET'])
 @token_required
 def citizen_dashboard():
     """Get citizen dashboard data using user_id from token."""
     try:
-        # Get the user's token from the Authorization header
-        token = request.headers.get('Authorization').split(' ')[1]
         user_id = request.user_id
 
-        # Temporarily override auth to use the user's JWT for this request.
+        # Serve repeated loads from the response cache (invalidated by issue writes)
+        cache_key = citizen_dashboard_key(user_id)
+        cached = dashboard_cache.get(cache_key)
+        if cached is not None:
+            return _cached_response(cached, hit=True)
+
+        # Query with a client scoped to the user's JWT for this request.
         # This ensures that Supabase RLS policies are correctly applied.
-        original_auth = supabase.postgrest.auth
-        try:
-            supabase.postgrest.auth(token)
-
-            # Fetch all issues for this user
-            user_issues_response = supabase.table('issues')\
-                .select('status, category', count='exact')\
-                .eq('user_id', user_id)\
-                .execute()
-
-            user_issues_data = getattr(user_issues_response, 'data', [])
-            total_issues = user_issues_response.count if hasattr(user_issues_response, 'count') else len(user_issues_data)
-
-            # --- CHANGE: Clean status data before counting ---
-            resolved_issues = sum(1 for i in user_issues_data if i.get('status', '').strip().lower() == 'resolved')
-            in_progress_issues = sum(1 for i in user_issues_data if i.get('status', '').strip().lower() == 'in_progress')
-            pending_issues = sum(1 for i in user_issues_data if i.get('status', '').strip().lower() == 'reported')
-            # --- END CHANGE ---
-
-            # Recent issues (latest 5)
-            recent_issues_resp = supabase.table('issues') \
-                .select('*')\
-                .eq('user_id', user_id)\
-                .order('created_at', desc=True)\
-                .limit(5)\
-                .execute()
-            recent_issues = recent_issues_resp.data or []
-
-            # Category breakdown (dynamic)
-            category_stats = {}
-            for issue in user_issues_data or []:
-                category = issue.get('category') or 'others'
-                category_stats[category] = category_stats.get(category, 0) + 1
-
-            return jsonify({
-                'statistics': {
-                    'total_issues': total_issues,
-                    'resolved_issues': resolved_issues,
-                    'in_progress_issues': in_progress_issues,
-                    'pending_issues': pending_issues,
-                    'resolution_rate': (resolved_issues / total_issues * 100) if total_issues > 0 else 0
-                },
-                'recent_issues': recent_issues,
-                'category_breakdown': category_stats
-            }), 200
-        finally:
-            # Always restore the original auth context
-            supabase.postgrest.auth(original_auth)
+        db = clients.user_client()
+
+        # Recent issues (latest 5)
+        recent_issues_query = db.table('issues') \
+            .select(','.join(CITIZEN_RECENT_DEFAULT))\
+            .eq('user_id', user_id)\
+            .order('created_at', desc=True)\
+            .limit(5)
+
+        # Pre-aggregated counters (kept current by the issue write paths) and the recent
+        # issues are independent, so fetch them concurrently
+        stats, recent_issues_resp = gather(
+            lambda: dashboard_counters.snapshot(user_id),
+            recent_issues_query.execute,
+        )
+        recent_issues = recent_issues_resp.data or []
+
+        total_issues = stats['total']
+        resolved_issues = stats['status'].get('resolved', 0)
+        in_progress_issues = stats['status'].get('in_progress', 0)
+        pending_issues = stats['status'].get('reported', 0)
+
+        # Category breakdown (dynamic)
+        category_stats = stats['category']
+
+        payload = {
+            'statistics': {
+                'total_issues': total_issues,
+                'resolved_issues': resolved_issues,
+                'in_progress_issues': in_progress_issues,
+                'pending_issues': pending_issues,
+                'resolution_rate': (resolved_issues / total_issues * 100) if total_issues > 0 else 0
+            },
+            'recent_issues': recent_issues,
+            'category_breakdown': category_stats
+        }
+        dashboard_cache.set(cache_key, payload)
+        return _cached_response(payload, hit=False)
 
     except Exception as e:
         print(f"ERROR in citizen_dashboard: {e}")
@@ -78,85 +83,124 @@ def citizen_dashboard():
 # ------------------ GOVERNMENT DASHBOARD ------------------ #
 @dashboard_bp.route('/government', methods=['GET'])
 @token_required
+@role_required('government')
 def government_dashboard():
     """Get government dashboard data"""
+    try:
+        # The shared service-role client; its auth is never swapped per request.
+        db = clients.service()
+
+        # 1. The user type check is done by @role_required (cached profile lookup).
+        # The government view is the same for every official, so it shares one cache entry.
+        cached = dashboard_cache.get(GOVERNMENT_DASHBOARD_KEY)
+        if cached is not None:
+            return _cached_response(cached, hit=True)
+
+        # 2. Read the pre-aggregated global counters (grouped by status, priority and category)
+        #    and the recent issues for the list view concurrently
+        recent_issues_query = db.table('issues')\
+            .select(','.join(ISSUE_LIST_DEFAULT))\
+            .order('created_at', desc=True)\
+            .limit(10)
+        stats, recent_issues_resp = gather(
+            dashboard_counters.snapshot,
+            recent_issues_query.execute,
+        )
+        recent_issues = recent_issues_resp.data or []
+
+        # 3. Status/priority are normalized to lowercase at write time, so no per-row cleanup
+        total_issues = stats['total']
+        resolved_issues = stats['status'].get('resolved', 0)
+        in_progress_issues = stats['status'].get('in_progress', 0)
+        pending_issues = stats['status'].get('reported', 0)
+        urgent_issues = stats['priority'].get('high', 0)
+
+        category_stats = stats['category']
+        status_stats = {status: stats['status'].get(status, 0)
+                        for status in ('reported', 'in_progress', 'resolved', 'verified')}
+
+        # 4. Return the COMPLETE data structure
+        payload = {
+            'statistics': {
+                'total_issues': total_issues,
+                'resolved_issues': resolved_issues,
+                'in_progress_issues': in_progress_issues,
+                'pending_issues': pending_issues,
+                'urgent_issues': urgent_issues,
+                'resolution_rate': (resolved_issues / total_issues * 100) if total_issues > 0 else 0
+            },
+            'recent_issues': recent_issues,
+            'category_breakdown': category_stats,
+            'status_breakdown': status_stats
+        }
+        dashboard_cache.set(GOVERNMENT_DASHBOARD_KEY, payload)
+        return _cached_response(payload, hit=False)
+
+    except Exception as e:
+        print(f"ERROR in government_dashboard: {e}")
+        return jsonify({'message': 'Failed to get government dashboard data', 'error': str(e)}), 500
+
+# ------------------ CACHE STATS ------------------ #
+@dashboard_bp.route('/cache/stats', methods=['GET'])
+@token_required
+def cache_stats():
+    """Hit/miss counts for the dashboard response cache (this worker only), for tuning the TTL"""
+    return jsonify({'cache': dashboard_cache.stats()}), 200
+
+# ------------------ LIVE UPDATES ------------------ #
+@dashboard_bp.route('/stream', methods=['GET'])
+@token_required
+def dashboard_stream():
+    """Server-sent events for issue changes, so dashboards load once and apply deltas
+
+    A new stream starts with a 'snapshot' of the counters; 'issue.created' and 'issue.updated'
+    events carry the counter delta to add to it. A 'resync' event means events were missed
+    and the client should reload the dashboard before reconnecting.
+    """
     try:
         user_id = request.user_id
-        
-        original_auth = supabase.postgrest.auth
-        service_key = os.getenv('SUPABASE_SERVICE_ROLE_KEY')
+        # Government officials see every change; citizens only changes to their own issues
+        scope = None if profiles.get_role(user_id) == 'government' else user_id
 
-        if not service_key:
-            raise ValueError("SUPABASE_SERVICE_ROLE_KEY is not set in the environment.")
+        last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+        if last_event_id is not None:
+            if not last_event_id.isdigit():
+                return jsonify({'message': 'Invalid Last-Event-ID'}), 400
+            last_event_id = int(last_event_id)
 
         try:
-            supabase.postgrest.auth(service_key)
-
-            # 1. Perform user type check
-            profile_resp = supabase.table('profiles')\
-                .select('user_type')\
-                .eq('id', user_id)\
-                .single()\
-                .execute()
-
-            profile_data = getattr(profile_resp, 'data', {})
-            if not profile_data or profile_data.get('user_type') != 'government':
-                return jsonify({'message': 'Access denied. Government access required.'}), 403
-
-            # 2. Fetch all issue data for stats
-            all_issues_resp = supabase.table('issues')\
-                .select('status, priority, category', count='exact')\
-                .execute()
-            
-            all_issues_data = getattr(all_issues_resp, 'data', [])
-            total_issues = all_issues_resp.count if hasattr(all_issues_resp, 'count') else 0
-
-            # --- CHANGE: Clean status data before counting ---
-            resolved_issues = sum(1 for i in all_issues_data if i.get('status', '').strip().lower() == 'resolved')
-            in_progress_issues = sum(1 for i in all_issues_data if i.get('status', '').strip().lower() == 'in_progress')
-            pending_issues = sum(1 for i in all_issues_data if i.get('status', '').strip().lower() == 'reported')
-            urgent_issues = sum(1 for i in all_issues_data if i.get('priority', '').strip().lower() == 'high')
-            # --- END CHANGE ---
-
-            category_stats = {}
-            status_stats = {'reported': 0, 'in_progress': 0, 'resolved': 0, 'verified': 0}
-
-            for issue in all_issues_data:
-                category = issue.get('category') or 'others'
-                category_stats[category] = category_stats.get(category, 0) + 1
-
-                # --- CHANGE: Clean status before dictionary lookup ---
-                status = issue.get('status', '').strip().lower()
-                if status in status_stats:
-                    status_stats[status] += 1
-                # --- END CHANGE ---
-
-            # 4. Fetch recent issues for the list view
-            recent_issues_resp = supabase.table('issues')\
-                .select('*')\
-                .order('created_at', desc=True)\
-                .limit(10)\
-                .execute()
-            recent_issues = recent_issues_resp.data or []
-
-            # 5. Return the COMPLETE data structure
-            return jsonify({
-                'statistics': {
-                    'total_issues': total_issues,
-                    'resolved_issues': resolved_issues,
-                    'in_progress_issues': in_progress_issues,
-                    'pending_issues': pending_issues,
-                    'urgent_issues': urgent_issues,
-                    'resolution_rate': (resolved_issues / total_issues * 100) if total_issues > 0 else 0
-                },
-                'recent_issues': recent_issues,
-                'category_breakdown': category_stats,
-                'status_breakdown': status_stats
-            }), 200
-
-        finally:
-            supabase.postgrest.auth(original_auth)
+            subscription = event_bus.subscribe(scope, last_event_id)
+        except SubscriberLimitReached:
+            response = jsonify({'message': 'Too many live dashboard connections, try again later'})
+            response.headers['Retry-After'] = '30'
+            return response, 503
+        # Resuming clients already have a baseline; new ones get one after subscribing so no delta is lost
+        try:
+            snapshot = dashboard_counters.snapshot(scope) if last_event_id is None else None
+        except Exception:
+            event_bus.unsubscribe(subscription)
+            raise
+
+        def generate():
+            try:
+                if snapshot is not None:
+                    yield format_sse('snapshot', {'counters': snapshot})
+                yield from sse_stream(subscription)
+            finally:
+                event_bus.unsubscribe(subscription)
+
+        return Response(generate(), mimetype='text/event-stream', headers={
+            'Cache-Control': 'no-cache',
+            # Stop nginx from buffering the stream
+            'X-Accel-Buffering': 'no',
+        })
 
     except Exception as e:
-        print(f"ERROR in government_dashboard: {e}")
-        return jsonify({'message': 'Failed to get government dashboard data', 'error': str(e)}), 500
+        print(f"ERROR in dashboard_stream: {e}")
+        return jsonify({'message': 'Failed to open dashboard stream', 'error': str(e)}), 500
+
+@dashboard_bp.route('/stream/stats', methods=['GET'])
+@token_required
+def stream_stats():
+    """Open streams and slow-consumer cut-offs for this worker"""
+    return jsonify({'events': event_bus.stats()}), 200
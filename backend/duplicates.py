@@ -0,0 +1,198 @@
+import os
+import random
+import threading
+
+import clients
+from pagination import iter_rows
+from text import tokenize
+
+# MinHash signature length = BANDS * ROWS. Reports are short, so use many narrow bands:
+# with 16 bands of 2 rows a pair at 0.5 Jaccard similarity shares a bucket ~99% of the
+# time; candidates are then filtered on their estimated similarity.
+BANDS = int(os.getenv('DUPLICATE_LSH_BANDS', 16))
+ROWS = int(os.getenv('DUPLICATE_LSH_ROWS', 2))
+THRESHOLD = float(os.getenv('DUPLICATE_THRESHOLD', 0.4))
+
+_PRIME = (1 << 61) - 1
+_MASK = (1 << 64) - 1
+# Fixed seed: the permutations only need to be consistent within this process
+_rng = random.Random(0x5EED)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(BANDS * ROWS)]
+
+# Issues in these states are closed; a new report of the same thing is a new problem
+CLOSED_STATUSES = ('resolved',)
+INDEX_COLUMNS = 'id, user_id, category, title, description, location_text, status, created_at'
+# All a citizen learns about a candidate they cannot read under RLS
+REDACTED_FIELDS = ('id', 'category', 'similarity')
+
+
+def shingles(issue):
+    """Words and word pairs from the normalized title, description and location."""
+    tokens = tokenize(' '.join(issue.get(field) or '' for field in ('title', 'description', 'location_text')))
+    return set(tokens) | {f'{a} {b}' for a, b in zip(tokens, tokens[1:])}
+
+
+def signature(features):
+    # Python's str hash is salted per process, which is fine for an in-process index
+    hashes = [hash(feature) & _MASK for feature in features]
+    if not hashes:
+        return None
+    return tuple(min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS)
+
+
+def similarity(sig_a, sig_b):
+    """Estimated Jaccard similarity of the two shingle sets."""
+    return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / len(sig_a)
+
+
+def _bands(sig):
+    return [hash(sig[i * ROWS:(i + 1) * ROWS]) for i in range(BANDS)]
+
+
+class DuplicateIndex:
+    """MinHash/LSH index of open issues, bucketed by category.
+
+    Lookups only touch the few LSH buckets a report hashes into, so finding
+    candidates does not depend on how many issues are indexed.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        # category -> one {band hash -> set of issue ids} per band
+        self._buckets = {}
+        # issue id -> (category, signature, band hashes, summary, owner's user id)
+        self._docs = {}
+        # Changes made while a rebuild is loading, replayed onto the new index before the swap
+        self._pending = None
+
+    def __len__(self):
+        return len(self._docs)
+
+    def add(self, issue):
+        """Index (or re-index) an issue; closed issues are removed instead."""
+        issue_id = issue['id']
+        if issue.get('status') in CLOSED_STATUSES:
+            self.remove(issue_id)
+            return
+        sig = signature(shingles(issue))
+        if sig is None:
+            return
+        category = issue.get('category') or 'others'
+        bands = _bands(sig)
+        summary = {
+            'id': issue_id,
+            'title': issue.get('title'),
+            'status': issue.get('status'),
+            'location_text': issue.get('location_text'),
+            'created_at': issue.get('created_at'),
+        }
+        with self._lock:
+            self._record('add', issue)
+            self._remove_locked(issue_id)
+            tables = self._buckets.setdefault(category, [{} for _ in range(BANDS)])
+            for table, band in zip(tables, bands):
+                table.setdefault(band, set()).add(issue_id)
+            self._docs[issue_id] = (category, sig, bands, summary, issue.get('user_id'))
+
+    def update(self, old_issue, new_issue):
+        """Apply an update. Updates carry the full row, so just re-index it."""
+        if 'title' in new_issue:
+            self.add(new_issue)
+        elif new_issue.get('status') in CLOSED_STATUSES:
+            self.remove(old_issue['id'])
+
+    def remove(self, issue_id):
+        with self._lock:
+            self._record('remove', issue_id)
+            self._remove_locked(issue_id)
+
+    def _record(self, method, *args):
+        if self._pending is not None:
+            self._pending.append((method, args))
+
+    def _remove_locked(self, issue_id):
+        doc = self._docs.pop(issue_id, None)
+        if doc is None:
+            return
+        category, _, bands, _, _ = doc
+        for table, band in zip(self._buckets[category], bands):
+            ids = table.get(band)
+            if ids is not None:
+                ids.discard(issue_id)
+                if not ids:
+                    del table[band]
+
+    def candidates(self, issue, limit=5, threshold=THRESHOLD, user_id=None):
+        """Open issues in the same category that look like the same report, most similar first.
+
+        With `user_id` (a citizen), issues owned by anyone else are reduced to REDACTED_FIELDS,
+        since the caller may not read them.
+        """
+        sig = signature(shingles(issue))
+        if sig is None:
+            return []
+        category = issue.get('category') or 'others'
+        with self._lock:
+            tables = self._buckets.get(category)
+            if not tables:
+                return []
+            ids = set()
+            for table, band in zip(tables, _bands(sig)):
+                ids |= table.get(band, set())
+            scored = []
+            for issue_id in ids:
+                category, other_sig, _, summary, owner = self._docs[issue_id]
+                score = similarity(sig, other_sig)
+                if score >= threshold:
+                    candidate = {**summary, 'category': category, 'similarity': round(score, 3)}
+                    if user_id is not None and owner != user_id:
+                        candidate = {field: candidate[field] for field in REDACTED_FIELDS}
+                    scored.append(candidate)
+        scored.sort(key=lambda candidate: candidate['similarity'], reverse=True)
+        return scored[:limit]
+
+    def rebuild(self, rows):
+        with self._lock:
+            self._pending = []
+        fresh = DuplicateIndex()
+        try:
+            for row in rows:
+                fresh.add(row)
+            with self._lock:
+                # Writes made since the scan started went to this index only; the scan may have
+                # missed them, so apply them again (re-adding a row is harmless) before swapping
+                for method, args in self._pending:
+                    getattr(fresh, method)(*args)
+                self._buckets, self._docs = fresh._buckets, fresh._docs
+        finally:
+            with self._lock:
+                self._pending = None
+
+
+duplicate_index = DuplicateIndex()
+
+
+def rebuild_duplicate_index():
+    """Load every open issue from the database into the index."""
+    def make_query():
+        query = clients.service().table('issues').select(INDEX_COLUMNS)
+        for status in CLOSED_STATUSES:
+            query = query.neq('status', status)
+        return query
+
+    duplicate_index.rebuild(iter_rows(make_query, page_size=1000))
+    print(f"Duplicate index rebuilt with {len(duplicate_index)} open issues")
+
+
+def init_duplicate_index():
+    """Rebuild the index in the background so startup is not blocked on a table scan."""
+    if os.getenv('DUPLICATE_INDEX_REBUILD', 'true').lower() != 'true':
+        return
+
+    def run():
+        try:
+            rebuild_duplicate_index()
+        except Exception as e:
+            print(f"ERROR rebuilding duplicate index: {e}")
+
+    threading.Thread(target=run, name='duplicate-index-rebuild', daemon=True).start()
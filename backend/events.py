@@ -0,0 +1,157 @@
+import itertools
+import json
+import os
+import threading
+from collections import deque
+
+# Events a subscriber may fall behind by before it is cut off and told to reload
+QUEUE_SIZE = int(os.getenv('EVENTS_QUEUE_SIZE', 256))
+# Every open stream holds a worker thread, so cap how many there can be
+MAX_SUBSCRIBERS = int(os.getenv('EVENTS_MAX_SUBSCRIBERS', 100))
+# Recent events kept so a reconnecting client can resume from Last-Event-ID
+REPLAY_SIZE = int(os.getenv('EVENTS_REPLAY_SIZE', 1000))
+HEARTBEAT_SECONDS = float(os.getenv('EVENTS_HEARTBEAT_SECONDS', 15))
+
+
+class SubscriberLimitReached(Exception):
+    pass
+
+
+class Subscription:
+    """One client's bounded queue of events.
+
+    Publishing never blocks: when the queue is full the pending events are dropped
+    and the subscriber gets a single 'resync' event telling it to reload.
+    """
+
+    def __init__(self, user_id, maxsize):
+        # None receives every event; otherwise only events owned by this user
+        self.user_id = user_id
+        self._maxsize = maxsize
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._overflowed = False
+        self.closed = False
+
+    def wants(self, event):
+        return self.user_id is None or event['owner_id'] == self.user_id
+
+    def offer(self, event):
+        """Queue an event; returns False if this event is the one that overflowed the queue."""
+        with self._cond:
+            if self.closed or self._overflowed:
+                return True
+            if len(self._queue) >= self._maxsize:
+                self._queue.clear()
+                self._overflowed = True
+            else:
+                self._queue.append(event)
+            self._cond.notify()
+            return not self._overflowed
+
+    def overflow(self):
+        with self._cond:
+            self._queue.clear()
+            self._overflowed = True
+            self._cond.notify()
+
+    def next(self, timeout):
+        """The next event, or None if nothing arrived within `timeout` seconds."""
+        with self._cond:
+            if not self._queue and not self._overflowed:
+                self._cond.wait(timeout)
+            if self._queue:
+                return self._queue.popleft()
+            if self._overflowed:
+                self.closed = True
+                return {'id': None, 'type': 'resync', 'data': {'reason': 'Too far behind; reload and reconnect'}}
+            return None
+
+
+class EventBus:
+    """In-process pub/sub for issue changes, fed by the write hooks in issues.py.
+
+    Each worker has its own bus, so a stream only carries writes handled by the
+    worker serving it; clients reconcile by reloading on 'resync'.
+    """
+
+    def __init__(self, queue_size=QUEUE_SIZE, max_subscribers=MAX_SUBSCRIBERS, replay_size=REPLAY_SIZE):
+        self._queue_size = queue_size
+        self._max_subscribers = max_subscribers
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._ids = itertools.count(1)
+        self._last_id = 0
+        self._recent = deque(maxlen=replay_size)
+        self._overflows = 0
+
+    def publish(self, event_type, data, owner_id=None):
+        # Ids are assigned and queued under one lock so every subscriber sees the same order
+        with self._lock:
+            self._last_id = next(self._ids)
+            event = {'id': self._last_id, 'type': event_type, 'data': data, 'owner_id': owner_id}
+            self._recent.append(event)
+            for subscription in self._subscribers:
+                if subscription.wants(event) and not subscription.offer(event):
+                    self._overflows += 1
+        return event
+
+    def subscribe(self, user_id=None, last_event_id=None):
+        """Open a subscription, replaying events after `last_event_id` when they are still retained.
+
+        Raises SubscriberLimitReached when the bus is at capacity.
+        """
+        subscription = Subscription(user_id, self._queue_size)
+        with self._lock:
+            if len(self._subscribers) >= self._max_subscribers:
+                raise SubscriberLimitReached()
+            if last_event_id is not None:
+                oldest = self._recent[0]['id'] if self._recent else self._last_id + 1
+                if last_event_id > self._last_id or last_event_id < oldest - 1:
+                    # From before a restart, or older than the replay buffer: the client must reload
+                    subscription.overflow()
+                else:
+                    for event in self._recent:
+                        if event['id'] > last_event_id and subscription.wants(event):
+                            subscription.offer(event)
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+            subscription.closed = True
+
+    def stats(self):
+        with self._lock:
+            return {
+                'subscribers': len(self._subscribers),
+                'last_event_id': self._last_id,
+                'overflows': self._overflows,
+            }
+
+
+event_bus = EventBus()
+
+
+def format_sse(event_type, data, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {event_type}')
+    lines.append(f'data: {json.dumps(data, default=str, separators=(",", ":"))}')
+    return '\n'.join(lines) + '\n\n'
+
+
+def sse_stream(subscription, heartbeat=HEARTBEAT_SECONDS):
+    """Yield a subscription's events in text/event-stream format until it is cut off.
+
+    A comment line is sent when idle so proxies keep the connection open and a
+    disconnected client is noticed on the next write.
+    """
+    while not subscription.closed:
+        event = subscription.next(heartbeat)
+        if event is None:
+            yield ': keepalive\n\n'
+            continue
+        yield format_sse(event['type'], event['data'], event['id'])
@@ -0,0 +1,651 @@
+import functools
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import httpx
+import jwt
+
+# An in-process stand-in for the parts of Supabase this backend talks to: the auth calls
+# (sign_up, sign_in_with_password, get_user) and the PostgREST HTTP API behind clients.py.
+# It exists for local runs and benchmarks (SUPABASE_FAKE=true); never enable it in production.
+#
+# Tables are plain lists of dicts guarded by one lock, filtered with a small PostgREST
+# query parser, so queries cost CPU in this process rather than a network round trip.
+# Add FAKE_SUPABASE_LATENCY_MS to approximate the round trip to a real project.
+
+FAKE_URL = 'http://fake-supabase.local'
+FAKE_SERVICE_KEY = 'fake-service-role-key'
+DEFAULT_JWT_SECRET = 'fake-supabase-jwt-secret-for-local-use-only'
+TOKEN_LIFETIME = 3600
+SEED_PASSWORD = 'password'
+
+CATEGORIES = ('roads', 'water', 'electricity', 'sanitation', 'streetlights', 'parks', 'drainage')
+STATUSES = ('reported', 'verified', 'in_progress', 'resolved')
+PRIORITIES = ('low', 'medium', 'high', 'urgent')
+WORDS = (
+    'pothole', 'broken', 'streetlight', 'leaking', 'pipe', 'garbage', 'overflowing', 'drain',
+    'blocked', 'road', 'crack', 'water', 'supply', 'outage', 'park', 'bench', 'damaged', 'signal',
+    'traffic', 'flooding', 'sewage', 'smell', 'tree', 'fallen', 'wire', 'exposed', 'market', 'school',
+)
+PLACES = ('MG Road', 'Station Road', 'Gandhi Nagar', 'Market Street', 'Lake View', 'Sector 12',
+          'Old Town', 'Civil Lines', 'Ring Road', 'Hospital Lane')
+
+# Column types, used to coerce filter values from the query string
+SCHEMA = {
+    'issues': {
+        'id': int, 'user_id': str, 'title': str, 'description': str, 'category': str,
+        'location_text': str, 'priority': str, 'status': str, 'image_url': list, 'thumbnail_url': list,
+        'is_anonymous': bool, 'language': str, 'assigned_to': str, 'notes': str,
+        'latitude': float, 'longitude': float, 'comment_count': int, 'idempotency_key': str,
+        'created_at': datetime, 'updated_at': datetime,
+    },
+    'issue_comments': {
+        'id': int, 'issue_id': int, 'user_id': str, 'author_name': str, 'comment': str,
+        'idempotency_key': str, 'created_at': datetime,
+    },
+    'profiles': {'id': str, 'email': str, 'full_name': str, 'user_type': str, 'created_at': datetime},
+    'users': {'id': str, 'email': str, 'full_name': str, 'role': str, 'created_at': datetime},
+}
+DEFAULTS = {
+    'issues': {'priority': 'medium', 'status': 'reported', 'image_url': [], 'thumbnail_url': [],
+               'is_anonymous': False, 'language': 'english', 'comment_count': 0},
+    'profiles': {'user_type': 'citizen'},
+}
+SERIAL_TABLES = ('issues', 'issue_comments')
+# The unique indexes used by idempotent batch reports and the write-behind queue
+UNIQUE = {'issues': ('user_id', 'idempotency_key'), 'issue_comments': ('user_id', 'idempotency_key')}
+
+
+class FakeSupabaseError(Exception):
+    def __init__(self, status, code, message, details=None):
+        super().__init__(message)
+        self.status = status
+        self.body = {'code': code, 'message': message, 'details': details, 'hint': None}
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+def _timestamp(value):
+    """A timestamp as stored: ISO 8601 in UTC; naive values (datetime.utcnow()) are taken as UTC.
+
+    Stored this way, timestamps sort and compare correctly as plain strings.
+    """
+    parsed = value if isinstance(value, datetime) else datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    return (parsed.astimezone(timezone.utc) if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)).isoformat()
+
+
+@functools.lru_cache(maxsize=4096)
+def _coerce(kind, raw):
+    if raw is None or kind is str or kind is list:
+        return raw
+    if kind is datetime:
+        return _timestamp(raw)
+    if kind is bool:
+        return raw if isinstance(raw, bool) else str(raw).lower() == 'true'
+    return kind(raw)
+
+
+# ----------------- PostgREST query parsing -----------------
+def _split(text, sep=','):
+    """Split on `sep` outside parentheses and double quotes."""
+    parts, depth, quoted, current = [], 0, False, []
+    for char in text:
+        if char == '"':
+            quoted = not quoted
+        elif not quoted and char == '(':
+            depth += 1
+        elif not quoted and char == ')':
+            depth -= 1
+        if char == sep and depth == 0 and not quoted:
+            parts.append(''.join(current))
+            current = []
+        else:
+            current.append(char)
+    if current or parts:
+        parts.append(''.join(current))
+    return [part.strip() for part in parts]
+
+
+def _unquote(value):
+    return value[1:-1] if len(value) >= 2 and value[0] == value[-1] == '"' else value
+
+
+def _parse_condition(column, expression):
+    """('col', negated, op, value) from a `col=op.value` filter."""
+    negated = expression.startswith('not.')
+    if negated:
+        expression = expression[4:]
+    op, _, value = expression.partition('.')
+    if op == 'in':
+        value = tuple(_unquote(item) for item in _split(value.strip()[1:-1])) if value.strip() != '()' else ()
+    else:
+        value = _unquote(value)
+    return ('cond', column, negated, op, value)
+
+
+def _parse_logic(kind, body):
+    """An or=(...) / and(...) tree of conditions."""
+    terms = []
+    for term in _split(body.strip()[1:-1]):
+        if term.startswith(('and(', 'or(', 'not.and(', 'not.or(')):
+            negated = term.startswith('not.')
+            inner_kind, _, rest = term[4 if negated else 0:].partition('(')
+            terms.append(('not', _parse_logic(inner_kind, '(' + rest)) if negated else _parse_logic(inner_kind, '(' + rest))
+        else:
+            column, _, expression = term.partition('.')
+            terms.append(_parse_condition(column, expression))
+    return (kind, terms)
+
+
+def _matches(row, node, schema):
+    kind = node[0]
+    if kind == 'and':
+        return all(_matches(row, term, schema) for term in node[1])
+    if kind == 'or':
+        return any(_matches(row, term, schema) for term in node[1])
+    if kind == 'not':
+        return not _matches(row, node[1], schema)
+    _, column, negated, op, raw = node
+    result = _compare(row.get(column), op, raw, schema.get(column, str))
+    return not result if negated else result
+
+
+def _compare(value, op, raw, kind):
+    if op == 'is':
+        expected = {'null': None, 'true': True, 'false': False}[raw.lower()]
+        return value is expected if expected is not None else value is None
+    if value is None:
+        return False
+    if op == 'in':
+        return value in _coerce_all(kind, raw)
+    target = _coerce(kind, raw)
+    if op == 'eq':
+        return value == target
+    if op == 'neq':
+        return value != target
+    if op == 'gt':
+        return value > target
+    if op == 'gte':
+        return value >= target
+    if op == 'lt':
+        return value < target
+    if op == 'lte':
+        return value <= target
+    raise FakeSupabaseError(400, 'PGRST100', f'Unsupported operator: {op}')
+
+
+@functools.lru_cache(maxsize=1024)
+def _coerce_all(kind, raw):
+    return frozenset(_coerce(kind, item) for item in raw)
+
+
+# ----------------- In-memory database -----------------
+class FakeDatabase:
+    """The tables, with PostgREST-style reads and writes under a single lock."""
+
+    def __init__(self):
+        self.tables = {name: [] for name in SCHEMA}
+        self.serial = {name: 0 for name in SERIAL_TABLES}
+        # Primary keys, and comments by issue, so the common point lookups skip a full scan
+        self.by_id = {name: {} for name in SERIAL_TABLES}
+        self.comments_by_issue = {}
+        self.unique = {table: {} for table in UNIQUE}
+        self.lock = threading.Lock()
+
+    def add(self, table, row):
+        self.tables[table].append(row)
+        if table in SERIAL_TABLES:
+            self.by_id[table][row['id']] = row
+        if table == 'issue_comments':
+            self.comments_by_issue.setdefault(row['issue_id'], []).append(row)
+        key = self._unique_key(table, row)
+        if key is not None:
+            self.unique[table][key] = row
+
+    def _unique_key(self, table, row):
+        columns = UNIQUE.get(table)
+        key = tuple(row.get(column) for column in columns) if columns else None
+        # NULLs never conflict
+        return key if key is not None and None not in key else None
+
+    def _candidates(self, table, filters):
+        """Rows that could match `filters`, using an index when one applies."""
+        for node in filters:
+            if node[0] != 'cond' or node[2]:
+                continue
+            _, column, _, op, raw = node
+            if column == 'id' and table in SERIAL_TABLES and op in ('eq', 'in'):
+                ids = [raw] if op == 'eq' else raw
+                rows = (self.by_id[table].get(int(value)) for value in ids)
+                return [row for row in rows if row is not None]
+            if column == 'issue_id' and table == 'issue_comments' and op == 'eq':
+                return self.comments_by_issue.get(int(raw), [])
+        return self.tables[table]
+
+    # --- row visibility (mirrors the RLS policies in the README) ---
+    def _role(self, user_id):
+        for profile in self.tables['profiles']:
+            if profile['id'] == user_id:
+                return profile.get('user_type')
+        return None
+
+    def _visible(self, table, row, user_id, government):
+        if user_id is None or government:
+            return True
+        if table == 'issues':
+            return row['user_id'] == user_id
+        if table == 'issue_comments':
+            issue = self.by_id['issues'].get(row['issue_id'])
+            return row['user_id'] == user_id or (issue is not None and issue['user_id'] == user_id)
+        if table == 'profiles':
+            return row['id'] == user_id
+        return False
+
+    def _may_write(self, table, operation, row, user_id, government):
+        if user_id is None:
+            return True
+        if table == 'issues':
+            return government if operation == 'update' else row.get('user_id') == user_id
+        if table == 'issue_comments':
+            issue = self.by_id['issues'].get(row.get('issue_id'))
+            return (operation == 'insert' and row.get('user_id') == user_id and issue is not None
+                    and (government or issue['user_id'] == user_id))
+        if table == 'profiles':
+            return row.get('id') == user_id
+        return False
+
+    # --- helpers ---
+    def _new_row(self, table, values):
+        row = {column: None for column in SCHEMA[table]}
+        row.update(DEFAULTS.get(table, {}))
+        if table in SERIAL_TABLES:
+            self.serial[table] += 1
+            row['id'] = self.serial[table]
+        now = _now().isoformat()
+        for column in ('created_at', 'updated_at'):
+            if column in row:
+                row[column] = now
+        row.update(self._clean(table, values))
+        return row
+
+    def _clean(self, table, values):
+        schema = SCHEMA[table]
+        unknown = [column for column in values if column not in schema]
+        if unknown:
+            raise FakeSupabaseError(400, 'PGRST204', f"Could not find the '{unknown[0]}' column of '{table}'")
+        # Timestamps are stored the way PostgREST renders timestamptz
+        return {column: _timestamp(value) if schema[column] is datetime and value else value
+                for column, value in values.items()}
+
+    def _conflict(self, table, row):
+        key = self._unique_key(table, row)
+        return self.unique[table].get(key) if key is not None else None
+
+    def _embed(self, row, relation, columns):
+        if relation != 'profiles' or 'user_id' not in row:
+            raise FakeSupabaseError(400, 'PGRST200', f"Could not find a relationship for '{relation}'")
+        for profile in self.tables['profiles']:
+            if profile['id'] == row['user_id']:
+                return self._project('profiles', profile, columns)
+        return None
+
+    def _project(self, table, row, select):
+        if not select or select == ['*']:
+            return dict(row)
+        projected = {}
+        for item in select:
+            if '(' in item:
+                relation, _, inner = item.partition('(')
+                projected[relation.strip()] = self._embed(row, relation.strip(), _split(inner[:-1]))
+            elif item == '*':
+                projected.update(row)
+            else:
+                projected[item] = row.get(item)
+        return projected
+
+    # --- operations ---
+    def select(self, table, filters, order, limit, offset, user_id, government):
+        schema = SCHEMA[table]
+        rows = [row for row in self._candidates(table, filters)
+                if self._visible(table, row, user_id, government) and all(_matches(row, f, schema) for f in filters)]
+        for column, desc in reversed(order):
+            present = [row for row in rows if row.get(column) is not None]
+            missing = [row for row in rows if row.get(column) is None]
+            present.sort(key=lambda row: row[column], reverse=desc)
+            # PostgreSQL puts NULLs first when descending, last when ascending
+            rows = missing + present if desc else present + missing
+        total = len(rows)
+        rows = rows[offset:offset + limit if limit is not None else None]
+        return rows, total
+
+    def insert(self, table, payload, resolution, user_id, government):
+        written = []
+        for values in payload:
+            row = self._new_row(table, values)
+            if not self._may_write(table, 'insert', row, user_id, government):
+                raise FakeSupabaseError(403, '42501', f'new row violates row-level security policy for table "{table}"')
+            existing = self._conflict(table, row)
+            if existing is not None:
+                if resolution == 'ignore-duplicates':
+                    continue
+                if resolution != 'merge-duplicates':
+                    raise FakeSupabaseError(409, '23505', 'duplicate key value violates unique constraint')
+                existing.update(self._clean(table, values))
+                written.append(existing)
+                continue
+            self.add(table, row)
+            written.append(row)
+            issue = self.by_id['issues'].get(row['issue_id']) if table == 'issue_comments' else None
+            if issue is not None:
+                # The comment_count trigger from the README
+                issue['comment_count'] += 1
+        return written
+
+    def update(self, table, values, filters, user_id, government):
+        rows, _ = self.select(table, filters, [], None, 0, user_id, government)
+        changes = self._clean(table, values)
+        updated = []
+        for row in rows:
+            if self._may_write(table, 'update', row, user_id, government):
+                row.update(changes)
+                updated.append(row)
+        return updated
+
+    def delete(self, table, filters, user_id, government):
+        rows, _ = self.select(table, filters, [], None, 0, user_id, government)
+        doomed = {id(row) for row in rows}
+        remaining = [row for row in self.tables[table] if id(row) not in doomed]
+        self.tables[table] = []
+        if table in SERIAL_TABLES:
+            self.by_id[table] = {}
+        if table == 'issue_comments':
+            self.comments_by_issue = {}
+        if table in UNIQUE:
+            self.unique[table] = {}
+        for row in remaining:
+            self.add(table, row)
+        return rows
+
+    def issue_stats(self, params, user_id, government):
+        """The issue_stats() SQL function: grouped counts, optionally for one owner."""
+        owner = params.get('p_user_id')
+        groups = {}
+        for row in self.tables['issues']:
+            if owner and row['user_id'] != owner:
+                continue
+            if not self._visible('issues', row, user_id, government):
+                continue
+            key = (row['status'], row['priority'], row['category'])
+            groups[key] = groups.get(key, 0) + 1
+        return [{'status': s, 'priority': p, 'category': c, 'total': total} for (s, p, c), total in groups.items()]
+
+
+# ----------------- PostgREST over HTTP -----------------
+class FakePostgrestTransport(httpx.BaseTransport):
+    """Answers PostgREST requests from a FakeDatabase, in-process."""
+
+    def __init__(self, database, service_key, jwt_secret, latency=0.0):
+        self.database = database
+        self.service_key = service_key
+        self.jwt_secret = jwt_secret
+        self.latency = latency
+
+    def handle_request(self, request):
+        if self.latency:
+            time.sleep(self.latency)
+        try:
+            status, body, headers = self._handle(request)
+        except FakeSupabaseError as e:
+            status, body, headers = e.status, e.body, {}
+        except (ValueError, KeyError, TypeError) as e:
+            status, body, headers = 400, {'code': 'PGRST100', 'message': str(e), 'details': None, 'hint': None}, {}
+        content = json.dumps(body).encode() if body is not None else b''
+        return httpx.Response(status, headers={'Content-Type': 'application/json', **headers},
+                              content=content, request=request)
+
+    def _caller(self, request):
+        """(user_id, government) for the bearer token; (None, True) for the service key."""
+        token = request.headers.get('authorization', '').removeprefix('Bearer ').strip()
+        if token == self.service_key:
+            return None, True
+        try:
+            claims = jwt.decode(token, self.jwt_secret, algorithms=['HS256'], audience='authenticated')
+        except jwt.PyJWTError as e:
+            raise FakeSupabaseError(401, 'PGRST301', f'JWT invalid: {e}')
+        return claims['sub'], self.database._role(claims['sub']) == 'government'
+
+    def _handle(self, request):
+        path = request.url.path.split('/rest/v1/', 1)[-1].strip('/')
+        user_id, government = self._caller(request)
+        payload = json.loads(request.content) if request.content else None
+        prefer = {key.strip(): value.strip() for key, _, value in
+                  (item.partition('=') for item in request.headers.get('prefer', '').split(',') if item)}
+
+        db = self.database
+        if path.startswith('rpc/'):
+            if path != 'rpc/issue_stats':
+                raise FakeSupabaseError(404, 'PGRST202', f'Could not find the function {path[4:]}')
+            with db.lock:
+                return 200, db.issue_stats(payload or {}, user_id, government), {}
+
+        table = path
+        if table not in SCHEMA:
+            raise FakeSupabaseError(404, '42P01', f'relation "public.{table}" does not exist')
+        schema = SCHEMA[table]
+
+        filters, order, limit, offset, select = [], [], None, 0, ['*']
+        for key, value in request.url.params.multi_items():
+            if key == 'select':
+                select = _split(value)
+            elif key == 'order':
+                for item in value.split(','):
+                    column, *modifiers = item.split('.')
+                    order.append((column, 'desc' in modifiers))
+            elif key == 'limit':
+                limit = int(value)
+            elif key == 'offset':
+                offset = int(value)
+            elif key in ('or', 'and'):
+                filters.append(_parse_logic(key, value))
+            elif key == 'on_conflict' or key == 'columns':
+                continue
+            else:
+                if key not in schema:
+                    raise FakeSupabaseError(400, '42703', f'column {table}.{key} does not exist')
+                filters.append(_parse_condition(key, value))
+
+        headers = {}
+        with db.lock:
+            if request.method in ('GET', 'HEAD'):
+                rows, total = db.select(table, filters, order, limit, offset, user_id, government)
+                status = 200
+            elif request.method == 'POST':
+                rows = db.insert(table, payload if isinstance(payload, list) else [payload],
+                                 prefer.get('resolution'), user_id, government)
+                total, status = len(rows), 201
+            elif request.method == 'PATCH':
+                rows = db.update(table, payload or {}, filters, user_id, government)
+                total, status = len(rows), 200
+            elif request.method == 'DELETE':
+                rows = db.delete(table, filters, user_id, government)
+                total, status = len(rows), 200
+            else:
+                raise FakeSupabaseError(405, 'PGRST117', f'Unsupported HTTP method: {request.method}')
+            # Copy under the lock; rows are mutated in place by later writes
+            body = [db._project(table, row, select) for row in rows]
+
+        if prefer.get('count') in ('exact', 'planned', 'estimated'):
+            headers['Content-Range'] = f'{offset}-{offset + len(body) - 1}/{total}' if body else f'*/{total}'
+        else:
+            headers['Content-Range'] = f'{offset}-{offset + len(body) - 1}/*' if body else '*/*'
+
+        if request.method != 'GET' and prefer.get('return') != 'representation':
+            return (201 if request.method == 'POST' else 204), None, headers
+        if request.method == 'HEAD':
+            return status, None, headers
+        if 'application/vnd.pgrst.object+json' in request.headers.get('accept', ''):
+            if len(body) != 1:
+                raise FakeSupabaseError(406, 'PGRST116', 'JSON object requested, multiple (or no) rows returned',
+                                        f'The result contains {len(body)} rows')
+            return status, body[0], headers
+        return status, body, headers
+
+
+# ----------------- Auth -----------------
+class FakeAuth:
+    """The supabase.auth calls the backend makes, issuing HS256 JWTs like GoTrue."""
+
+    def __init__(self, database, jwt_secret):
+        self.database = database
+        self.jwt_secret = jwt_secret
+        self.accounts = {}  # email -> (user id, password)
+        self.lock = threading.Lock()
+
+    def _user(self, user_id, email):
+        return SimpleNamespace(id=user_id, email=email)
+
+    def _session(self, user_id, email):
+        now = int(time.time())
+        access_token = jwt.encode({
+            'sub': user_id, 'email': email, 'aud': 'authenticated', 'role': 'authenticated',
+            'iat': now, 'exp': now + TOKEN_LIFETIME,
+        }, self.jwt_secret, algorithm='HS256')
+        return SimpleNamespace(access_token=access_token, refresh_token=uuid.uuid4().hex,
+                               expires_in=TOKEN_LIFETIME, token_type='bearer')
+
+    def add_account(self, email, password, user_id=None):
+        user_id = user_id or str(uuid.uuid4())
+        with self.lock:
+            self.accounts[email.lower()] = (user_id, password)
+        return user_id
+
+    def sign_up(self, credentials):
+        email = credentials['email'].lower()
+        with self.lock:
+            if email in self.accounts:
+                raise Exception('User already registered')
+        user_id = self.add_account(email, credentials['password'])
+        metadata = credentials.get('options', {}).get('data', {})
+        # What the usual handle_new_user trigger on auth.users does
+        with self.database.lock:
+            self.database.add('profiles', self.database._new_row('profiles', {
+                'id': user_id, 'email': email, 'full_name': metadata.get('full_name', ''),
+                'user_type': metadata.get('user_type', 'citizen'),
+            }))
+        return SimpleNamespace(user=self._user(user_id, email), session=self._session(user_id, email))
+
+    def sign_in_with_password(self, credentials):
+        email = credentials['email'].lower()
+        with self.lock:
+            account = self.accounts.get(email)
+        if account is None or account[1] != credentials['password']:
+            raise Exception('Invalid login credentials')
+        return SimpleNamespace(user=self._user(account[0], email), session=self._session(account[0], email))
+
+    def get_user(self, token):
+        try:
+            claims = jwt.decode(token, self.jwt_secret, algorithms=['HS256'], audience='authenticated')
+        except jwt.PyJWTError as e:
+            raise Exception(f'Invalid JWT: {e}')
+        return SimpleNamespace(user=self._user(claims['sub'], claims.get('email')))
+
+
+# ----------------- Seed data -----------------
+def seed(database, auth, citizens, officials, issues, comments, seed_value=0):
+    """Fill the tables with reproducible synthetic users, issues and comments.
+
+    Citizens sign in as citizen<i>@example.com and officials as official<i>@example.com,
+    all with the password SEED_PASSWORD. Issues are spread over the last year, and about
+    two thirds of them have coordinates (around a single city, for the map view).
+    """
+    rng = random.Random(seed_value)
+    now = _now()
+    people = []
+    for role, prefix, count in (('citizen', 'citizen', citizens), ('government', 'official', officials)):
+        for i in range(count):
+            email = f'{prefix}{i}@example.com'
+            user_id = str(uuid.UUID(int=rng.getrandbits(128), version=4))
+            auth.add_account(email, SEED_PASSWORD, user_id)
+            database.add('profiles', {'id': user_id, 'email': email, 'full_name': f'{prefix.title()} {i}',
+                             'user_type': role, 'created_at': (now - timedelta(days=400)).isoformat()})
+            people.append((user_id, f'{prefix.title()} {i}'))
+
+    citizen_ids = [user_id for user_id, _ in people[:citizens]] or [user_id for user_id, _ in people]
+    for i in range(issues):
+        created = now - timedelta(seconds=rng.randint(0, 365 * 86400))
+        located = rng.random() < 0.66
+        words = rng.sample(WORDS, 4)
+        database.add('issues', {
+            'id': i + 1,
+            'user_id': rng.choice(citizen_ids),
+            'title': ' '.join(words[:3]).capitalize(),
+            'description': ' '.join(rng.choice(WORDS) for _ in range(rng.randint(8, 30))),
+            'category': rng.choice(CATEGORIES),
+            'location_text': f'{rng.randint(1, 300)} {rng.choice(PLACES)}',
+            'priority': rng.choice(PRIORITIES),
+            'status': rng.choice(STATUSES),
+            'image_url': [],
+            'thumbnail_url': [],
+            'is_anonymous': rng.random() < 0.1,
+            'language': 'english',
+            'assigned_to': None,
+            'notes': None,
+            'latitude': round(12.97 + rng.uniform(-0.2, 0.2), 6) if located else None,
+            'longitude': round(77.59 + rng.uniform(-0.2, 0.2), 6) if located else None,
+            'comment_count': 0,
+            'idempotency_key': None,
+            'created_at': created.isoformat(),
+            'updated_at': (created + timedelta(seconds=rng.randint(0, 30 * 86400))).isoformat(),
+        })
+    issue_rows = database.tables['issues']
+    database.serial['issues'] = len(issue_rows)
+
+    for i in range(comments if issue_rows else 0):
+        issue = rng.choice(issue_rows)
+        user_id, name = rng.choice(people)
+        database.add('issue_comments', {
+            'id': i + 1,
+            'issue_id': issue['id'],
+            'user_id': user_id,
+            'author_name': name,
+            'comment': ' '.join(rng.choice(WORDS) for _ in range(rng.randint(3, 20))),
+            'created_at': (datetime.fromisoformat(issue['created_at']) + timedelta(seconds=rng.randint(60, 86400))).isoformat(),
+        })
+        issue['comment_count'] += 1
+    database.serial['issue_comments'] = len(database.tables['issue_comments'])
+
+
+class FakeSupabase:
+    """What app.py needs from Supabase: `.auth`, plus a transport to hand to init_clients."""
+
+    def __init__(self, jwt_secret=DEFAULT_JWT_SECRET, latency=0.0):
+        self.url = FAKE_URL
+        self.service_key = FAKE_SERVICE_KEY
+        self.jwt_secret = jwt_secret
+        self.database = FakeDatabase()
+        self.auth = FakeAuth(self.database, jwt_secret)
+        self.transport = FakePostgrestTransport(self.database, self.service_key, jwt_secret, latency)
+
+    @classmethod
+    def from_env(cls):
+        fake = cls(
+            jwt_secret=os.getenv('SUPABASE_JWT_SECRET') or DEFAULT_JWT_SECRET,
+            latency=float(os.getenv('FAKE_SUPABASE_LATENCY_MS', 0)) / 1000,
+        )
+        seed(
+            fake.database, fake.auth,
+            citizens=int(os.getenv('FAKE_SUPABASE_CITIZENS', 100)),
+            officials=int(os.getenv('FAKE_SUPABASE_OFFICIALS', 5)),
+            issues=int(os.getenv('FAKE_SUPABASE_ISSUES', 10000)),
+            comments=int(os.getenv('FAKE_SUPABASE_COMMENTS', 20000)),
+            seed_value=int(os.getenv('FAKE_SUPABASE_SEED', 0)),
+        )
+        return fake
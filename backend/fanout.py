@@ -0,0 +1,33 @@
+import contextvars
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Shared by all requests in this worker, so the number of extra threads stays bounded
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('FANOUT_MAX_WORKERS', 32)),
+    thread_name_prefix='fanout',
+)
+
+DEFAULT_TIMEOUT = float(os.getenv('FANOUT_TIMEOUT', 10))
+
+
+def gather(*calls, timeout=DEFAULT_TIMEOUT):
+    """Run independent zero-argument callables concurrently and return their results in order.
+
+    Each call gets `timeout` seconds from submission; the first failure or timeout
+    is raised (concurrent.futures.TimeoutError for timeouts). Calls run outside the
+    Flask request context, so resolve anything request-bound (e.g. clients.user_client())
+    before building them.
+    """
+    # Each call runs in a copy of the caller's context so context variables still apply
+    futures = [_executor.submit(contextvars.copy_context().run, call) for call in calls]
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    try:
+        return [
+            future.result(timeout=None if deadline is None else max(0, deadline - time.monotonic()))
+            for future in futures
+        ]
+    finally:
+        for future in futures:
+            future.cancel()
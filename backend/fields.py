@@ -0,0 +1,52 @@
+# ----------------- Column projections -----------------
+# Listings select only what list views render; the full row is fetched by GET /api/issues/<id>.
+# Clients can ask for a different set with ?fields=a,b,c, checked against a per-endpoint allowlist.
+
+ISSUE_COLUMNS = (
+    'id', 'user_id', 'title', 'description', 'category', 'location_text', 'priority',
+    'status', 'image_url', 'thumbnail_url', 'is_anonymous', 'language', 'assigned_to', 'notes',
+    'latitude', 'longitude', 'comment_count', 'idempotency_key', 'created_at', 'updated_at',
+)
+
+# Allowed fields map to the select expression sent to PostgREST
+ISSUE_LIST_ALLOWED = {column: column for column in ISSUE_COLUMNS}
+ISSUE_LIST_DEFAULT = (
+    'id', 'user_id', 'title', 'category', 'location_text', 'priority', 'status',
+    'comment_count', 'created_at', 'updated_at',
+)
+# The citizen dashboard shows each issue's first photo (its thumbnail when there is one)
+CITIZEN_RECENT_DEFAULT = ISSUE_LIST_DEFAULT + ('image_url', 'thumbnail_url')
+
+COMMENT_LIST_ALLOWED = {
+    'id': 'id',
+    'issue_id': 'issue_id',
+    'user_id': 'user_id',
+    'author_name': 'author_name',
+    'comment': 'comment',
+    'created_at': 'created_at',
+    # Joined author profile; author_name is stored with the comment and needs no join
+    'profiles': 'profiles(full_name)',
+}
+COMMENT_LIST_DEFAULT = ('id', 'issue_id', 'user_id', 'author_name', 'comment', 'created_at')
+
+# Keyset pagination needs these no matter what was asked for
+PAGINATION_FIELDS = ('id', 'created_at')
+
+
+def projection(raw, allowed, default, required=PAGINATION_FIELDS):
+    """Build a PostgREST select string from a `fields` query parameter.
+
+    Raises ValueError for fields outside the endpoint's allowlist.
+    """
+    if raw:
+        names = [name.strip() for name in raw.split(',') if name.strip()]
+        unknown = [name for name in names if name not in allowed]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    else:
+        names = list(default)
+    for name in required:
+        if name not in names:
+            names.append(name)
+    # dict.fromkeys drops duplicates while keeping the requested order
+    return ','.join(allowed[name] for name in dict.fromkeys(names))
@@ -0,0 +1,319 @@
+import bisect
+import math
+import os
+import threading
+
+import clients
+from pagination import iter_rows
+
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+# Points are stored in cells of this precision (~38m x 19m at precision 8)
+MAX_PRECISION = 8
+# A map response never has more than this many points or cluster cells
+MAX_POINTS = int(os.getenv('MAP_MAX_POINTS', 500))
+MAX_CLUSTER_CELLS = int(os.getenv('MAP_MAX_CLUSTER_CELLS', 256))
+
+INDEX_COLUMNS = 'id, user_id, latitude, longitude, category, status, priority, created_at'
+EARTH_RADIUS_KM = 6371.0
+
+
+def encode(lat, lng, precision=MAX_PRECISION):
+    """Standard geohash of a point."""
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, bit_count, even = [], 0, 0, True
+    while len(chars) < precision:
+        rng, value = (lng_range, lng) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        bits <<= 1
+        if value >= mid:
+            bits |= 1
+            rng[0] = mid
+        else:
+            rng[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_BASE32[bits])
+            bits, bit_count = 0, 0
+    return ''.join(chars)
+
+
+def cell_size(precision):
+    """(lat degrees, lng degrees) covered by one geohash cell."""
+    total_bits = 5 * precision
+    lng_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lng_bits)
+
+
+def _axis_range(low, high, origin, span, size):
+    """Indexes of the first and last grid steps of `size` overlapping [low, high]."""
+    high = min(high, origin + span - 1e-9)
+    return math.floor((max(low, origin) - origin) / size), math.floor((high - origin) / size)
+
+
+def covering_cells(min_lat, min_lng, max_lat, max_lng, precision):
+    """Geohashes of every cell at `precision` that overlaps the box."""
+    dlat, dlng = cell_size(precision)
+    lat_first, lat_last = _axis_range(min_lat, max_lat, -90.0, 180.0, dlat)
+    lng_first, lng_last = _axis_range(min_lng, max_lng, -180.0, 360.0, dlng)
+    return [
+        encode(-90.0 + (i + 0.5) * dlat, -180.0 + (j + 0.5) * dlng, precision)
+        for i in range(lat_first, lat_last + 1)
+        for j in range(lng_first, lng_last + 1)
+    ]
+
+
+def cell_count(min_lat, min_lng, max_lat, max_lng, precision):
+    dlat, dlng = cell_size(precision)
+    lat_first, lat_last = _axis_range(min_lat, max_lat, -90.0, 180.0, dlat)
+    lng_first, lng_last = _axis_range(min_lng, max_lng, -180.0, 360.0, dlng)
+    return (lat_last - lat_first + 1) * (lng_last - lng_first + 1)
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = math.sin((phi2 - phi1) / 2) ** 2 + \
+        math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def radius_bbox(lat, lng, radius_km):
+    dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    dlng = math.degrees(radius_km / (EARTH_RADIUS_KM * max(math.cos(math.radians(lat)), 1e-6)))
+    return max(lat - dlat, -90.0), max(lng - dlng, -180.0), min(lat + dlat, 90.0), min(lng + dlng, 180.0)
+
+
+class SpatialIndex:
+    """Geohash-bucketed index of issue locations.
+
+    Each point lives in one MAX_PRECISION cell; per-cell counts (by category) are kept
+    for every coarser precision too, so zoomed-out views are answered from at most
+    MAX_CLUSTER_CELLS counters however many issues are indexed.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._points = {}                    # issue id -> point dict
+        self._members = {}                   # finest geohash -> set of issue ids
+        self._keys = []                      # sorted finest geohashes, for prefix scans
+        self._cells = [dict() for _ in range(MAX_PRECISION + 1)]  # precision -> geohash -> cell stats
+        self._by_user = {}                   # user id -> set of issue ids
+        self._pending = None                 # changes made during a rebuild, replayed before the swap
+
+    def __len__(self):
+        return len(self._points)
+
+    def add(self, issue):
+        lat, lng = issue.get('latitude'), issue.get('longitude')
+        if lat is None or lng is None:
+            self.remove(issue['id'])
+            return
+        point = {
+            'id': issue['id'],
+            'lat': float(lat),
+            'lng': float(lng),
+            'category': issue.get('category'),
+            'status': issue.get('status'),
+            'priority': issue.get('priority'),
+            'user_id': issue.get('user_id'),
+        }
+        geohash = encode(point['lat'], point['lng'])
+        with self._lock:
+            self._record('add', issue)
+            self._remove_locked(point['id'])
+            point['geohash'] = geohash
+            self._points[point['id']] = point
+            members = self._members.get(geohash)
+            if members is None:
+                members = self._members[geohash] = set()
+                bisect.insort(self._keys, geohash)
+            members.add(point['id'])
+            self._by_user.setdefault(point['user_id'], set()).add(point['id'])
+            self._count(point, 1)
+
+    def update(self, old_issue, new_issue):
+        if 'latitude' in new_issue:
+            self.add({**old_issue, **new_issue})
+            return
+        with self._lock:
+            self._record('update', old_issue, new_issue)
+            point = self._points.get(old_issue['id'])
+            if point:
+                for field in ('status', 'priority'):
+                    if field in new_issue:
+                        point[field] = new_issue[field]
+
+    def remove(self, issue_id):
+        with self._lock:
+            self._record('remove', issue_id)
+            self._remove_locked(issue_id)
+
+    def _record(self, method, *args):
+        if self._pending is not None:
+            self._pending.append((method, args))
+
+    def _remove_locked(self, issue_id):
+        point = self._points.pop(issue_id, None)
+        if point is None:
+            return
+        members = self._members[point['geohash']]
+        members.discard(issue_id)
+        if not members:
+            del self._members[point['geohash']]
+            del self._keys[bisect.bisect_left(self._keys, point['geohash'])]
+        owned = self._by_user.get(point['user_id'])
+        if owned is not None:
+            owned.discard(issue_id)
+            if not owned:
+                del self._by_user[point['user_id']]
+        self._count(point, -1)
+
+    def _count(self, point, delta):
+        for precision in range(1, MAX_PRECISION + 1):
+            cells = self._cells[precision]
+            key = point['geohash'][:precision]
+            cell = cells.get(key)
+            if cell is None:
+                cell = cells[key] = {'count': 0, 'lat_sum': 0.0, 'lng_sum': 0.0, 'categories': {}}
+            cell['count'] += delta
+            cell['lat_sum'] += delta * point['lat']
+            cell['lng_sum'] += delta * point['lng']
+            # The same counters per category, so a filtered view has the right centroids too
+            by_category = cell['categories'].setdefault(point['category'], {'count': 0, 'lat_sum': 0.0, 'lng_sum': 0.0})
+            by_category['count'] += delta
+            by_category['lat_sum'] += delta * point['lat']
+            by_category['lng_sum'] += delta * point['lng']
+            if by_category['count'] <= 0:
+                del cell['categories'][point['category']]
+            if cell['count'] <= 0:
+                del cells[key]
+
+    def query(self, min_lat, min_lng, max_lat, max_lng, category=None, user_id=None, radius=None):
+        """Points inside the box when there are few enough, otherwise clustered counts.
+
+        `user_id` restricts the result to that user's issues; `radius` is an optional
+        (lat, lng, km) circle that points must also fall within.
+        """
+        with self._lock:
+            if user_id is not None or radius:
+                # The cell counters cannot answer these filters: filter the points, then cluster them
+                if user_id is not None:
+                    candidates = (self._points[i] for i in self._by_user.get(user_id, ()))
+                else:
+                    candidates = self._points_in(min_lat, min_lng, max_lat, max_lng)
+                points = self._filter(candidates, min_lat, min_lng, max_lat, max_lng, category, radius)
+                if len(points) <= MAX_POINTS:
+                    return {'mode': 'points', 'points': points}
+                return self._cluster_points(points, min_lat, min_lng, max_lat, max_lng)
+
+            precision = self._cluster_precision(min_lat, min_lng, max_lat, max_lng)
+            cells = self._cells[precision]
+            clusters = []
+            total = 0
+            for key in covering_cells(min_lat, min_lng, max_lat, max_lng, precision):
+                cell = cells.get(key)
+                if cell and category:
+                    cell = cell['categories'].get(category)
+                if not cell or cell['count'] <= 0:
+                    continue
+                total += cell['count']
+                clusters.append({
+                    'geohash': key,
+                    'count': cell['count'],
+                    'lat': cell['lat_sum'] / cell['count'],
+                    'lng': cell['lng_sum'] / cell['count'],
+                })
+
+            if total <= MAX_POINTS:
+                candidates = (self._points[i] for key in (c['geohash'] for c in clusters)
+                              for i in self._ids_with_prefix(key))
+                points = self._filter(candidates, min_lat, min_lng, max_lat, max_lng, category, radius)
+                return {'mode': 'points', 'points': points}
+            return {'mode': 'clusters', 'precision': precision, 'total': total, 'clusters': clusters}
+
+    def _cluster_precision(self, min_lat, min_lng, max_lat, max_lng):
+        for precision in range(MAX_PRECISION, 0, -1):
+            if cell_count(min_lat, min_lng, max_lat, max_lng, precision) <= MAX_CLUSTER_CELLS:
+                return precision
+        return 1
+
+    def _points_in(self, min_lat, min_lng, max_lat, max_lng):
+        """Points in the cells covering the box (a superset of those inside it)."""
+        precision = self._cluster_precision(min_lat, min_lng, max_lat, max_lng)
+        cells = self._cells[precision]
+        for key in covering_cells(min_lat, min_lng, max_lat, max_lng, precision):
+            if key in cells:
+                for issue_id in self._ids_with_prefix(key):
+                    yield self._points[issue_id]
+
+    def _ids_with_prefix(self, prefix):
+        start = bisect.bisect_left(self._keys, prefix)
+        for key in self._keys[start:]:
+            if not key.startswith(prefix):
+                break
+            yield from self._members[key]
+
+    @staticmethod
+    def _filter(candidates, min_lat, min_lng, max_lat, max_lng, category, radius):
+        points = []
+        for point in candidates:
+            if not (min_lat <= point['lat'] <= max_lat and min_lng <= point['lng'] <= max_lng):
+                continue
+            if category and point['category'] != category:
+                continue
+            if radius and haversine_km(radius[0], radius[1], point['lat'], point['lng']) > radius[2]:
+                continue
+            points.append({key: point[key] for key in ('id', 'lat', 'lng', 'category', 'status', 'priority')})
+        return points
+
+    def _cluster_points(self, points, min_lat, min_lng, max_lat, max_lng):
+        precision = self._cluster_precision(min_lat, min_lng, max_lat, max_lng)
+        cells = {}
+        for point in points:
+            key = encode(point['lat'], point['lng'], precision)
+            cell = cells.setdefault(key, {'geohash': key, 'count': 0, 'lat': 0.0, 'lng': 0.0})
+            cell['count'] += 1
+            cell['lat'] += point['lat']
+            cell['lng'] += point['lng']
+        for cell in cells.values():
+            cell['lat'] /= cell['count']
+            cell['lng'] /= cell['count']
+        return {'mode': 'clusters', 'precision': precision, 'total': len(points), 'clusters': list(cells.values())}
+
+    def rebuild(self, rows):
+        with self._lock:
+            self._pending = []
+        fresh = SpatialIndex()
+        try:
+            for row in rows:
+                fresh.add(row)
+            with self._lock:
+                # Writes made since the scan started went to this index only; the scan may have
+                # missed them, so apply them again (re-adding a row is harmless) before swapping
+                for method, args in self._pending:
+                    getattr(fresh, method)(*args)
+                self.__dict__.update({key: value for key, value in fresh.__dict__.items()
+                                      if key not in ('_lock', '_pending')})
+        finally:
+            with self._lock:
+                self._pending = None
+
+
+spatial_index = SpatialIndex()
+
+
+def init_spatial_index():
+    """Load every located issue into the index in the background."""
+    def make_query():
+        return clients.service().table('issues').select(INDEX_COLUMNS).not_.is_('latitude', 'null')
+
+    def run():
+        try:
+            spatial_index.rebuild(iter_rows(make_query, page_size=1000))
+            print(f"Spatial index built with {len(spatial_index)} located issues")
+        except Exception as e:
+            print(f"ERROR building spatial index: {e}")
+
+    threading.Thread(target=run, name='spatial-index', daemon=True).start()
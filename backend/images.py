@@ -0,0 +1,74 @@
+import io
+import os
+
+from PIL import Image, ImageOps
+
+# Runs in the upload process pool: keep this module free of Flask/Supabase imports so
+# spawning a worker stays cheap.
+
+THUMBNAIL_SIZE = int(os.getenv('UPLOAD_THUMBNAIL_SIZE', 320))
+# Refuse to decode images larger than this (decompression bombs)
+Image.MAX_IMAGE_PIXELS = int(os.getenv('UPLOAD_MAX_PIXELS', 50_000_000))
+
+# Sniffed format -> (Pillow format, file extension)
+FORMATS = {
+    'jpeg': ('JPEG', 'jpg'),
+    'png': ('PNG', 'png'),
+    'webp': ('WEBP', 'webp'),
+}
+
+
+def sniff(head):
+    """Image format from the first bytes of a file, or None. The Content-Type is not trusted."""
+    if head.startswith(b'\xff\xd8\xff'):
+        return 'jpeg'
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'png'
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'webp'
+    return None
+
+
+def _to_rgb(image):
+    """JPEG has no alpha channel, so put transparent images on a white background."""
+    if image.mode in ('RGB', 'L'):
+        return image
+    image = image.convert('RGBA')
+    background = Image.new('RGB', image.size, (255, 255, 255))
+    background.paste(image, mask=image.getchannel('A'))
+    return background
+
+
+def _encode(image, image_format, **options):
+    buffer = io.BytesIO()
+    image.save(buffer, image_format, **options)
+    buffer.seek(0)
+    return buffer
+
+
+def process_upload(storage, incoming_key, original_key, thumbnail_key, image_format):
+    """Re-encode an upload without its metadata and write a thumbnail next to it.
+
+    EXIF (including GPS position) is dropped by re-encoding; the orientation it
+    carried is applied to the pixels first so photos still display upright.
+    """
+    try:
+        with storage.open(incoming_key) as f:
+            image = Image.open(f)
+            image.load()
+        icc_profile = image.info.get('icc_profile')
+        image = ImageOps.exif_transpose(image)
+
+        pillow_format, _ = FORMATS[image_format]
+        if pillow_format == 'JPEG':
+            image = _to_rgb(image)
+        options = {'icc_profile': icc_profile} if icc_profile else {}
+        if pillow_format in ('JPEG', 'WEBP'):
+            options['quality'] = 90
+        storage.save(original_key, [_encode(image, pillow_format, **options).getvalue()])
+
+        thumbnail = image.copy()
+        thumbnail.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+        storage.save(thumbnail_key, [_encode(_to_rgb(thumbnail), 'JPEG', quality=80, optimize=True).getvalue()])
+    finally:
+        storage.delete(incoming_key)
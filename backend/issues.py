@@ -1,65 +1,208 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, current_app, request, jsonify, Response, stream_with_context
 from supabase import Client
+from postgrest.exceptions import APIError
 from datetime import datetime
-from auth import token_required
+import csv
+import io
+import json
+import os
+from auth import token_required, role_required
+import clients
+import profiles
+from pagination import page_size, count_mode, decode_cursor, fetch_page, iter_rows
+from fields import projection, ISSUE_COLUMNS, ISSUE_LIST_ALLOWED, ISSUE_LIST_DEFAULT, COMMENT_LIST_ALLOWED, COMMENT_LIST_DEFAULT
+import counters
+from counters import dashboard_counters
+from events import event_bus
+from duplicates import duplicate_index
+from search import search_index
+from geo import spatial_index, radius_bbox
+from conditional import make_etag, parse_timestamp, has_validators, is_not_modified, not_modified, with_validators
+from fanout import gather
+from resilience import hedged
+from response_cache import dashboard_cache, citizen_dashboard_key, GOVERNMENT_DASHBOARD_KEY
+from write_queue import write_queue
 
 issues_bp = Blueprint('issues', __name__)
 supabase: Client = None
 
+# Fields stored lowercase on every write (see the `issue_stats` RPC in the README)
+NORMALIZED_FIELDS = ('status', 'priority')
+
 def init_issues(supabase_client):
     global supabase
     supabase = supabase_client
 
+# ----------------- Conditional GET -----------------
+def _issue_version(issue):
+    # comment_count is bumped by a trigger without touching updated_at, so it is part of the version
+    changed_at = issue.get('updated_at') or issue.get('created_at')
+    return make_etag('issue', issue['id'], changed_at, issue.get('comment_count')), parse_timestamp(changed_at)
+
+def _comments_version(issue_id, version_response):
+    latest = version_response.data[0]['created_at'] if version_response.data else None
+    return make_etag('comments', issue_id, version_response.count, latest), parse_timestamp(latest)
+
+REQUIRED_ISSUE_FIELDS = ('title', 'description', 'category', 'location_text')
+
+def _build_issue(data, user_id):
+    """Validate a report and build the row to insert; raises ValueError with a client-facing message."""
+    # --- CHANGE: Updated validation for 'location_text' and cleaned data ---
+    for field in REQUIRED_ISSUE_FIELDS:
+        if field not in data or not data[field]:
+            raise ValueError(f'{field} is required')
+        if not isinstance(data[field], str):
+            raise ValueError(f'{field} must be a string')
+
+    latitude, longitude = _parse_coordinates(data)
+
+    return {
+        'user_id': user_id,
+        'title': data['title'].strip(),
+        'description': data['description'].strip(),
+        'category': data['category'].strip().lower(),
+        'location_text': data['location_text'].strip(),
+        'priority': (data.get('priority') or 'medium').strip().lower(),
+        'status': 'reported',  # Set initial status consistently
+        'image_url': data.get('image_url', []), # Default to empty array
+        # Small versions from POST /api/uploads, for list views
+        'thumbnail_url': data.get('thumbnail_url', []),
+        'is_anonymous': data.get('is_anonymous', False),
+        'language': data.get('language', 'english'),
+        # Optional map position; always present so batch inserts have uniform rows
+        'latitude': latitude,
+        'longitude': longitude,
+        # --- REMOVED: Let the database handle id, created_at, and updated_at ---
+    }
+
+def _parse_coordinates(data):
+    latitude, longitude = data.get('latitude'), data.get('longitude')
+    if latitude is None and longitude is None:
+        return None, None
+    if latitude is None or longitude is None:
+        raise ValueError('latitude and longitude must be provided together')
+    try:
+        latitude, longitude = float(latitude), float(longitude)
+    except (TypeError, ValueError):
+        raise ValueError('latitude and longitude must be numbers')
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ValueError('latitude must be within [-90, 90] and longitude within [-180, 180]')
+    return latitude, longitude
+
+UPDATABLE_FIELDS = ('status', 'priority', 'assigned_to', 'notes')
+
+def _clean_update(data):
+    """Pick the updatable fields out of a request body, cleaned for storage."""
+    update_data = {}
+    # --- CHANGE: Clean any incoming data before updating ---
+    for field in UPDATABLE_FIELDS:
+        if field in data:
+            # Clean the data before adding it to the update payload
+            update_data[field] = data[field].strip() if isinstance(data[field], str) else data[field]
+            # Status/priority are stored lowercase so reads never need to normalize them
+            if field in NORMALIZED_FIELDS and isinstance(update_data[field], str):
+                update_data[field] = update_data[field].lower()
+    return update_data
+
+# ----------------- Write hooks -----------------
+# Keep derived state (dashboard counters, cached dashboard responses and the
+# duplicate, search and spatial indexes) in step with writes made through this API,
+# and publish each change (with its counter delta) to live dashboard streams.
+# Columns an update must read beforehand so the hooks can see what changed.
+HOOK_COLUMNS = 'id, user_id, status, priority, category, latitude, longitude'
+
+def _on_issue_created(issue):
+    dashboard_counters.record_created(issue)
+    duplicate_index.add(issue)
+    search_index.add(issue)
+    spatial_index.add(issue)
+    dashboard_cache.invalidate(citizen_dashboard_key(issue['user_id']), GOVERNMENT_DASHBOARD_KEY)
+    event_bus.publish('issue.created', {
+        'issue': issue,
+        'counters': counters.delta(counters.created_changes(issue)),
+    }, owner_id=issue['user_id'])
+
+def _on_issue_updated(old_issue, new_issue):
+    dashboard_counters.record_updated(old_issue, new_issue)
+    duplicate_index.update(old_issue, new_issue)
+    search_index.update(old_issue, new_issue)
+    spatial_index.update(old_issue, new_issue)
+    dashboard_cache.invalidate(citizen_dashboard_key(old_issue['user_id']), GOVERNMENT_DASHBOARD_KEY)
+    changes = counters.updated_changes(old_issue, new_issue)
+    event_bus.publish('issue.updated', {
+        'issue': new_issue,
+        'counters': counters.delta(changes) if changes else None,
+    }, owner_id=old_issue['user_id'])
+
+def _issue_owner(issue_id):
+    result = clients.service().table('issues').select('user_id').eq('id', issue_id).limit(1).execute()
+    return result.data[0]['user_id'] if result.data else None
+
+def _on_comment_added(comment, owner_id=None):
+    # The commented issue's owner, not the commenter: their dashboard shows its comment_count
+    owner_id = owner_id or _issue_owner(comment['issue_id'])
+    dashboard_cache.invalidate(citizen_dashboard_key(owner_id), GOVERNMENT_DASHBOARD_KEY)
+    # Streams are scoped to the issue's owner, so a citizen hears about officials' comments too
+    event_bus.publish('comment.added', {'comment': comment}, owner_id=owner_id)
+
+# Rows flushed from the write-behind queue get the same hooks once they are inserted
+write_queue.handlers.update(issue=_on_issue_created, comment=_on_comment_added)
+
 # --- CHANGE: Route updated to '/' since '/api/issues' is the blueprint prefix ---
 @issues_bp.route('/', methods=['POST'])
 @token_required
 def report_issue():
     """Report a new issue"""
     try:
-        # --- CHANGE: Use user_id and token from the decorator and headers ---
+        # --- CHANGE: Use user_id from the decorator ---
         user_id = request.user_id
-        token = request.headers.get('Authorization').split(" ")[1]
         data = request.get_json()
 
         if not data:
             return jsonify({'message': 'Invalid request body'}), 400
 
-        # --- CHANGE: Updated validation for 'location_text' and cleaned data ---
-        required_fields = ['title', 'description', 'category', 'location_text']
-        for field in required_fields:
-            if field not in data or not data[field]:
-                return jsonify({'message': f'{field} is required'}), 400
-
-        issue_data = {
-            'user_id': user_id,
-            'title': data['title'].strip(),
-            'description': data['description'].strip(),
-            'category': data['category'].strip().lower(),
-            'location_text': data['location_text'].strip(),
-            'priority': data.get('priority', 'medium').strip().lower(),
-            'status': 'reported',  # Set initial status consistently
-            'image_url': data.get('image_url', []), # Default to empty array
-            'is_anonymous': data.get('is_anonymous', False),
-            'language': data.get('language', 'english'),
-            # --- REMOVED: Let the database handle id, created_at, and updated_at ---
-        }
-
-        # --- CHANGE: Switch to user's token to enforce RLS INSERT policies ---
-        original_auth = supabase.postgrest.auth
         try:
-            supabase.postgrest.auth(token)
-            # Insert issue into database
-            result = supabase.table('issues').insert(issue_data).execute()
-        finally:
-            # Restore the service role key for other operations
-            supabase.postgrest.auth(original_auth)
+            issue_data = _build_issue(data, user_id)
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
+
+        # Look for open issues that already describe the same problem (in-memory, no query).
+        # Citizens only see the details of their own issues, as RLS would show them.
+        viewer = None if profiles.get_role(user_id) == 'government' else user_id
+        duplicates = duplicate_index.candidates(issue_data, user_id=viewer)
+        if data.get('attach_to') is not None:
+            return _attach_report(data['attach_to'], issue_data, duplicates)
+        if duplicates and data.get('check_duplicates'):
+            # The client asked to confirm first; it can resend with attach_to or without check_duplicates
+            return jsonify({
+                'message': 'Possible duplicate issues found',
+                'duplicates': duplicates
+            }), 409
+
+        if write_queue.running:
+            # Write-behind: acknowledge once the report is journaled; it is inserted in a batch shortly.
+            # The row has no id yet: GET /queued/<queue_id> returns it once it has been written.
+            queue_id = write_queue.enqueue('issue', user_id, issue_data)
+            return jsonify({
+                'message': 'Issue report accepted',
+                'queue_id': queue_id,
+                'queue_status': 'queued',
+                'issue': issue_data,
+                'possible_duplicates': duplicates
+            }), 202
+
+        # --- CHANGE: Insert with the user's own client to enforce RLS INSERT policies ---
+        result = clients.user_client().table('issues').insert(issue_data).execute()
 
         if not result.data:
             raise Exception("Failed to insert issue. Check RLS policies.")
 
+        _on_issue_created(result.data[0])
+
         return jsonify({
             'message': 'Issue reported successfully',
-            'issue': result.data[0]
+            'issue': result.data[0],
+            'possible_duplicates': duplicates
         }), 201
 
     except Exception as e:
@@ -67,41 +210,157 @@ def report_issue():
         return jsonify({'message': 'Failed to report issue', 'error': str(e)}), 500
 
 
+def _attach_report(issue_id, issue_data, duplicates):
+    """Record a duplicate report as a comment on the existing issue instead of a new row"""
+    # Only issues the index itself suggested may be targeted, and the comment is written as
+    # the user, so the comment INSERT policy still decides whether they may comment there
+    if issue_id not in {candidate['id'] for candidate in duplicates}:
+        return jsonify({'message': 'attach_to must be one of the suggested duplicate issues'}), 400
+
+    profile = profiles.get_profile(issue_data['user_id']) or {}
+    comment_data = {
+        'issue_id': issue_id,
+        'user_id': issue_data['user_id'],
+        'author_name': profile.get('full_name'),
+        'comment': f"Also reported: {issue_data['title']}\n{issue_data['description']}\nLocation: {issue_data['location_text']}",
+    }
+    try:
+        result = clients.user_client().table('issue_comments').insert(comment_data).execute()
+    except APIError as e:
+        if e.code != '42501':
+            raise
+        result = None
+    if not result or not result.data:
+        return jsonify({'message': 'You cannot comment on this issue; report it as a new issue instead'}), 403
+
+    _on_comment_added(result.data[0])
+
+    return jsonify({
+        'message': 'Report attached to an existing issue',
+        'issue_id': issue_id,
+        'comment': result.data[0]
+    }), 200
+
+
+BATCH_MAX_ISSUES = int(os.getenv('BATCH_MAX_ISSUES', 100))
+
+@issues_bp.route('/batch', methods=['POST'])
+@token_required
+def report_issues_batch():
+    """Report several issues at once (e.g. a queue uploaded after being offline)
+
+    Body: {"issues": [{"idempotency_key": "<client uuid>", "title": ..., ...}, ...]}.
+    Reports already received under the same key are returned as duplicates
+    instead of being inserted again, so clients can safely retry a whole batch.
+    """
+    try:
+        user_id = request.user_id
+        data = request.get_json()
+
+        reports = data.get('issues') if isinstance(data, dict) else None
+        if not isinstance(reports, list) or not reports:
+            return jsonify({'message': '"issues" must be a non-empty list'}), 400
+        if len(reports) > BATCH_MAX_ISSUES:
+            return jsonify({'message': f'At most {BATCH_MAX_ISSUES} issues per batch'}), 400
+
+        results = []
+        rows = {}  # idempotency_key -> row to insert
+        for index, report in enumerate(reports):
+            key = report.get('idempotency_key') if isinstance(report, dict) else None
+            result = {'index': index, 'idempotency_key': key}
+            results.append(result)
+            if not isinstance(key, str) or not key.strip() or len(key) > 200:
+                result.update(status='invalid', error='idempotency_key is required (at most 200 characters)')
+                continue
+            try:
+                row = _build_issue(report, user_id)
+            except ValueError as e:
+                result.update(status='invalid', error=str(e))
+                continue
+            # A key repeated within the batch is the same report; only insert it once
+            rows.setdefault(key, {**row, 'idempotency_key': key})
+
+        created, existing = {}, {}
+        if rows:
+            # One multi-row write with the user's own client, so RLS INSERT policies apply.
+            # Rows whose (user_id, idempotency_key) already exists are skipped by the database.
+            db = clients.user_client()
+            inserted = db.table('issues').upsert(
+                list(rows.values()), on_conflict='user_id,idempotency_key', ignore_duplicates=True
+            ).execute()
+            created = {row['idempotency_key']: row for row in inserted.data or []}
+
+            missing = [key for key in rows if key not in created]
+            if missing:
+                found = db.table('issues').select('*').eq('user_id', user_id).in_('idempotency_key', missing).execute()
+                existing = {row['idempotency_key']: row for row in found.data or []}
+
+        reported = set()
+        for result in results:
+            key = result['idempotency_key']
+            if 'status' in result:
+                continue
+            if key in created and key not in reported:
+                reported.add(key)
+                result.update(status='created', issue=created[key])
+            elif key in created or key in existing:
+                result.update(status='duplicate', issue=created.get(key) or existing[key])
+            else:
+                result.update(status='failed', error='Failed to insert issue. Check RLS policies.')
+
+        for row in created.values():
+            _on_issue_created(row)
+
+        return jsonify({
+            'message': f'{len(created)} issues reported',
+            'created': len(created),
+            'results': results
+        }), 200
+
+    except Exception as e:
+        print(f"ERROR in report_issues_batch: {e}")
+        return jsonify({'message': 'Failed to report issues', 'error': str(e)}), 500
+
+
 # --- CHANGE: Route updated to '/' ---
 @issues_bp.route('/', methods=['GET'])
 @token_required
 def get_issues():
-    """Get issues based on user role (citizen vs government)"""
+    """Get one page of issues based on user role (citizen vs government)"""
     try:
         user_id = request.user_id
-        token = request.headers.get('Authorization').split(" ")[1]
 
-        # --- CHANGE: Switch to user's token to enforce RLS for all queries ---
-        # This is more secure than python-based logic, as it relies on database security.
-        original_auth = supabase.postgrest.auth
+        # Keyset pagination: ?cursor=<next_cursor>&limit=<n>, plus an optional ?count=exact|planned|estimated
         try:
-            supabase.postgrest.auth(token)
-            
-            # RLS will now automatically filter for the user.
-            # A government user's policy can allow SELECT *, while a citizen's is `user_id = auth.uid()`
-            query = supabase.table('issues').select('*').order('created_at', desc=True)
-
-            # Apply filters if provided
-            if request.args.get('category'):
-                query = query.eq('category', request.args.get('category'))
-            if request.args.get('status'):
-                query = query.eq('status', request.args.get('status'))
-            if request.args.get('priority'):
-                query = query.eq('priority', request.args.get('priority'))
-
-            result = query.execute()
-
-        finally:
-            supabase.postgrest.auth(original_auth)
-        
+            limit = page_size(request.args.get('limit'))
+            count = count_mode(request.args.get('count'))
+            cursor = decode_cursor(request.args.get('cursor'))
+            # Sparse fieldset: ?fields=id,title,status (compact list columns by default)
+            columns = projection(request.args.get('fields'), ISSUE_LIST_ALLOWED, ISSUE_LIST_DEFAULT)
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
+
+        # --- CHANGE: Query with the user's own client to enforce RLS for all queries ---
+        # This is more secure than python-based logic, as it relies on database security.
+        # RLS will automatically filter for the user.
+        # A government user's policy can allow SELECT *, while a citizen's is `user_id = auth.uid()`
+        query = clients.user_client().table('issues').select(columns, count=count)
+
+        # Apply filters if provided
+        if request.args.get('category'):
+            query = query.eq('category', request.args.get('category'))
+        if request.args.get('status'):
+            query = query.eq('status', request.args.get('status'))
+        if request.args.get('priority'):
+            query = query.eq('priority', request.args.get('priority'))
+
+        issues, next_cursor, total = fetch_page(query, cursor, limit)
+
         return jsonify({
-            'issues': result.data,
-            'total': len(result.data)
+            'issues': issues,
+            'next_cursor': next_cursor,
+            # Only computed when requested with ?count=, as counting is not free on large tables
+            'total': total if count else None
         }), 200
 
     except Exception as e:
@@ -109,27 +368,213 @@ def get_issues():
         return jsonify({'message': 'Failed to get issues', 'error': str(e)}), 500
 
 
+@issues_bp.route('/search', methods=['GET'])
+@token_required
+def search_issues():
+    """Full-text search over title, description and location, ranked by relevance"""
+    try:
+        user_id = request.user_id
+        query_text = (request.args.get('q') or '').strip()
+        if not query_text:
+            return jsonify({'message': 'q is required'}), 400
+
+        try:
+            limit = page_size(request.args.get('limit'))
+            columns = projection(request.args.get('fields'), ISSUE_LIST_ALLOWED, ISSUE_LIST_DEFAULT)
+            # Results are ranked, so the cursor is simply the offset of the next page
+            cursor = request.args.get('cursor') or '0'
+            if not cursor.isdigit():
+                raise ValueError('Invalid cursor')
+            offset = int(cursor)
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
+
+        # Mirror the RLS policies: citizens only ever match their own issues
+        owner = None if profiles.get_role(user_id) == 'government' else user_id
+        filters = {field: request.args.get(field) for field in ('category', 'status', 'priority')}
+        ranked, total = search_index.search(
+            query_text, filters=filters, user_id=owner, offset=offset, limit=limit,
+            prefix=request.args.get('prefix', 'true').lower() != 'false'
+        )
+
+        # Fetch just this page's rows by primary key, still under the user's RLS policies
+        issues = []
+        if ranked:
+            result = clients.user_client().table('issues').select(columns).in_('id', [issue_id for issue_id, _ in ranked]).execute()
+            rows = {row['id']: row for row in result.data or []}
+            issues = [{**rows[issue_id], 'score': round(score, 4)} for issue_id, score in ranked if issue_id in rows]
+
+        next_offset = offset + limit
+        return jsonify({
+            'issues': issues,
+            'total': total,
+            'next_cursor': str(next_offset) if next_offset < total else None
+        }), 200
+
+    except Exception as e:
+        print(f"ERROR in search_issues: {e}")
+        return jsonify({'message': 'Failed to search issues', 'error': str(e)}), 500
+
+
+@issues_bp.route('/map', methods=['GET'])
+@token_required
+def issues_map():
+    """Issues inside a map viewport: individual points when zoomed in, clustered counts otherwise
+
+    Either ?bbox=min_lng,min_lat,max_lng,max_lat or ?lat=&lng=&radius_km=, plus an optional category.
+    """
+    try:
+        user_id = request.user_id
+        radius = None
+        try:
+            if request.args.get('bbox'):
+                min_lng, min_lat, max_lng, max_lat = (float(v) for v in request.args['bbox'].split(','))
+            elif request.args.get('radius_km'):
+                lat, lng, radius_km = (float(request.args[k]) for k in ('lat', 'lng', 'radius_km'))
+                if radius_km <= 0:
+                    raise ValueError
+                radius = (lat, lng, radius_km)
+                min_lat, min_lng, max_lat, max_lng = radius_bbox(lat, lng, radius_km)
+            else:
+                return jsonify({'message': 'bbox or lat, lng and radius_km are required'}), 400
+        except (KeyError, ValueError):
+            return jsonify({'message': 'Invalid bbox or radius parameters'}), 400
+        if not (-90 <= min_lat <= max_lat <= 90 and -180 <= min_lng <= max_lng <= 180):
+            return jsonify({'message': 'bbox must be min_lng,min_lat,max_lng,max_lat within valid ranges'}), 400
+
+        # Mirror the RLS policies: citizens only see their own issues on the map
+        owner = None if profiles.get_role(user_id) == 'government' else user_id
+        result = spatial_index.query(
+            min_lat, min_lng, max_lat, max_lng,
+            category=request.args.get('category'), user_id=owner, radius=radius
+        )
+        return jsonify(result), 200
+
+    except Exception as e:
+        print(f"ERROR in issues_map: {e}")
+        return jsonify({'message': 'Failed to get map issues', 'error': str(e)}), 500
+
+
+EXPORT_PAGE_SIZE = int(os.getenv('EXPORT_PAGE_SIZE', 1000))
+EXPORT_FORMATS = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+
+@issues_bp.route('/export', methods=['GET'])
+@token_required
+@role_required('government')
+def export_issues():
+    """Stream every matching issue as NDJSON or CSV - FOR GOVERNMENT ONLY"""
+    try:
+        export_format = request.args.get('format', 'ndjson')
+        if export_format not in EXPORT_FORMATS:
+            return jsonify({'message': f"format must be one of: {', '.join(EXPORT_FORMATS)}"}), 400
+
+        try:
+            columns = projection(request.args.get('fields'), ISSUE_LIST_ALLOWED, ISSUE_COLUMNS)
+            # Date range on created_at: ?from=2024-01-01&to=2024-02-01 (to is exclusive)
+            created_from = request.args.get('from')
+            created_to = request.args.get('to')
+            for value in (created_from, created_to):
+                if value:
+                    datetime.fromisoformat(value)
+        except ValueError as e:
+            return jsonify({'message': f'Invalid export parameters: {e}'}), 400
+
+        filters = {field: request.args.get(field) for field in ('category', 'status', 'priority') if request.args.get(field)}
+
+        def make_query():
+            # 2. Government users can see every issue, so page through with the service key
+            query = clients.service().table('issues').select(columns)
+            for field, value in filters.items():
+                query = query.eq(field, value)
+            if created_from:
+                query = query.gte('created_at', created_from)
+            if created_to:
+                query = query.lt('created_at', created_to)
+            return query
+
+        rows = iter_rows(make_query, page_size=EXPORT_PAGE_SIZE)
+        generate = _ndjson_lines(rows) if export_format == 'ndjson' else _csv_lines(rows, columns.split(','))
+
+        filename = f"issues-{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.{export_format}"
+        return Response(
+            stream_with_context(generate),
+            mimetype=EXPORT_FORMATS[export_format],
+            headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+        )
+
+    except Exception as e:
+        print(f"ERROR in export_issues: {e}")
+        return jsonify({'message': 'Failed to export issues', 'error': str(e)}), 500
+
+
+def _ndjson_lines(rows):
+    try:
+        for row in rows:
+            # The app's JSON provider (orjson) is much faster than json.dumps on large exports
+            yield current_app.json.dumps(row) + '\n'
+    except Exception as e:
+        # Headers are already sent, so the best we can do is end the stream visibly
+        print(f"ERROR while streaming export: {e}")
+        yield json.dumps({'error': 'Export interrupted', 'detail': str(e)}) + '\n'
+
+
+def _csv_lines(rows, columns):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def flush():
+        line = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+        return line
+
+    writer.writerow(columns)
+    yield flush()
+    try:
+        for row in rows:
+            # Arrays such as image_url are written as JSON inside the cell
+            writer.writerow([
+                json.dumps(row.get(column)) if isinstance(row.get(column), (list, dict)) else row.get(column)
+                for column in columns
+            ])
+            yield flush()
+    except Exception as e:
+        # CSV has no room for an error marker, so abort the chunked response instead: the
+        # client sees a broken transfer rather than a truncated file that looks complete
+        print(f"ERROR while streaming export: {e}")
+        raise
+
+
 @issues_bp.route('/<int:issue_id>', methods=['GET'])
 @token_required
 def get_issue(issue_id):
     """Get a specific issue by ID"""
     try:
         user_id = request.user_id
-        token = request.headers.get('Authorization').split(" ")[1]
-
-        # --- CHANGE: Switch to user's token to enforce RLS for security ---
-        original_auth = supabase.postgrest.auth
-        try:
-            supabase.postgrest.auth(token)
+        db = clients.user_client()
+
+        # The detail page is latency-sensitive and its reads are tiny, so a slow answer is
+        # raced by a duplicate request (see UPSTREAM_HEDGE_DELAY_MS)
+        with hedged():
+            # Pollers send back the ETag/Last-Modified they got; answer those from the
+            # issue's version alone, without fetching the joined row
+            if has_validators():
+                version = db.table('issues').select('id, created_at, updated_at, comment_count').eq('id', issue_id).limit(1).execute()
+                if not version.data:
+                    return jsonify({'message': 'Issue not found or access denied'}), 404
+                etag, last_modified = _issue_version(version.data[0])
+                if is_not_modified(etag, last_modified):
+                    return not_modified(etag, last_modified)
+
+            # --- CHANGE: Query with the user's own client to enforce RLS for security ---
             # This query will only return data if the user is allowed to see it by RLS.
-            result = supabase.table('issues').select('*, profiles(full_name, email)').eq('id', issue_id).single().execute()
-        finally:
-            supabase.postgrest.auth(original_auth)
+            result = db.table('issues').select('*, profiles(full_name, email)').eq('id', issue_id).single().execute()
 
         if not result.data:
             return jsonify({'message': 'Issue not found or access denied'}), 404
 
-        return jsonify({'issue': result.data}), 200
+        etag, last_modified = _issue_version(result.data)
+        return with_validators((jsonify({'issue': result.data}), 200), etag, last_modified)
 
     except Exception as e:
         print(f"ERROR in get_issue: {e}")
@@ -138,42 +583,34 @@ def get_issue(issue_id):
 
 @issues_bp.route('/<int:issue_id>', methods=['PUT'])
 @token_required
+@role_required('government')
 def update_issue(issue_id):
     """Update an issue (status, priority, etc.) - FOR GOVERNMENT ONLY"""
     try:
-        user_id = request.user_id
-        
-        # --- CHANGE: Use service key for admin checks and actions ---
-        # 1. Verify user is a government official
-        profile_response = supabase.table('profiles').select('user_type').eq('id', user_id).single().execute()
-
-        if not profile_response.data or profile_response.data.get('user_type') != 'government':
-            return jsonify({'message': 'Access denied. Only government officials can update issues.'}), 403
-
+        # --- CHANGE: Use service key for admin actions ---
+        # 1. The caller's role was checked by @role_required (cached profile lookup)
         data = request.get_json()
         if not data:
             return jsonify({'message': 'No data provided'}), 400
 
-        update_data = {
-            'updated_at': datetime.utcnow().isoformat()
-        }
-
-        # --- CHANGE: Clean any incoming data before updating ---
-        allowed_fields = ['status', 'priority', 'assigned_to', 'notes']
-        for field in allowed_fields:
-            if field in data:
-                # Clean the data before adding it to the update payload
-                update_data[field] = data[field].strip() if isinstance(data[field], str) else data[field]
-
-        if len(update_data) == 1: # Only updated_at is present
+        update_data = _clean_update(data)
+        if not update_data:
              return jsonify({'message': 'No valid fields to update'}), 400
+        update_data['updated_at'] = datetime.utcnow().isoformat()
+
+        # 2. Read the current values so the write hooks can apply deltas
+        old_response = clients.service().table('issues').select(HOOK_COLUMNS).eq('id', issue_id).execute()
+        if not old_response.data:
+            return jsonify({'message': 'Issue not found'}), 404
 
-        # 2. Perform the update using the service key's privileges
-        result = supabase.table('issues').update(update_data).eq('id', issue_id).execute()
+        # 3. Perform the update using the service key's privileges
+        result = clients.service().table('issues').update(update_data).eq('id', issue_id).execute()
 
         if not result.data:
             return jsonify({'message': 'Issue not found'}), 404
 
+        _on_issue_updated(old_response.data[0], result.data[0])
+
         return jsonify({
             'message': 'Issue updated successfully',
             'issue': result.data[0]
@@ -184,36 +621,172 @@ def update_issue(issue_id):
         return jsonify({'message': 'Failed to update issue', 'error': str(e)}), 500
 
 
+BULK_MAX_ITEMS = int(os.getenv('BULK_MAX_ITEMS', 500))
+BULK_FILTER_FIELDS = ('status', 'priority', 'category', 'assigned_to')
+
+def _is_issue_id(value):
+    # bool is an int subclass, but true/false are not ids
+    return isinstance(value, int) and not isinstance(value, bool)
+
+@issues_bp.route('/bulk', methods=['PUT'])
+@token_required
+@role_required('government')
+def bulk_update_issues():
+    """Update many issues at once - FOR GOVERNMENT ONLY
+
+    Body is either {"updates": [{"id": 1, "status": "resolved", ...}, ...]}
+    or {"filter": {"status": "reported", "category": "roads"}, "patch": {"status": "verified"}}.
+    Items sharing the same patch are written together in a single update.
+    """
+    try:
+        # 1. One (cached) role check for the whole batch, done by @role_required
+        data = request.get_json()
+        if not data or ('updates' in data) == ('filter' in data):
+            return jsonify({'message': 'Provide either "updates" or "filter" and "patch"'}), 400
+
+        db = clients.service()
+        results = {}
+        # patch (as a hashable key) -> list of issue ids
+        groups = {}
+
+        if 'updates' in data:
+            updates = data['updates']
+            if not isinstance(updates, list) or not updates:
+                return jsonify({'message': '"updates" must be a non-empty list'}), 400
+            if len(updates) > BULK_MAX_ITEMS:
+                return jsonify({'message': f'At most {BULK_MAX_ITEMS} updates per request'}), 400
+
+            ids = []
+            for index, item in enumerate(updates):
+                issue_id = item.get('id') if isinstance(item, dict) else None
+                if issue_id is None:
+                    results[f'#{index}'] = {'id': None, 'success': False, 'error': 'id is required'}
+                    continue
+                if not _is_issue_id(issue_id):
+                    results[f'#{index}'] = {'id': issue_id, 'success': False, 'error': 'id must be an integer'}
+                    continue
+                if issue_id in results:
+                    results[issue_id] = {'id': issue_id, 'success': False, 'error': 'Duplicate id in batch'}
+                    continue
+                patch = _clean_update(item)
+                if not patch:
+                    results[issue_id] = {'id': issue_id, 'success': False, 'error': 'No valid fields to update'}
+                    continue
+                results[issue_id] = None
+                ids.append(issue_id)
+                groups.setdefault(json.dumps(patch, sort_keys=True), []).append(issue_id)
+
+            # Drop ids that later turned out to be duplicated
+            ids = [issue_id for issue_id in ids if results[issue_id] is None]
+            groups = {key: [i for i in group if results[i] is None] for key, group in groups.items()}
+            old_rows = db.table('issues').select(HOOK_COLUMNS).in_('id', ids).execute().data if ids else []
+        else:
+            patch = _clean_update(data.get('patch') or {})
+            if not patch:
+                return jsonify({'message': 'No valid fields to update'}), 400
+            filters = data['filter'] if isinstance(data['filter'], dict) else {}
+            unknown = [field for field in filters if field not in BULK_FILTER_FIELDS + ('ids',)]
+            if not filters or unknown:
+                return jsonify({'message': f"filter may only use: {', '.join(BULK_FILTER_FIELDS + ('ids',))}"}), 400
+            if 'ids' in filters and not (isinstance(filters['ids'], list) and all(map(_is_issue_id, filters['ids']))):
+                return jsonify({'message': 'filter.ids must be a list of integer ids'}), 400
+
+            query = db.table('issues').select(HOOK_COLUMNS)
+            for field, value in filters.items():
+                query = query.in_('id', value) if field == 'ids' else query.eq(field, value)
+            # Read one row past the cap so oversized filters are rejected rather than half-applied
+            old_rows = query.limit(BULK_MAX_ITEMS + 1).execute().data or []
+            if len(old_rows) > BULK_MAX_ITEMS:
+                return jsonify({'message': f'Filter matches more than {BULK_MAX_ITEMS} issues; narrow it down'}), 400
+
+            # Write by id so rows that start matching mid-request are not touched
+            ids = [row['id'] for row in old_rows]
+            for issue_id in ids:
+                results[issue_id] = None
+            if ids:
+                groups[json.dumps(patch, sort_keys=True)] = ids
+
+        old_by_id = {row['id']: row for row in old_rows}
+        now = datetime.utcnow().isoformat()
+
+        # 2. One write per distinct patch
+        for key, group_ids in groups.items():
+            group_ids = [issue_id for issue_id in group_ids if issue_id in old_by_id]
+            if not group_ids:
+                continue
+            try:
+                result = db.table('issues').update({**json.loads(key), 'updated_at': now}).in_('id', group_ids).execute()
+            except Exception as e:
+                print(f"ERROR in bulk_update_issues: {e}")
+                for issue_id in group_ids:
+                    results[issue_id] = {'id': issue_id, 'success': False, 'error': str(e)}
+                continue
+            for new_row in result.data or []:
+                _on_issue_updated(old_by_id[new_row['id']], new_row)
+                results[new_row['id']] = {'id': new_row['id'], 'success': True, 'issue': new_row}
+
+        # 3. Anything not written by now did not exist (or was not visible)
+        for issue_id, outcome in results.items():
+            if outcome is None:
+                results[issue_id] = {'id': issue_id, 'success': False, 'error': 'Issue not found'}
+
+        items = list(results.values())
+        succeeded = sum(1 for item in items if item['success'])
+        return jsonify({
+            'message': f'Updated {succeeded} of {len(items)} issues',
+            'updated': succeeded,
+            'failed': len(items) - succeeded,
+            'results': items
+        }), 200
+
+    except Exception as e:
+        print(f"ERROR in bulk_update_issues: {e}")
+        return jsonify({'message': 'Failed to update issues', 'error': str(e)}), 500
+
+
 @issues_bp.route('/<int:issue_id>/comments', methods=['POST'])
 @token_required
 def add_comment(issue_id):
     """Add a comment to an issue"""
     try:
         user_id = request.user_id
-        token = request.headers.get('Authorization').split(" ")[1]
         data = request.get_json()
 
         if not data or not data.get('comment'):
             return jsonify({'message': 'Comment text is required'}), 400
 
+        # The author's name is stored with the comment so listing comments needs no join
+        profile = profiles.get_profile(user_id) or {}
+
         comment_data = {
             'issue_id': issue_id,
             'user_id': user_id,
+            'author_name': profile.get('full_name'),
             'comment': data['comment'].strip(),
             # --- REMOVED: Let database handle id and created_at ---
+            # issues.comment_count is incremented by a database trigger (see README)
         }
-        
-        # --- CHANGE: Use user's token to enforce RLS for comment insertion ---
-        original_auth = supabase.postgrest.auth
-        try:
-            supabase.postgrest.auth(token)
-            result = supabase.table('issue_comments').insert(comment_data).execute()
-        finally:
-            supabase.postgrest.auth(original_auth)
+
+        if write_queue.running:
+            # Write-behind: the RLS policy is applied when the queued comment is flushed
+            queue_id = write_queue.enqueue('comment', user_id, comment_data)
+            return jsonify({
+                'message': 'Comment accepted',
+                'queue_id': queue_id,
+                'queue_status': 'queued',
+                'comment': comment_data
+            }), 202
+
+        # --- CHANGE: Use the user's own client to enforce RLS for comment insertion ---
+        result = clients.user_client().table('issue_comments').insert(comment_data).execute()
 
         if not result.data:
             raise Exception("Failed to add comment. Check RLS policies.")
 
+        # RLS only lets citizens comment on their own issues; officials' comments need a lookup
+        owner_id = None if profiles.get_role(user_id) == 'government' else user_id
+        _on_comment_added(result.data[0], owner_id)
+
         return jsonify({
             'message': 'Comment added successfully',
             'comment': result.data[0]
@@ -224,25 +797,63 @@ def add_comment(issue_id):
         return jsonify({'message': 'Failed to add comment', 'error': str(e)}), 500
 
 
+@issues_bp.route('/queued/<queue_id>', methods=['GET'])
+@token_required
+def queued_write_status(queue_id):
+    """Whether a report or comment accepted in write-behind mode has been written yet"""
+    try:
+        # Another worker may have accepted it; once written, its row is found by idempotency key
+        status = write_queue.status(queue_id, request.user_id, clients.user_client()) if write_queue.running else None
+        if status is None:
+            return jsonify({'message': 'Queued write not found'}), 404
+        return jsonify(status), 200
+
+    except Exception as e:
+        print(f"ERROR in queued_write_status: {e}")
+        return jsonify({'message': 'Failed to get queued write status', 'error': str(e)}), 500
+
+
 @issues_bp.route('/<int:issue_id>/comments', methods=['GET'])
 @token_required
 def get_comments(issue_id):
-    """Get all comments for an issue"""
+    """Get one page of comments for an issue, newest first"""
     try:
-        # It's good practice to enforce RLS here too.
-        token = request.headers.get('Authorization').split(" ")[1]
-        original_auth = supabase.postgrest.auth
+        # Keyset pagination (?cursor=&limit=) and sparse fieldsets (?fields=id,comment,created_at)
         try:
-            supabase.postgrest.auth(token)
-            # This ensures a user can only get comments for an issue they are allowed to see.
-            result = supabase.table('issue_comments').select('*, profiles(full_name)').eq('issue_id', issue_id).order('created_at', desc=True).execute()
-        finally:
-            supabase.postgrest.auth(original_auth)
+            limit = page_size(request.args.get('limit'))
+            cursor = decode_cursor(request.args.get('cursor'))
+            columns = projection(request.args.get('fields'), COMMENT_LIST_ALLOWED, COMMENT_LIST_DEFAULT)
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
 
-        return jsonify({
-            'comments': result.data,
-            'total': len(result.data)
-        }), 200
+        # It's good practice to enforce RLS here too.
+        # This ensures a user can only get comments for an issue they are allowed to see.
+        db = clients.user_client()
+        query = db.table('issue_comments').select(columns).eq('issue_id', issue_id)
+        # The comment list only changes when comments are added or removed, so the
+        # count plus the newest timestamp identifies its version
+        version_query = db.table('issue_comments').select('created_at', count='exact')\
+            .eq('issue_id', issue_id).order('created_at', desc=True).limit(1)
+
+        if has_validators():
+            version = version_query.execute()
+            etag, last_modified = _comments_version(issue_id, version)
+            if is_not_modified(etag, last_modified):
+                return not_modified(etag, last_modified)
+            comments, next_cursor, _ = fetch_page(query, cursor, limit)
+        else:
+            version, (comments, next_cursor, _) = gather(
+                version_query.execute,
+                lambda: fetch_page(query, cursor, limit),
+            )
+            etag, last_modified = _comments_version(issue_id, version)
+
+        return with_validators((jsonify({
+            'comments': comments,
+            'next_cursor': next_cursor,
+            # The version query counts every comment on the issue, so the total is free
+            'total': version.count
+        }), 200), etag, last_modified)
 
     except Exception as e:
         print(f"ERROR in get_comments: {e}")
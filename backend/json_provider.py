@@ -0,0 +1,37 @@
+import orjson
+from flask.json.provider import DefaultJSONProvider
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson, several times faster than the stdlib on issue rows.
+
+    Keys keep their insertion order (the column order PostgREST returns) instead of being
+    sorted, and datetimes are written as ISO 8601; rows from PostgREST already hold strings,
+    so responses are unchanged apart from key order. Other types orjson cannot encode fall
+    back to Flask's default handling.
+    """
+
+    sort_keys = False
+
+    def _option(self, kwargs):
+        option = orjson.OPT_NON_STR_KEYS
+        if kwargs.get('indent'):
+            option |= orjson.OPT_INDENT_2
+        if kwargs.get('sort_keys', self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        return option
+
+    def _dumpb(self, obj, **kwargs):
+        return orjson.dumps(obj, default=kwargs.get('default', self.default), option=self._option(kwargs))
+
+    def dumps(self, obj, **kwargs):
+        return self._dumpb(obj, **kwargs).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        # Bytes go straight into the response body, skipping a decode/encode round trip
+        return self._app.response_class(self._dumpb(obj, indent=indent) + b'\n', mimetype=self.mimetype)
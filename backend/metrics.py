@@ -0,0 +1,261 @@
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import httpx
+from flask import Response, g, request
+
+# Seconds; upstream calls and whole requests share one bucket layout
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Log a per-request breakdown when a request takes longer than this (0 disables the slow log)
+SLOW_REQUEST_MS = float(os.getenv('METRICS_SLOW_REQUEST_MS', 0))
+
+# Current request's endpoint and upstream call log. fanout.gather copies the context into
+# its worker threads, so concurrent upstream calls are attributed to the request too.
+_request_state: ContextVar = ContextVar('request_metrics', default=None)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def header(self):
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [f'{self.name}{_format_labels(self.labels, key)} {value}' for key, value in items]
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def dec(self, *labels):
+        self.inc(*labels, amount=-1)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                # Per-bucket (non-cumulative) counts, then sum and count
+                series = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        with self._lock:
+            items = sorted((key, ([*counts], total, count)) for key, (counts, total, count) in self._values.items())
+        lines = self.header()
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{self.name}_bucket{_format_labels(self.labels, key, [("le", le)])} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labels, key)} {total}')
+            lines.append(f'{self.name}_count{_format_labels(self.labels, key)} {count}')
+        return lines
+
+
+REQUESTS = Counter('civiceye_http_requests_total', 'HTTP requests handled', ('endpoint', 'method', 'status'))
+REQUEST_DURATION = Histogram('civiceye_http_request_duration_seconds', 'Time to produce a response',
+                             ('endpoint', 'method'))
+REQUESTS_IN_FLIGHT = Gauge('civiceye_http_requests_in_flight', 'Requests being handled', ('endpoint',))
+UPSTREAM_DURATION = Histogram('civiceye_upstream_duration_seconds', 'Supabase call latency',
+                              ('endpoint', 'upstream', 'target', 'operation'))
+UPSTREAM_IN_FLIGHT = Gauge('civiceye_upstream_in_flight', 'Supabase calls in progress',
+                           ('upstream', 'target', 'operation'))
+UPSTREAM_ERRORS = Counter('civiceye_upstream_errors_total', 'Failed Supabase calls',
+                          ('endpoint', 'upstream', 'target', 'operation', 'error'))
+ADMISSION_REJECTED = Counter('civiceye_admission_rejected_total', 'Requests refused by admission control',
+                             ('reason',))
+UPSTREAM_RETRIES = Counter('civiceye_upstream_retries_total', 'Supabase calls retried after a failure',
+                           ('upstream', 'target', 'operation'))
+UPSTREAM_HEDGES = Counter('civiceye_upstream_hedges_total', 'Hedged reads, by which copy answered first',
+                          ('target', 'winner'))
+BREAKER_TRANSITIONS = Counter('civiceye_circuit_breaker_transitions_total', 'Circuit breaker state changes',
+                              ('upstream', 'state'))
+WRITE_QUEUE_PENDING = Gauge('civiceye_write_queue_pending', 'Queued writes not yet flushed', ('kind',))
+WRITE_QUEUE_FLUSHED = Counter('civiceye_write_queue_flushed_total', 'Queued writes by flush outcome',
+                              ('kind', 'outcome'))
+ALL_METRICS = (REQUESTS, REQUEST_DURATION, REQUESTS_IN_FLIGHT, UPSTREAM_DURATION, UPSTREAM_IN_FLIGHT, UPSTREAM_ERRORS,
+               ADMISSION_REJECTED, UPSTREAM_RETRIES, UPSTREAM_HEDGES, BREAKER_TRANSITIONS,
+               WRITE_QUEUE_PENDING, WRITE_QUEUE_FLUSHED)
+
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in ALL_METRICS:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+# ----------------- Upstream calls -----------------
+def _record_upstream(upstream, target, operation, elapsed, error):
+    state = _request_state.get()
+    endpoint = state['endpoint'] if state else 'background'
+    UPSTREAM_DURATION.observe(elapsed, endpoint, upstream, target, operation)
+    if error:
+        UPSTREAM_ERRORS.inc(endpoint, upstream, target, operation, error)
+    if state is not None:
+        state['calls'].append((f'{upstream}:{target}.{operation}', elapsed))
+
+
+@contextmanager
+def track(upstream, target, operation):
+    """Time a Supabase call made outside PostgREST (e.g. auth)."""
+    UPSTREAM_IN_FLIGHT.inc(upstream, target, operation)
+    start = time.perf_counter()
+    error = None
+    try:
+        yield
+    except Exception as e:
+        error = type(e).__name__
+        raise
+    finally:
+        UPSTREAM_IN_FLIGHT.dec(upstream, target, operation)
+        _record_upstream(upstream, target, operation, time.perf_counter() - start, error)
+
+
+_OPERATIONS = {'GET': 'select', 'HEAD': 'count', 'POST': 'insert', 'PATCH': 'update', 'DELETE': 'delete'}
+
+
+def describe(http_request):
+    """(table or function, operation) for a PostgREST request URL."""
+    parts = http_request.url.path.split('/rest/v1/', 1)[-1].strip('/').split('/')
+    if parts[0] == 'rpc' and len(parts) > 1:
+        return parts[1], 'rpc'
+    operation = _OPERATIONS.get(http_request.method, http_request.method.lower())
+    if operation == 'insert' and 'resolution=' in http_request.headers.get('prefer', ''):
+        operation = 'upsert'
+    return parts[0] or 'root', operation
+
+
+class InstrumentedTransport(httpx.BaseTransport):
+    """Wraps the shared PostgREST transport to time every query by table and operation.
+
+    Latency is measured to the response headers; PostgREST sends its body straight after.
+    """
+
+    def __init__(self, transport):
+        self._transport = transport
+
+    def handle_request(self, http_request):
+        target, operation = describe(http_request)
+        UPSTREAM_IN_FLIGHT.inc('postgrest', target, operation)
+        start = time.perf_counter()
+        error = None
+        try:
+            response = self._transport.handle_request(http_request)
+            if response.status_code >= 400:
+                error = f'http_{response.status_code}'
+            return response
+        except Exception as e:
+            error = type(e).__name__
+            raise
+        finally:
+            UPSTREAM_IN_FLIGHT.dec('postgrest', target, operation)
+            _record_upstream('postgrest', target, operation, time.perf_counter() - start, error)
+
+    def close(self):
+        self._transport.close()
+
+
+# ----------------- Request timing -----------------
+def _before_request():
+    endpoint = request.endpoint or 'unmatched'
+    state = {'endpoint': endpoint, 'start': time.perf_counter(), 'calls': [], 'status': 500}
+    g.metrics_token = _request_state.set(state)
+    REQUESTS_IN_FLIGHT.inc(endpoint)
+
+
+def _after_request(response):
+    state = _request_state.get()
+    if state is not None:
+        state['status'] = response.status_code
+    return response
+
+
+def _teardown_request(error=None):
+    state = _request_state.get()
+    if state is None or 'metrics_token' not in g:
+        return
+    elapsed = time.perf_counter() - state['start']
+    endpoint = state['endpoint']
+    REQUESTS_IN_FLIGHT.dec(endpoint)
+    REQUEST_DURATION.observe(elapsed, endpoint, request.method)
+    REQUESTS.inc(endpoint, request.method, str(state['status']))
+    if SLOW_REQUEST_MS and elapsed * 1000 >= SLOW_REQUEST_MS:
+        _log_slow(state, elapsed)
+    try:
+        _request_state.reset(g.pop('metrics_token'))
+    except ValueError:
+        # Streamed responses may finish in a different context; nothing left to undo there
+        pass
+
+
+def _log_slow(state, elapsed):
+    totals = {}
+    for name, seconds in state['calls']:
+        count, total = totals.get(name, (0, 0.0))
+        totals[name] = (count + 1, total + seconds)
+    upstream = sum(total for _, total in totals.values())
+    breakdown = ', '.join(f'{name} x{count} {total * 1000:.1f}ms'
+                          for name, (count, total) in sorted(totals.items(), key=lambda item: -item[1][1]))
+    # Concurrent upstream calls overlap, so "app" time is a lower bound when fanout was used
+    print(f"SLOW {request.method} {request.path} [{state['endpoint']}] {state['status']} "
+          f"{elapsed * 1000:.1f}ms: upstream {upstream * 1000:.1f}ms ({breakdown or 'none'}), "
+          f"app {max(elapsed - upstream, 0) * 1000:.1f}ms")
+
+
+def init_metrics(app):
+    """Time every request and expose all metrics at GET /metrics."""
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+
+    metrics_token = os.getenv('METRICS_TOKEN')
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        """Prometheus metrics for this worker"""
+        if metrics_token and request.headers.get('Authorization') != f'Bearer {metrics_token}':
+            return Response('Unauthorized\n', status=401, mimetype='text/plain')
+        return Response(render(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,107 @@
+import base64
+import json
+import os
+import uuid
+from datetime import datetime
+
+DEFAULT_PAGE_SIZE = int(os.getenv('DEFAULT_PAGE_SIZE', 50))
+MAX_PAGE_SIZE = int(os.getenv('MAX_PAGE_SIZE', 200))
+COUNT_MODES = ('exact', 'planned', 'estimated')
+
+
+def page_size(raw, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    """Parse a `limit` query parameter, clamped to the server-side maximum."""
+    if raw in (None, ''):
+        return min(default, maximum)
+    try:
+        limit = int(raw)
+    except (TypeError, ValueError):
+        raise ValueError('limit must be an integer')
+    if limit < 1:
+        raise ValueError('limit must be at least 1')
+    return min(limit, maximum)
+
+
+def count_mode(raw):
+    """Parse a `count` query parameter: none, or one of PostgREST's count methods."""
+    if raw in (None, ''):
+        return None
+    if raw not in COUNT_MODES:
+        raise ValueError(f"count must be one of: {', '.join(COUNT_MODES)}")
+    return raw
+
+
+def encode_cursor(row):
+    """An opaque cursor pointing just past `row` in (created_at, id) order."""
+    raw = json.dumps([row['created_at'], row['id']], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return the (created_at, id) pair encoded in `cursor`, or None for the first page."""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except Exception:
+        raise ValueError('Invalid cursor')
+    # Both values end up inside a quoted PostgREST filter, so only accept well-formed ones
+    # (and re-serialize the timestamp) rather than passing client text through
+    if isinstance(row_id, str):
+        try:
+            row_id = str(uuid.UUID(row_id))
+        except ValueError:
+            raise ValueError('Invalid cursor')
+    elif not isinstance(row_id, int) or isinstance(row_id, bool):
+        raise ValueError('Invalid cursor')
+    try:
+        created_at = datetime.fromisoformat(created_at).isoformat()
+    except (TypeError, ValueError):
+        raise ValueError('Invalid cursor')
+    return created_at, row_id
+
+
+def fetch_page(query, cursor=None, limit=DEFAULT_PAGE_SIZE, desc=True):
+    """Run `query` as one keyset page ordered by (created_at, id).
+
+    `query` must select `created_at` and `id`. Returns (rows, next_cursor, count);
+    `count` is only set when the query was built with select(..., count=...).
+    """
+    direction = 'desc' if desc else 'asc'
+    # A single order parameter; chained .order() calls overwrite each other in some postgrest-py versions
+    query.params = query.params.set('order', f'created_at.{direction},id.{direction}')
+
+    position = decode_cursor(cursor) if isinstance(cursor, str) else cursor
+    if position:
+        created_at, row_id = position
+        op = 'lt' if desc else 'gt'
+        # Values are quoted because timestamps contain reserved characters (':', '+')
+        # Added as a raw `or` parameter: the pinned postgrest-py (0.13) has no .or_()
+        query.params = query.params.add('or', (
+            f'(created_at.{op}."{created_at}",'
+            f'and(created_at.eq."{created_at}",id.{op}."{row_id}"))'
+        ))
+
+    # Fetch one extra row to learn whether another page exists
+    result = query.limit(limit + 1).execute()
+    rows = result.data or []
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1])
+    return rows, next_cursor, getattr(result, 'count', None)
+
+
+def iter_rows(make_query, page_size=500, desc=False):
+    """Yield every row matched by `make_query()`, fetching one keyset page at a time.
+
+    `make_query` must return a fresh select query on each call. Only one page is
+    held in memory, however many rows match.
+    """
+    cursor = None
+    while True:
+        rows, cursor, _ = fetch_page(make_query(), cursor, page_size, desc=desc)
+        yield from rows
+        if not cursor:
+            return
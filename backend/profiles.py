@@ -0,0 +1,33 @@
+import os
+
+import clients
+from ttl_cache import TTLCache
+
+# profiles rows are read on almost every request (role checks, login, /profile)
+# but change rarely, so keep them briefly in memory.
+profile_cache = TTLCache(
+    maxsize=int(os.getenv('PROFILE_CACHE_SIZE', 10000)),
+    ttl=int(os.getenv('PROFILE_CACHE_TTL', 60)),
+)
+
+
+def get_profile(user_id):
+    """Return the user's profile row (a copy), or None if they have no profile."""
+    profile = profile_cache.get(user_id)
+    if profile is None:
+        response = clients.service().table('profiles').select('*').eq('id', user_id).limit(1).execute()
+        if not response.data:
+            # Not cached: the profile may be created moments after sign-up
+            return None
+        profile = response.data[0]
+        profile_cache.set(user_id, profile)
+    return dict(profile)
+
+
+def get_role(user_id):
+    profile = get_profile(user_id)
+    return profile.get('user_type') if profile else None
+
+
+def invalidate_profile(user_id):
+    profile_cache.delete(user_id)
@@ -0,0 +1,282 @@
+import contextvars
+import math
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FuturesTimeout
+from contextlib import contextmanager
+
+import httpx
+from gotrue.errors import AuthRetryableError
+
+import admission
+import metrics
+
+# Per-operation timeouts for PostgREST calls, in milliseconds (connecting has its own, shorter one)
+CONNECT_TIMEOUT = float(os.getenv('UPSTREAM_CONNECT_TIMEOUT_MS', 2000)) / 1000
+OPERATION_TIMEOUTS = {
+    'select': float(os.getenv('UPSTREAM_READ_TIMEOUT_MS', 5000)) / 1000,
+    'count': float(os.getenv('UPSTREAM_READ_TIMEOUT_MS', 5000)) / 1000,
+    'rpc': float(os.getenv('UPSTREAM_RPC_TIMEOUT_MS', 10000)) / 1000,
+}
+WRITE_TIMEOUT = float(os.getenv('UPSTREAM_WRITE_TIMEOUT_MS', 10000)) / 1000
+# Supabase Auth calls (get_user, sign-in, sign-up)
+AUTH_TIMEOUT = float(os.getenv('UPSTREAM_AUTH_TIMEOUT_MS', 5000)) / 1000
+
+# Reads (GET/HEAD) are retried on connection errors, timeouts and 502/503/504, after a random
+# delay of up to RETRY_BASE * 2**attempt ("full jitter"), capped at RETRY_MAX
+RETRIES = int(os.getenv('UPSTREAM_RETRIES', 2))
+RETRY_BASE = float(os.getenv('UPSTREAM_RETRY_BASE_MS', 50)) / 1000
+RETRY_MAX = float(os.getenv('UPSTREAM_RETRY_MAX_MS', 1000)) / 1000
+RETRY_STATUSES = (502, 503, 504)
+# RPCs are POSTs, so only these functions, known to be read-only, are retried (and hedged) like reads
+READ_ONLY_RPCS = frozenset(filter(None, os.getenv('UPSTREAM_READ_ONLY_RPCS', 'issue_stats').split(',')))
+
+# Reads inside `with hedged():` send a second copy if the first has not answered within
+# HEDGE_DELAY_MS, and use whichever answers first (0 disables hedging)
+HEDGE_DELAY = float(os.getenv('UPSTREAM_HEDGE_DELAY_MS', 0)) / 1000
+HEDGE_MAX_WORKERS = int(os.getenv('UPSTREAM_HEDGE_MAX_WORKERS', 16))
+
+# After BREAKER_FAILURES consecutive failures calls fail fast for BREAKER_RESET_SECONDS;
+# then one trial call is let through, and its outcome closes or re-opens the breaker
+BREAKER_FAILURES = int(os.getenv('BREAKER_FAILURES', 5))
+BREAKER_RESET_SECONDS = float(os.getenv('BREAKER_RESET_SECONDS', 15))
+
+READ_METHODS = ('GET', 'HEAD')
+
+_hedge = contextvars.ContextVar('hedge_reads', default=False)
+_hedge_executor = ThreadPoolExecutor(max_workers=HEDGE_MAX_WORKERS, thread_name_prefix='hedge')
+
+
+class CircuitOpen(admission.UpstreamUnavailable):
+    """Raised instead of calling an upstream that has been failing."""
+
+
+class CircuitBreaker:
+    def __init__(self, name, failures=5, reset_seconds=15):
+        self.name = name
+        self.failures = failures
+        self.reset_seconds = reset_seconds
+        self.state = 'closed'
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def _transition(self, state):
+        self.state = state
+        metrics.BREAKER_TRANSITIONS.inc(self.name, state)
+        if state == 'open':
+            self.opened_at = time.monotonic()
+            print(f"ERROR: {self.name} circuit breaker opened after {self.consecutive_failures} failures")
+
+    def before_call(self):
+        """Raise CircuitOpen unless a call may go ahead now."""
+        if self.failures <= 0:
+            return
+        with self._lock:
+            if self.state == 'closed':
+                return
+            remaining = self.opened_at + self.reset_seconds - time.monotonic()
+            if self.state == 'open' and remaining <= 0:
+                self._transition('half_open')
+            if self.state == 'half_open' and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return
+        raise CircuitOpen(f'{self.name} is unavailable', retry_after=math.ceil(max(remaining, 1)))
+
+    def cancel(self):
+        """The call allowed by before_call() never reached the upstream."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record(self, success):
+        if self.failures <= 0:
+            return
+        with self._lock:
+            self._trial_in_flight = False
+            if self.state == 'open':
+                # A call that started before the breaker opened; only the half-open trial decides
+                return
+            if success:
+                self.consecutive_failures = 0
+                if self.state != 'closed':
+                    self._transition('closed')
+                return
+            self.consecutive_failures += 1
+            if self.state == 'half_open' or (self.state == 'closed' and self.consecutive_failures >= self.failures):
+                self._transition('open')
+
+
+breakers = {
+    'postgrest': CircuitBreaker('postgrest', BREAKER_FAILURES, BREAKER_RESET_SECONDS),
+    'auth': CircuitBreaker('auth', BREAKER_FAILURES, BREAKER_RESET_SECONDS),
+}
+
+
+@contextmanager
+def hedged():
+    """Hedge the PostgREST reads made in this block (when UPSTREAM_HEDGE_DELAY_MS is set)."""
+    token = _hedge.set(True)
+    try:
+        yield
+    finally:
+        _hedge.reset(token)
+
+
+def _backoff(attempt):
+    return random.uniform(0, min(RETRY_MAX, RETRY_BASE * 2 ** attempt))
+
+
+def _close_quietly(future):
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+
+class ResilientTransport(httpx.BaseTransport):
+    """Timeouts, retries with jitter, hedged reads and a circuit breaker for PostgREST calls.
+
+    Calls that still fail with a transport error (or find the breaker open) are recorded with
+    admission.note_unavailable, so the handler's 500 goes out as a 503 with Retry-After.
+    """
+
+    def __init__(self, transport, breaker):
+        self._transport = transport
+        self.breaker = breaker
+
+    def _timeout(self, operation):
+        seconds = OPERATION_TIMEOUTS.get(operation, WRITE_TIMEOUT)
+        return httpx.Timeout(seconds, connect=min(CONNECT_TIMEOUT, seconds)).as_dict()
+
+    def _send(self, http_request):
+        """One attempt, guarded by the breaker."""
+        self.breaker.before_call()
+        try:
+            response = self._transport.handle_request(http_request)
+        except admission.UpstreamUnavailable:
+            # Refused locally; says nothing about the upstream's health
+            self.breaker.cancel()
+            raise
+        except Exception:
+            self.breaker.record(False)
+            raise
+        self.breaker.record(response.status_code < 500)
+        return response
+
+    def _hedged_send(self, http_request, target):
+        primary = _hedge_executor.submit(contextvars.copy_context().run, self._send, http_request)
+        try:
+            return primary.result(timeout=HEDGE_DELAY)
+        except FuturesTimeout:
+            pass
+        backup = _hedge_executor.submit(contextvars.copy_context().run, self._send, http_request)
+        pending, error = {primary, backup}, None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    metrics.UPSTREAM_HEDGES.inc(target, 'primary' if future is primary else 'hedge')
+                    for other in {primary, backup} - {future}:
+                        # The slower copy's connection goes back to the pool once it answers
+                        other.add_done_callback(_close_quietly)
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def handle_request(self, http_request):
+        target, operation = metrics.describe(http_request)
+        http_request.extensions['timeout'] = self._timeout(operation)
+        is_read = http_request.method in READ_METHODS or (operation == 'rpc' and target in READ_ONLY_RPCS)
+        attempts = 1 + (RETRIES if is_read else 0)
+        for attempt in range(attempts):
+            last = attempt == attempts - 1
+            try:
+                if is_read and HEDGE_DELAY > 0 and _hedge.get():
+                    response = self._hedged_send(http_request, target)
+                else:
+                    response = self._send(http_request)
+            except admission.UpstreamUnavailable as e:
+                admission.note_unavailable('circuit_open' if isinstance(e, CircuitOpen) else 'upstream_overloaded',
+                                           e.retry_after)
+                raise
+            except httpx.TransportError:
+                if last:
+                    admission.note_unavailable('upstream_error', admission.RETRY_AFTER)
+                    raise
+            else:
+                if response.status_code not in RETRY_STATUSES:
+                    return response
+                if last:
+                    admission.note_unavailable('upstream_error', admission.RETRY_AFTER)
+                    return response
+                response.close()
+            metrics.UPSTREAM_RETRIES.inc('postgrest', target, operation)
+            time.sleep(_backoff(attempt))
+
+    def close(self):
+        self._transport.close()
+
+
+def init_auth_client(auth):
+    """Give the Supabase Auth client's HTTP session the AUTH_TIMEOUT per call."""
+    # supabase-py 2.3 has no option for this; the fake's auth client has no session at all
+    http_client = getattr(auth, '_http_client', None)
+    if http_client is not None:
+        http_client.timeout = httpx.Timeout(AUTH_TIMEOUT, connect=min(CONNECT_TIMEOUT, AUTH_TIMEOUT))
+
+
+def _is_upstream_failure(error):
+    """Connection problems and 5xx answers count against the auth breaker; bad credentials do not."""
+    # gotrue reports connection errors and timeouts as AuthRetryableError with status 0
+    if isinstance(error, (httpx.TransportError, AuthRetryableError)):
+        return True
+    status = getattr(error, 'status', None)
+    return isinstance(status, int) and status >= 500
+
+
+def auth_read(target, operation, call):
+    """Make an idempotent Auth call (e.g. get_user) through auth_call, retrying upstream
+    failures with the same jittered backoff as PostgREST reads."""
+    for attempt in range(1 + RETRIES):
+        last = attempt == RETRIES
+        try:
+            with auth_call(target, operation, final=last):
+                return call()
+        except admission.UpstreamUnavailable:
+            raise
+        except Exception as e:
+            if last or not _is_upstream_failure(e):
+                raise
+        metrics.UPSTREAM_RETRIES.inc('auth', target, operation)
+        time.sleep(_backoff(attempt))
+
+
+@contextmanager
+def auth_call(target, operation, final=True):
+    """Run a Supabase Auth call behind the auth breaker and an upstream slot, timing it.
+
+    A failed call marks the request as unavailable (a 503) unless `final` is False, i.e. the
+    caller will try again.
+    """
+    breaker = breakers['auth']
+    try:
+        breaker.before_call()
+    except CircuitOpen as e:
+        admission.note_unavailable('circuit_open', e.retry_after)
+        raise
+    try:
+        with admission.upstream_slot(), metrics.track('auth', target, operation):
+            yield
+    except admission.UpstreamUnavailable:
+        breaker.cancel()
+        raise
+    except Exception as e:
+        failed = _is_upstream_failure(e)
+        breaker.record(not failed)
+        if failed and final:
+            admission.note_unavailable('upstream_error', admission.RETRY_AFTER)
+        raise
+    else:
+        breaker.record(True)
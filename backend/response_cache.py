@@ -0,0 +1,116 @@
+import json
+import os
+import threading
+
+from ttl_cache import TTLCache
+
+
+class InMemoryBackend:
+    """Per-process LRU backend. Each worker keeps its own copy."""
+
+    def __init__(self, maxsize=1024, ttl=30):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def get(self, key):
+        return self._cache.get(key)
+
+    def set(self, key, value, ttl):
+        self._cache.set(key, value, ttl=ttl)
+
+    def delete(self, *keys):
+        for key in keys:
+            self._cache.delete(key)
+
+
+class RedisBackend:
+    """Shared backend so every worker sees the same entries and invalidations."""
+
+    def __init__(self, url, prefix='civiceye:'):
+        import redis  # Optional dependency, only needed for this backend
+        self._redis = redis.Redis.from_url(url)
+        self._prefix = prefix
+
+    def get(self, key):
+        value = self._redis.get(self._prefix + key)
+        return json.loads(value) if value is not None else None
+
+    def set(self, key, value, ttl):
+        self._redis.set(self._prefix + key, json.dumps(value), ex=max(1, int(ttl)))
+
+    def delete(self, *keys):
+        if keys:
+            self._redis.delete(*(self._prefix + key for key in keys))
+
+
+class ResponseCache:
+    """Caches JSON-serializable response payloads with a TTL and explicit invalidation."""
+
+    def __init__(self, backend, ttl=30, enabled=True):
+        self.backend = backend
+        self.ttl = ttl
+        self.enabled = enabled and ttl > 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        try:
+            value = self.backend.get(key)
+        except Exception as e:
+            # A cache outage should only cost us the cache, never the request
+            print(f"ERROR reading response cache: {e}")
+            value = None
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key, value):
+        if not self.enabled:
+            return
+        try:
+            self.backend.set(key, value, self.ttl)
+        except Exception as e:
+            print(f"ERROR writing response cache: {e}")
+
+    def invalidate(self, *keys):
+        if not self.enabled:
+            return
+        try:
+            self.backend.delete(*keys)
+        except Exception as e:
+            print(f"ERROR invalidating response cache: {e}")
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'enabled': self.enabled,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': (self.hits / total) if total else 0,
+        }
+
+
+# ----------------- Dashboard keys -----------------
+GOVERNMENT_DASHBOARD_KEY = 'dashboard:government'
+
+def citizen_dashboard_key(user_id):
+    return f'dashboard:citizen:{user_id}'
+
+
+def _backend_from_env(ttl):
+    backend = os.getenv('RESPONSE_CACHE_BACKEND', 'memory')
+    if backend == 'redis':
+        return RedisBackend(os.getenv('RESPONSE_CACHE_URL', 'redis://localhost:6379/0'))
+    if backend == 'memory':
+        return InMemoryBackend(maxsize=int(os.getenv('RESPONSE_CACHE_SIZE', 1024)), ttl=ttl)
+    raise ValueError(f"Unknown RESPONSE_CACHE_BACKEND: {backend}")
+
+
+_ttl = int(os.getenv('RESPONSE_CACHE_TTL', 10))
+dashboard_cache = ResponseCache(_backend_from_env(_ttl), ttl=_ttl)
@@ -0,0 +1,307 @@
+import atexit
+import bisect
+import gzip
+import heapq
+import json
+import math
+import os
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+
+import clients
+from pagination import iter_rows
+from text import tokenize
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+# Titles are short and descriptive, so their words count this many times
+TITLE_WEIGHT = 2
+# A prefix expands to at most this many indexed terms
+MAX_PREFIX_TERMS = 50
+
+FILTER_FIELDS = ('category', 'status', 'priority')
+INDEX_COLUMNS = 'id, user_id, title, description, location_text, category, status, priority, created_at, updated_at'
+SNAPSHOT_VERSION = 1
+# Each sync re-reads rows changed this long before the last one it saw: other workers' writes
+# can commit a little after a later updated_at was already read
+SYNC_OVERLAP = timedelta(seconds=int(os.getenv('SEARCH_SYNC_OVERLAP_SECONDS', 60)))
+
+
+def _terms(issue):
+    tokens = tokenize(issue.get('title')) * TITLE_WEIGHT
+    tokens += tokenize(issue.get('description'))
+    tokens += tokenize(issue.get('location_text'))
+    return Counter(tokens)
+
+
+def _meta(issue):
+    meta = {field: issue.get(field) for field in FILTER_FIELDS}
+    meta['user_id'] = issue.get('user_id')
+    return meta
+
+
+class SearchIndex:
+    """Inverted index over issue title, description and location_text with BM25 ranking.
+
+    Kept current by this worker's issue write paths, and by `sync()` passes over rows
+    changed in the table (which also brings in other workers' writes). `snapshot()`/`restore()`
+    persist it so a restart only has to catch up on rows changed since the snapshot was taken.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings = {}      # term -> {issue id: term frequency}
+        self._terms = []         # sorted vocabulary, for prefix lookups
+        self._docs = {}          # issue id -> {'tf': {...}, 'length': n, 'meta': {...}}
+        self._total_length = 0
+        # Latest updated_at/created_at read from the table, so the next sync knows where to resume
+        self.high_water = None
+        # Changes made while a sync is reading the table, applied again once it has finished
+        self._pending = None
+
+    def __len__(self):
+        return len(self._docs)
+
+    def add(self, issue):
+        """Index (or re-index) an issue row."""
+        tf = _terms(issue)
+        meta = _meta(issue)
+        with self._lock:
+            self._record('add', issue)
+            self._remove_locked(issue['id'])
+            self._insert_locked(issue['id'], dict(tf), meta)
+
+    def update(self, old_issue, new_issue):
+        if 'title' in new_issue:
+            self.add(new_issue)
+            return
+        # Partial row: only the filterable fields can have changed
+        with self._lock:
+            self._record('update', old_issue, new_issue)
+            doc = self._docs.get(old_issue['id'])
+            if doc:
+                for field in FILTER_FIELDS:
+                    if field in new_issue:
+                        doc['meta'][field] = new_issue[field]
+
+    def remove(self, issue_id):
+        with self._lock:
+            self._record('remove', issue_id)
+            self._remove_locked(issue_id)
+
+    def _record(self, method, *args):
+        if self._pending is not None:
+            self._pending.append((method, args))
+
+    def sync(self, rows, base=None):
+        """Index rows read from the table; returns how many there were.
+
+        With `base` (a fresh or restored index) the rows go into it, and it then replaces this
+        index. Without it, they are indexed in place. Either way, writes made while the rows
+        were being read are applied again afterwards, since the scan may have read a row
+        before one of them changed it.
+        """
+        target = base or self
+        with self._lock:
+            self._pending = []
+        try:
+            count = 0
+            high_water = target.high_water
+            for row in rows:
+                with target._lock:
+                    target._remove_locked(row['id'])
+                    target._insert_locked(row['id'], dict(_terms(row)), _meta(row))
+                changed_at = row.get('updated_at') or row.get('created_at')
+                if changed_at and (high_water is None or changed_at > high_water):
+                    high_water = changed_at
+                count += 1
+            with self._lock:
+                pending, self._pending = self._pending, None
+                for method, args in pending:
+                    getattr(target, method)(*args)
+                if target is not self:
+                    self._postings, self._terms, self._docs = target._postings, target._terms, target._docs
+                    self._total_length = target._total_length
+                self.high_water = high_water
+            return count
+        finally:
+            with self._lock:
+                self._pending = None
+
+    def _insert_locked(self, issue_id, tf, meta):
+        length = sum(tf.values())
+        self._docs[issue_id] = {'tf': tf, 'length': length, 'meta': meta}
+        self._total_length += length
+        for term, count in tf.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                bisect.insort(self._terms, term)
+            postings[issue_id] = count
+
+    def _remove_locked(self, issue_id):
+        doc = self._docs.pop(issue_id, None)
+        if doc is None:
+            return
+        self._total_length -= doc['length']
+        for term in doc['tf']:
+            postings = self._postings[term]
+            postings.pop(issue_id, None)
+            if not postings:
+                del self._postings[term]
+                del self._terms[bisect.bisect_left(self._terms, term)]
+
+    def _expand(self, token, prefix):
+        if not prefix:
+            return [token] if token in self._postings else []
+        start = bisect.bisect_left(self._terms, token)
+        matches = []
+        for term in self._terms[start:start + MAX_PREFIX_TERMS]:
+            if not term.startswith(token):
+                break
+            matches.append(term)
+        return matches
+
+    def search(self, query, filters=None, user_id=None, offset=0, limit=20, prefix=True):
+        """Rank matching issues by BM25.
+
+        The last query word is treated as a prefix (for search-as-you-type), as is any
+        word ending in '*'. Returns ([(issue id, score), ...] for the page, total matches).
+        """
+        words = query.split()
+        tokens = []
+        for position, word in enumerate(words):
+            is_prefix = word.endswith('*') or (prefix and position == len(words) - 1)
+            for token in tokenize(word.rstrip('*')):
+                tokens.append((token, is_prefix))
+        if not tokens:
+            return [], 0
+        filters = {field: value for field, value in (filters or {}).items() if value}
+
+        with self._lock:
+            doc_count = len(self._docs)
+            if not doc_count:
+                return [], 0
+            average_length = self._total_length / doc_count
+            scores = {}
+            for token, is_prefix in tokens:
+                for term in self._expand(token, is_prefix):
+                    postings = self._postings[term]
+                    idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                    # Prefix expansions count for less than the exact word
+                    weight = idf if term == token else idf * 0.5
+                    for issue_id, tf in postings.items():
+                        doc = self._docs[issue_id]
+                        meta = doc['meta']
+                        if user_id is not None and meta['user_id'] != user_id:
+                            continue
+                        if any(meta.get(field) != value for field, value in filters.items()):
+                            continue
+                        norm = tf * (K1 + 1) / (tf + K1 * (1 - B + B * doc['length'] / average_length))
+                        scores[issue_id] = scores.get(issue_id, 0) + weight * norm
+
+        top = heapq.nlargest(offset + limit, scores.items(), key=lambda item: item[1])
+        return top[offset:offset + limit], len(scores)
+
+    # ----------------- Snapshots -----------------
+    def snapshot(self, path):
+        """Write the index to `path` (gzipped JSON), replacing any previous snapshot atomically."""
+        with self._lock:
+            data = {
+                'version': SNAPSHOT_VERSION,
+                'high_water': self.high_water,
+                'docs': [[issue_id, doc['tf'], doc['meta']] for issue_id, doc in self._docs.items()],
+            }
+        tmp_path = f'{path}.tmp'
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            json.dump(data, f, separators=(',', ':'))
+        os.replace(tmp_path, path)
+
+    def restore(self, path):
+        """Load a snapshot into this index; meant for a fresh index that is then passed to sync()."""
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('version') != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported search snapshot version: {data.get('version')}")
+        with self._lock:
+            for issue_id, tf, meta in data['docs']:
+                self._remove_locked(issue_id)
+                self._insert_locked(issue_id, tf, meta)
+            self.high_water = data.get('high_water')
+
+
+search_index = SearchIndex()
+
+
+def _since(high_water):
+    """`high_water` moved back by SYNC_OVERLAP (rows seen twice are just re-indexed)."""
+    try:
+        return (datetime.fromisoformat(high_water) - SYNC_OVERLAP).isoformat()
+    except ValueError:
+        return high_water
+
+
+def _sync_from_table(since=None, base=None):
+    """Index every issue, or only those changed since about `since`."""
+    def make_query():
+        query = clients.service().table('issues').select(INDEX_COLUMNS)
+        if since:
+            query = query.gte('updated_at', _since(since))
+        return query
+
+    return search_index.sync(iter_rows(make_query, page_size=1000), base=base)
+
+
+def init_search_index():
+    """Restore the last snapshot (or scan the table) in the background, then sync and snapshot
+    periodically."""
+    path = os.getenv('SEARCH_SNAPSHOT_PATH')
+    interval = int(os.getenv('SEARCH_SNAPSHOT_SECONDS', 300))
+    sync_interval = int(os.getenv('SEARCH_SYNC_SECONDS', 60))
+
+    def load():
+        try:
+            fresh = SearchIndex()
+            if path and os.path.exists(path):
+                fresh.restore(path)
+                changed = _sync_from_table(since=fresh.high_water, base=fresh)
+                print(f"Search index restored with {len(search_index)} issues ({changed} changed since snapshot)")
+            else:
+                _sync_from_table(base=fresh)
+                print(f"Search index built with {len(search_index)} issues")
+        except Exception as e:
+            # The periodic sync below scans the whole table while nothing has been read yet
+            print(f"ERROR loading search index: {e}")
+
+        if path:
+            atexit.register(_save_snapshot, path)
+            if interval > 0:
+                threading.Thread(target=_run_every, args=(interval, _save_snapshot, path),
+                                 name='search-snapshot', daemon=True).start()
+        if sync_interval > 0:
+            _run_every(sync_interval, _sync_changes)
+
+    threading.Thread(target=load, name='search-index', daemon=True).start()
+
+
+def _run_every(interval, function, *args):
+    stop = threading.Event()
+    while not stop.wait(interval):
+        function(*args)
+
+
+def _sync_changes():
+    """Pick up rows changed by other workers since the last sync."""
+    try:
+        _sync_from_table(since=search_index.high_water)
+    except Exception as e:
+        print(f"ERROR syncing search index: {e}")
+
+
+def _save_snapshot(path):
+    try:
+        search_index.snapshot(path)
+    except Exception as e:
+        print(f"ERROR saving search snapshot: {e}")
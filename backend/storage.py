@@ -0,0 +1,69 @@
+import os
+
+
+class LocalStorage:
+    """Uploaded files on the local filesystem, served back by the uploads blueprint.
+
+    Other backends (object storage, Supabase Storage) implement the same methods:
+    save, open, exists, delete and url.
+    """
+
+    def __init__(self, root, base_url):
+        self.root = os.path.abspath(root)
+        self.base_url = base_url.rstrip('/')
+
+    def _path(self, key):
+        path = os.path.abspath(os.path.join(self.root, key))
+        if not path.startswith(self.root + os.sep):
+            raise ValueError(f"Invalid storage key: {key}")
+        return path
+
+    def save(self, key, chunks):
+        """Write an iterable of byte chunks to `key`; returns the number of bytes written.
+
+        The file only appears under its key once it is complete, so readers never see a
+        partial upload, and nothing is left behind if `chunks` raises.
+        """
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.part'
+        size = 0
+        try:
+            with open(tmp_path, 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    size += len(chunk)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return size
+
+    def open(self, key):
+        return open(self._path(key), 'rb')
+
+    def exists(self, key):
+        return os.path.exists(self._path(key))
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def url(self, key):
+        return f'{self.base_url}/{key}'
+
+    def directory(self):
+        return self.root
+
+
+def storage_from_env():
+    backend = os.getenv('UPLOAD_STORAGE', 'local')
+    if backend == 'local':
+        return LocalStorage(
+            os.getenv('UPLOAD_DIR', 'uploads'),
+            os.getenv('UPLOAD_BASE_URL', '/api/uploads/files'),
+        )
+    raise ValueError(f"Unknown UPLOAD_STORAGE: {backend}")
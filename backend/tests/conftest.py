@@ -0,0 +1,39 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# The app reads its settings at import time, so configure it before anything imports it:
+# the in-memory Supabase stand-in with a small data set, and no per-user rate limits
+os.environ.update({
+    'SUPABASE_FAKE': 'true',
+    'FAKE_SUPABASE_CITIZENS': '10',
+    'FAKE_SUPABASE_OFFICIALS': '2',
+    'FAKE_SUPABASE_ISSUES': '300',
+    'FAKE_SUPABASE_COMMENTS': '300',
+    'RATE_LIMIT_READ_RATE': '0',
+    'RATE_LIMIT_WRITE_RATE': '0',
+    'UPLOAD_DIR': tempfile.mkdtemp(prefix='civiceye-test-uploads-'),
+})
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='session')
+def app():
+    import app as backend
+    return backend.app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def login(client):
+    def sign_in(email):
+        response = client.post('/api/auth/login', json={'email': email, 'password': 'password'})
+        assert response.status_code == 200, response.get_json()
+        return {'Authorization': f"Bearer {response.get_json()['access_token']}"}
+    return sign_in
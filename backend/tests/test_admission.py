@@ -0,0 +1,29 @@
+import admission
+import resilience
+
+ORIGIN = 'http://localhost:5173'
+
+
+def test_shed_request_keeps_cors_headers(client, monkeypatch):
+    monkeypatch.setattr(admission, 'SHED_TARGET', 0.001)
+    monkeypatch.setattr(admission, 'SHED_MAX_FRACTION', 1.0)
+    monkeypatch.setattr(admission.latency_monitor, 'average', 1.0)
+
+    response = client.get('/api/issues/', headers={'Origin': ORIGIN})
+    assert response.status_code == 503
+    assert response.headers['Retry-After']
+    assert response.headers['Access-Control-Allow-Origin'] == ORIGIN
+
+
+def test_open_breaker_503_keeps_cors_headers(client, login, monkeypatch):
+    headers = {**login('citizen0@example.com'), 'Origin': ORIGIN}
+    breaker = resilience.breakers['postgrest']
+    monkeypatch.setattr(breaker, 'failures', 1)
+    monkeypatch.setattr(breaker, 'state', 'open')
+    monkeypatch.setattr(breaker, 'opened_at', resilience.time.monotonic())
+
+    response = client.get('/api/issues/', headers=headers)
+    assert response.status_code == 503
+    assert response.get_json()['message'] == 'Service is temporarily unavailable, try again shortly'
+    assert response.headers['Retry-After']
+    assert response.headers['Access-Control-Allow-Origin'] == ORIGIN
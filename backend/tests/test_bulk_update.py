@@ -0,0 +1,74 @@
+import pytest
+
+import issues
+
+
+@pytest.fixture
+def official(login):
+    return login('official1@example.com')
+
+
+def _issues(app, count):
+    import app as backend
+    return sorted(backend.supabase.database.tables['issues'], key=lambda row: row['id'])[:count]
+
+
+def test_bulk_update_is_for_officials_only(client, login):
+    response = client.put('/api/issues/bulk', json={'updates': [{'id': 1, 'status': 'verified'}]},
+                          headers=login('citizen1@example.com'))
+    assert response.status_code == 403
+
+
+def test_updates_report_each_item(app, client, official):
+    first, second = _issues(app, 2)
+    response = client.put('/api/issues/bulk', headers=official, json={'updates': [
+        {'id': first['id'], 'status': 'In_Progress'},
+        {'id': second['id'], 'priority': 'high'},
+        {'id': 'abc', 'status': 'verified'},
+        {'status': 'verified'},
+        {'id': second['id'], 'status': 'verified'},
+        {'id': 999999, 'status': 'verified'},
+        {'id': first['id'] + 2, 'title': 'not updatable'},
+    ]})
+    assert response.status_code == 200
+    body = response.get_json()
+    outcomes = {str(item['id']): item for item in body['results']}
+
+    assert outcomes[str(first['id'])]['success']
+    assert outcomes[str(first['id'])]['issue']['status'] == 'in_progress'
+    assert outcomes[str(second['id'])] == {'id': second['id'], 'success': False, 'error': 'Duplicate id in batch'}
+    assert outcomes['abc']['error'] == 'id must be an integer'
+    assert outcomes['None']['error'] == 'id is required'
+    assert outcomes['999999']['error'] == 'Issue not found'
+    assert outcomes[str(first['id'] + 2)]['error'] == 'No valid fields to update'
+    # The duplicate replaces the earlier outcome for its id
+    assert body['updated'] == 1 and body['failed'] == 5
+    assert first['status'] == 'in_progress'
+
+
+def test_filter_and_patch(app, client, official, monkeypatch):
+    rows = _issues(app, 3)
+    ids = [row['id'] for row in rows]
+    response = client.put('/api/issues/bulk', headers=official,
+                          json={'filter': {'ids': ids}, 'patch': {'priority': 'urgent'}})
+    assert response.status_code == 200
+    assert response.get_json()['updated'] == 3
+    assert all(row['priority'] == 'urgent' for row in rows)
+
+    monkeypatch.setattr(issues, 'BULK_MAX_ITEMS', 2)
+    response = client.put('/api/issues/bulk', headers=official,
+                          json={'filter': {'ids': ids}, 'patch': {'priority': 'low'}})
+    assert response.status_code == 400
+    assert all(row['priority'] == 'urgent' for row in rows)
+
+
+@pytest.mark.parametrize('body', [
+    {},
+    {'updates': [], },
+    {'updates': [{'id': 1}], 'filter': {'status': 'reported'}},
+    {'filter': {'title': 'x'}, 'patch': {'status': 'verified'}},
+    {'filter': {'ids': ['1']}, 'patch': {'status': 'verified'}},
+    {'filter': {'status': 'reported'}, 'patch': {'title': 'x'}},
+])
+def test_bulk_update_rejects_malformed_bodies(client, official, body):
+    assert client.put('/api/issues/bulk', json=body, headers=official).status_code == 400
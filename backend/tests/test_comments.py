@@ -0,0 +1,17 @@
+from events import event_bus
+
+
+def test_official_comment_reaches_the_issue_owner(client, login):
+    citizen = login('citizen1@example.com')
+    issue = client.get('/api/issues/?limit=1', headers=citizen).get_json()['issues'][0]
+    subscription = event_bus.subscribe(user_id=issue['user_id'])
+    try:
+        response = client.post(f"/api/issues/{issue['id']}/comments", json={'comment': 'Crew scheduled'},
+                               headers=login('official0@example.com'))
+        assert response.status_code == 201, response.get_json()
+
+        event = subscription.next(timeout=1)
+        assert event['type'] == 'comment.added'
+        assert event['data']['comment']['id'] == response.get_json()['comment']['id']
+    finally:
+        event_bus.unsubscribe(subscription)
@@ -0,0 +1,58 @@
+import pytest
+
+
+@pytest.fixture
+def owner(login):
+    return login('citizen8@example.com')
+
+
+@pytest.fixture
+def issue(client, owner):
+    return client.get('/api/issues/?limit=1', headers=owner).get_json()['issues'][0]
+
+
+def test_unchanged_issue_is_answered_with_304(client, owner, issue):
+    response = client.get(f"/api/issues/{issue['id']}", headers=owner)
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+    assert response.headers['Cache-Control'] == 'private, no-cache'
+
+    response = client.get(f"/api/issues/{issue['id']}", headers={**owner, 'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+    assert response.headers['ETag'] == etag
+
+    last_modified = client.get(f"/api/issues/{issue['id']}", headers=owner).headers['Last-Modified']
+    response = client.get(f"/api/issues/{issue['id']}", headers={**owner, 'If-Modified-Since': last_modified})
+    assert response.status_code == 304
+
+
+def test_update_and_new_comment_change_the_etags(client, login, owner, issue):
+    official = login('official0@example.com')
+    issue_etag = client.get(f"/api/issues/{issue['id']}", headers=owner).headers['ETag']
+    comments_etag = client.get(f"/api/issues/{issue['id']}/comments", headers=owner).headers['ETag']
+
+    client.post(f"/api/issues/{issue['id']}/comments", json={'comment': 'Looking into it'}, headers=official)
+    response = client.get(f"/api/issues/{issue['id']}", headers={**owner, 'If-None-Match': issue_etag})
+    assert response.status_code == 200
+    response = client.get(f"/api/issues/{issue['id']}/comments", headers={**owner, 'If-None-Match': comments_etag})
+    assert response.status_code == 200
+    assert response.get_json()['comments'][0]['comment'] == 'Looking into it'
+
+    issue_etag = client.get(f"/api/issues/{issue['id']}", headers=owner).headers['ETag']
+    assert client.put(f"/api/issues/{issue['id']}", json={'priority': 'high'}, headers=official).status_code == 200
+    response = client.get(f"/api/issues/{issue['id']}", headers={**owner, 'If-None-Match': issue_etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != issue_etag
+
+
+def test_validators_do_not_reveal_other_users_issues(client, login, owner, issue):
+    etag = client.get(f"/api/issues/{issue['id']}", headers=owner).headers['ETag']
+    response = client.get(f"/api/issues/{issue['id']}", headers={**login('citizen9@example.com'), 'If-None-Match': etag})
+    assert response.status_code == 404
+
+
+def test_comment_pages_have_their_own_etags(client, owner, issue):
+    first = client.get(f"/api/issues/{issue['id']}/comments?limit=1", headers=owner).headers['ETag']
+    second = client.get(f"/api/issues/{issue['id']}/comments?limit=2", headers=owner).headers['ETag']
+    assert first != second
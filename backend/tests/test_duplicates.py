@@ -0,0 +1,49 @@
+from duplicates import duplicate_index
+
+REPORT = {
+    'title': 'Burst water main flooding the street',
+    'description': 'Water has been gushing out of a broken main since the morning',
+    'category': 'water',
+    'location_text': 'Corner of Oak Avenue and 5th Street',
+}
+
+
+def _existing_issue(client, headers):
+    response = client.post('/api/issues/', json=REPORT, headers=headers)
+    assert response.status_code == 201, response.get_json()
+    return response.get_json()['issue']
+
+
+def test_citizens_only_see_details_of_their_own_duplicates(client, login):
+    owner = login('citizen4@example.com')
+    issue = _existing_issue(client, owner)
+
+    response = client.post('/api/issues/', json={**REPORT, 'check_duplicates': True},
+                           headers=login('citizen5@example.com'))
+    assert response.status_code == 409
+    match = next(d for d in response.get_json()['duplicates'] if d['id'] == issue['id'])
+    assert set(match) == {'id', 'category', 'similarity'}
+
+    response = client.post('/api/issues/', json={**REPORT, 'check_duplicates': True}, headers=owner)
+    match = next(d for d in response.get_json()['duplicates'] if d['id'] == issue['id'])
+    assert match['title'] == REPORT['title']
+
+    response = client.post('/api/issues/', json={**REPORT, 'check_duplicates': True},
+                           headers=login('official1@example.com'))
+    match = next(d for d in response.get_json()['duplicates'] if d['id'] == issue['id'])
+    assert match['location_text'] == REPORT['location_text']
+    duplicate_index.remove(issue['id'])
+
+
+def test_attach_is_written_as_the_user(client, login):
+    issue = _existing_issue(client, login('citizen6@example.com'))
+
+    response = client.post('/api/issues/', json={**REPORT, 'attach_to': issue['id']},
+                           headers=login('citizen7@example.com'))
+    assert response.status_code == 403, response.get_json()
+
+    response = client.post('/api/issues/', json={**REPORT, 'attach_to': issue['id']},
+                           headers=login('official1@example.com'))
+    assert response.status_code == 200, response.get_json()
+    assert response.get_json()['comment']['issue_id'] == issue['id']
+    duplicate_index.remove(issue['id'])
@@ -0,0 +1,87 @@
+import functools
+import json
+
+import pytest
+
+import dashboard
+from events import event_bus, sse_stream
+
+REPORT = {'title': 'Graffiti on the library wall', 'description': 'Fresh spray paint on the north wall',
+          'category': 'others', 'location_text': 'Central Library'}
+
+
+@pytest.fixture(autouse=True)
+def quick_heartbeat(monkeypatch):
+    # An idle stream sends a keepalive at once, which marks the end of what was queued
+    monkeypatch.setattr(dashboard, 'sse_stream', functools.partial(sse_stream, heartbeat=0.05))
+
+
+def _open(client, headers, **params):
+    response = client.get('/api/dashboard/stream', headers=headers, query_string=params, buffered=False)
+    assert response.status_code == 200, response.get_data(as_text=True)
+    return response
+
+
+def _drain(response):
+    """The events queued on an open stream so far, then close it."""
+    events = []
+    try:
+        for chunk in response.response:
+            text = chunk.decode() if isinstance(chunk, bytes) else chunk
+            if text.startswith(': keepalive'):
+                break
+            fields = dict(line.split(': ', 1) for line in text.strip().splitlines())
+            events.append((fields['event'], json.loads(fields['data'])))
+    finally:
+        response.close()
+    return events
+
+
+def test_citizens_only_receive_events_for_their_own_issues(client, login):
+    alice, bob, official = login('citizen1@example.com'), login('citizen2@example.com'), login('official0@example.com')
+    alice_issue = client.get('/api/issues/?limit=1', headers=alice).get_json()['issues'][0]
+    streams = {name: _open(client, headers) for name, headers in
+               (('alice', alice), ('bob', bob), ('official', official))}
+
+    bob_issue = client.post('/api/issues/', json=REPORT, headers=bob).get_json()['issue']
+    client.put(f"/api/issues/{alice_issue['id']}", json={'priority': 'urgent'}, headers=official)
+    client.post(f"/api/issues/{alice_issue['id']}/comments", json={'comment': 'On it'}, headers=official)
+
+    events = {name: _drain(response) for name, response in streams.items()}
+    assert all(events[name][0][0] == 'snapshot' for name in events)
+
+    alice_events = [(kind, data) for kind, data in events['alice'][1:]]
+    assert [kind for kind, _ in alice_events] == ['issue.updated', 'comment.added']
+    assert alice_events[1][1]['comment']['issue_id'] == alice_issue['id']
+
+    bob_events = events['bob'][1:]
+    assert [kind for kind, _ in bob_events] == ['issue.created']
+    assert bob_events[0][1]['issue']['id'] == bob_issue['id']
+
+    assert [kind for kind, _ in events['official'][1:]] == ['issue.created', 'issue.updated', 'comment.added']
+
+
+def test_citizen_snapshot_counts_only_their_own_issues(app, client, login):
+    import app as backend
+    user_id = client.get('/api/auth/profile', headers=login('citizen3@example.com')).get_json()['user']['id']
+    own = sum(1 for row in backend.supabase.database.tables['issues'] if row['user_id'] == user_id)
+
+    kind, data = _drain(_open(client, login('citizen3@example.com')))[0]
+    assert kind == 'snapshot'
+    assert data['counters']['total'] == own
+
+
+def test_resumed_stream_replays_only_the_citizens_own_events(client, login):
+    alice, bob = login('citizen1@example.com'), login('citizen2@example.com')
+    last_event_id = event_bus.stats()['last_event_id']
+    client.post('/api/issues/', json=REPORT, headers=alice)
+    client.post('/api/issues/', json=REPORT, headers=bob)
+
+    events = _drain(_open(client, bob, last_event_id=last_event_id))
+    assert [kind for kind, _ in events] == ['issue.created']
+    assert events[0][1]['issue']['title'] == REPORT['title']
+
+
+def test_invalid_last_event_id_is_rejected(client, login):
+    response = client.get('/api/dashboard/stream', headers={**login('citizen1@example.com'), 'Last-Event-ID': 'abc'})
+    assert response.status_code == 400
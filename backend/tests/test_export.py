@@ -0,0 +1,69 @@
+import csv
+import io
+import json
+
+import pytest
+
+import issues
+
+
+@pytest.fixture
+def official(login):
+    return login('official0@example.com')
+
+
+def _table(app):
+    import app as backend
+    return backend.supabase.database.tables['issues']
+
+
+def test_export_is_for_officials_only(client, login):
+    assert client.get('/api/issues/export', headers=login('citizen1@example.com')).status_code == 403
+
+
+def test_ndjson_export_streams_every_issue_across_pages(app, client, official, monkeypatch):
+    monkeypatch.setattr(issues, 'EXPORT_PAGE_SIZE', 7)
+    response = client.get('/api/issues/export', headers=official)
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert response.mimetype == 'application/x-ndjson'
+
+    rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert sorted(row['id'] for row in rows) == sorted(row['id'] for row in _table(app))
+
+
+def test_csv_export_with_fields_and_filters(app, client, official):
+    response = client.get('/api/issues/export?format=csv&fields=id,title,status&status=resolved', headers=official)
+    assert response.status_code == 200
+    assert response.headers['Content-Disposition'].endswith('.csv"')
+
+    reader = csv.reader(io.StringIO(response.get_data(as_text=True)))
+    # created_at is always included: the export pages on it
+    assert next(reader) == ['id', 'title', 'status', 'created_at']
+    rows = list(reader)
+    assert rows and all(row[2] == 'resolved' for row in rows)
+    assert len(rows) == sum(1 for row in _table(app) if row['status'] == 'resolved')
+
+
+@pytest.mark.parametrize('query', ['format=xml', 'from=yesterday', 'fields=password'])
+def test_export_rejects_bad_parameters(client, official, query):
+    assert client.get(f'/api/issues/export?{query}', headers=official).status_code == 400
+
+
+def _failing_rows(make_query, page_size):
+    yield {'id': 1, 'title': 'first'}
+    raise RuntimeError('connection lost')
+
+
+def test_failed_ndjson_export_ends_with_an_error_line(client, official, monkeypatch):
+    monkeypatch.setattr(issues, 'iter_rows', _failing_rows)
+    lines = client.get('/api/issues/export', headers=official).get_data(as_text=True).splitlines()
+    assert json.loads(lines[0])['id'] == 1
+    assert json.loads(lines[-1])['error'] == 'Export interrupted'
+
+
+def test_failed_csv_export_aborts_the_transfer(client, official, monkeypatch):
+    monkeypatch.setattr(issues, 'iter_rows', _failing_rows)
+    response = client.get('/api/issues/export?format=csv&fields=id,title', headers=official)
+    with pytest.raises(RuntimeError):
+        response.get_data()
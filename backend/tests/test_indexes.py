@@ -0,0 +1,108 @@
+from datetime import datetime
+
+import geo
+import search
+from duplicates import DuplicateIndex
+from geo import SpatialIndex
+from search import SearchIndex
+
+
+def _report(issue_id, title, category='roads', status='reported'):
+    return {'id': issue_id, 'category': category, 'title': title, 'description': '', 'location_text': '',
+            'status': status}
+
+
+def test_duplicate_rebuild_keeps_writes_made_while_loading():
+    index = DuplicateIndex()
+
+    def rows():
+        yield _report(1, 'deep pothole on station road')
+        # Hooks firing while the table is being scanned
+        index.add(_report(2, 'broken streetlight near the school'))
+        index.remove(1)
+        yield _report(3, 'leaking water pipe', category='water')
+
+    index.rebuild(rows())
+
+    assert len(index) == 2
+    assert [c['id'] for c in index.candidates(_report(None, 'broken streetlight near school'))] == [2]
+    assert index.candidates(_report(None, 'deep pothole on station road')) == []
+
+
+def _point(issue_id, lat, lng, category='roads'):
+    return {'id': issue_id, 'user_id': 'u1', 'latitude': lat, 'longitude': lng, 'category': category,
+            'status': 'reported', 'priority': 'medium'}
+
+
+def test_spatial_rebuild_keeps_writes_made_while_loading():
+    index = SpatialIndex()
+
+    def rows():
+        yield _point(1, 12.97, 77.59)
+        index.add(_point(2, 12.98, 77.60))
+        index.remove(1)
+
+    index.rebuild(rows())
+
+    result = index.query(12.9, 77.5, 13.0, 77.7)
+    assert [point['id'] for point in result['points']] == [2]
+
+
+def test_clusters_respect_category_and_radius(monkeypatch):
+    monkeypatch.setattr(geo, 'MAX_POINTS', 5)
+    index = SpatialIndex()
+    # Roads issues in the south-west of the box, water issues in the north-east
+    for i in range(20):
+        index.add(_point(i, 12.0 + i * 0.001, 77.0 + i * 0.001, 'roads'))
+        index.add(_point(100 + i, 12.9 + i * 0.001, 77.9 + i * 0.001, 'water'))
+
+    result = index.query(11.9, 76.9, 13.0, 78.0, category='water')
+    assert result['mode'] == 'clusters' and result['total'] == 20
+    for cluster in result['clusters']:
+        assert cluster['lat'] > 12.8 and cluster['lng'] > 77.8
+
+    center = (12.0, 77.0, 2.0)
+    bbox = geo.radius_bbox(*center)
+    result = index.query(*bbox, radius=center)
+    within = [i for i in range(20) if geo.haversine_km(12.0, 77.0, 12.0 + i * 0.001, 77.0 + i * 0.001) <= 2.0]
+    assert result['total'] == len(within)
+
+
+def _text(issue_id, title, updated_at, user_id='u1', status='reported'):
+    return {'id': issue_id, 'user_id': user_id, 'title': title, 'description': '', 'location_text': '',
+            'category': 'roads', 'status': status, 'priority': 'medium', 'updated_at': updated_at}
+
+
+def test_search_sync_keeps_writes_made_while_loading():
+    index = SearchIndex()
+    index.add(_text(1, 'deep pothole', '2024-01-01T00:00:00+00:00'))
+
+    def rows():
+        yield _text(1, 'deep pothole', '2024-01-01T00:00:00+00:00')
+        # Read before an update that is applied while the scan is still running
+        index.add(_text(2, 'flooded underpass', '2024-01-03T00:00:00+00:00'))
+        yield _text(2, 'blocked drain', '2024-01-02T00:00:00+00:00')
+        index.remove(1)
+
+    assert index.sync(rows(), base=SearchIndex()) == 2
+
+    assert index.search('pothole')[1] == 0
+    assert [issue_id for issue_id, _ in index.search('flooded')[0]] == [2]
+    assert index.search('drain')[1] == 0
+
+
+def test_search_high_water_only_moves_with_rows_read_from_the_table():
+    index = SearchIndex()
+    index.sync(iter([_text(1, 'deep pothole', '2024-01-01T00:00:00+00:00')]))
+    index.add(_text(2, 'flooded underpass', '2024-06-01T00:00:00+00:00'))
+    assert index.high_water == '2024-01-01T00:00:00+00:00'
+
+    # A row another worker wrote in between, synced in place
+    index.sync(iter([_text(3, 'fallen tree', '2024-03-01T00:00:00+00:00')]))
+    assert index.high_water == '2024-03-01T00:00:00+00:00'
+    assert len(index) == 3
+
+
+def test_search_sync_overlaps_the_last_high_water():
+    assert search._since('2024-01-01T00:01:00+00:00') == (
+        datetime.fromisoformat('2024-01-01T00:01:00+00:00') - search.SYNC_OVERLAP).isoformat()
@@ -0,0 +1,53 @@
+import base64
+import json
+
+import pytest
+
+from pagination import decode_cursor, encode_cursor
+
+
+def _cursor(created_at, row_id):
+    raw = json.dumps([created_at, row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def test_walks_every_page(client, login):
+    headers = login('official0@example.com')
+    first = client.get('/api/issues/?limit=40&count=exact', headers=headers).get_json()
+    seen = [issue['id'] for issue in first['issues']]
+    cursor = first['next_cursor']
+    pages = 1
+    while cursor:
+        response = client.get(f'/api/issues/?limit=40&cursor={cursor}', headers=headers)
+        assert response.status_code == 200, response.get_json()
+        page = response.get_json()
+        seen.extend(issue['id'] for issue in page['issues'])
+        cursor = page['next_cursor']
+        pages += 1
+
+    assert pages > 1
+    assert len(seen) == len(set(seen)) == first['total']
+
+
+def test_cursor_round_trip():
+    created_at, row_id = decode_cursor(encode_cursor({'created_at': '2026-10-17T07:14:22.5+00:00', 'id': 7}))
+    assert (created_at, row_id) == ('2026-10-17T07:14:22.500000+00:00', 7)
+
+
+@pytest.mark.parametrize('created_at, row_id', [
+    ('2026-10-17T07:14:22+00:00",id.gt.0', 1),
+    ('2026-10-17,id.gt.0', 1),
+    ('not a timestamp', 1),
+    ('2026-10-17T07:14:22+00:00', '1",or(id.gt.0'),
+    ('2026-10-17T07:14:22+00:00', True),
+    ('2026-10-17T07:14:22+00:00', [1]),
+])
+def test_rejects_crafted_cursors(created_at, row_id):
+    with pytest.raises(ValueError):
+        decode_cursor(_cursor(created_at, row_id))
+
+
+def test_crafted_cursor_is_a_bad_request(client, login):
+    cursor = _cursor('2026-10-17T07:14:22+00:00",created_at.gt."1970-01-01', 1)
+    response = client.get(f'/api/issues/?cursor={cursor}', headers=login('citizen1@example.com'))
+    assert response.status_code == 400
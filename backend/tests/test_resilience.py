@@ -0,0 +1,136 @@
+import threading
+import time
+
+import httpx
+import pytest
+from gotrue.errors import AuthApiError, AuthRetryableError
+
+import resilience
+from resilience import CircuitBreaker, CircuitOpen, ResilientTransport
+
+URL = 'http://supabase.local/rest/v1'
+
+
+class ScriptedTransport(httpx.BaseTransport):
+    """Answers with the given status codes in turn (or runs a callable for each request)."""
+
+    def __init__(self, *answers):
+        self.answers = list(answers)
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def handle_request(self, request):
+        with self._lock:
+            answer = self.answers[min(self.calls, len(self.answers) - 1)]
+            self.calls += 1
+        if callable(answer):
+            return answer(request)
+        return httpx.Response(answer, json=[])
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(resilience, '_backoff', lambda attempt: 0)
+
+
+def _client(transport, breaker=None):
+    return httpx.Client(transport=ResilientTransport(transport, breaker or CircuitBreaker('test', failures=0)))
+
+
+def test_reads_are_retried_on_gateway_errors():
+    upstream = ScriptedTransport(503, 502, 200)
+    assert _client(upstream).get(f'{URL}/issues').status_code == 200
+    assert upstream.calls == 3
+
+
+def test_writes_are_not_retried():
+    upstream = ScriptedTransport(503, 201)
+    assert _client(upstream).post(f'{URL}/issues', json={}).status_code == 503
+    assert upstream.calls == 1
+
+
+def test_read_only_rpcs_are_retried():
+    upstream = ScriptedTransport(504, 200)
+    assert _client(upstream).post(f'{URL}/rpc/issue_stats', json={}).status_code == 200
+    assert upstream.calls == 2
+
+    other = ScriptedTransport(504, 200)
+    assert _client(other).post(f'{URL}/rpc/bump_counter', json={}).status_code == 504
+    assert other.calls == 1
+
+
+def test_slow_read_is_hedged(monkeypatch):
+    monkeypatch.setattr(resilience, 'HEDGE_DELAY', 0.02)
+    release = threading.Event()
+
+    def slow(request):
+        release.wait(2)
+        return httpx.Response(200, json=['slow'])
+
+    upstream = ScriptedTransport(slow, lambda request: httpx.Response(200, json=['fast']))
+    try:
+        with resilience.hedged():
+            response = _client(upstream).get(f'{URL}/issues')
+        assert response.json() == ['fast']
+        assert upstream.calls == 2
+    finally:
+        release.set()
+
+
+def test_breaker_opens_fails_fast_and_closes_after_a_good_trial():
+    breaker = CircuitBreaker('test', failures=2, reset_seconds=0.05)
+    upstream = ScriptedTransport(500, 500, 200)
+    client = _client(upstream, breaker)
+
+    client.post(f'{URL}/issues', json={})
+    assert breaker.state == 'closed'
+    client.post(f'{URL}/issues', json={})
+    assert breaker.state == 'open'
+
+    with pytest.raises(CircuitOpen):
+        client.post(f'{URL}/issues', json={})
+    assert upstream.calls == 2
+
+    time.sleep(0.06)
+    assert client.post(f'{URL}/issues', json={}).status_code == 200
+    assert breaker.state == 'closed'
+
+
+def test_failed_trial_reopens_the_breaker():
+    breaker = CircuitBreaker('test', failures=1, reset_seconds=0.05)
+    client = _client(ScriptedTransport(500), breaker)
+    client.post(f'{URL}/issues', json={})
+    time.sleep(0.06)
+    client.post(f'{URL}/issues', json={})
+    assert breaker.state == 'open'
+
+
+def test_get_user_is_retried_on_upstream_errors_only(monkeypatch):
+    monkeypatch.setitem(resilience.breakers, 'auth', CircuitBreaker('auth', failures=0))
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise AuthRetryableError('connection reset', 0)
+        return 'user'
+
+    assert resilience.auth_read('user', 'get_user', flaky) == 'user'
+    assert len(attempts) == 3
+
+    def rejected():
+        attempts.append(1)
+        raise AuthApiError('invalid JWT', 401, 'bad_jwt')
+
+    attempts.clear()
+    with pytest.raises(AuthApiError):
+        resilience.auth_read('user', 'get_user', rejected)
+    assert len(attempts) == 1
+
+
+def test_auth_client_gets_a_timeout():
+    class Auth:
+        _http_client = httpx.Client()
+
+    resilience.init_auth_client(Auth)
+    assert Auth._http_client.timeout.read == resilience.AUTH_TIMEOUT
@@ -0,0 +1,108 @@
+import base64
+import json
+import time
+from types import SimpleNamespace
+
+import jwt
+import pytest
+
+from token_verifier import TokenUnverifiable, TokenVerifier
+
+SECRET = 'test-jwt-secret-at-least-32-bytes-long'
+
+
+def _token(secret=SECRET, headers=None, **claims):
+    claims = {'sub': 'user-1', 'aud': 'authenticated', 'exp': int(time.time()) + 60, **claims}
+    return jwt.encode({k: v for k, v in claims.items() if v is not None}, secret, algorithm='HS256',
+                      headers=headers)
+
+
+class RemoteAuth:
+    """supabase.auth.get_user, counting calls."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def get_user(self, token):
+        self.calls += 1
+        return SimpleNamespace(user=SimpleNamespace(id='remote-user'))
+
+
+@pytest.fixture
+def remote():
+    return RemoteAuth()
+
+
+def _verifier(remote, **options):
+    return TokenVerifier(SimpleNamespace(auth=remote), **options)
+
+
+def test_local_verification_makes_no_remote_call(remote):
+    verifier = _verifier(remote, jwt_secret=SECRET)
+    assert verifier.mode == 'local'
+    assert verifier.verify(_token()) == 'user-1'
+    assert remote.calls == 0
+
+
+@pytest.mark.parametrize('token', [
+    _token(secret='some-other-secret-that-is-32-bytes-long'),
+    _token(exp=int(time.time()) - 10),
+    _token(aud='anon'),
+    _token(sub=None),
+    _token(exp=None),
+])
+def test_local_verification_rejects_bad_tokens(remote, token):
+    with pytest.raises(jwt.PyJWTError):
+        _verifier(remote, jwt_secret=SECRET).verify(token)
+    assert remote.calls == 0
+
+
+def test_cached_token_is_not_served_past_its_expiry(remote):
+    verifier = _verifier(remote, jwt_secret=SECRET, cache_ttl=300)
+    token = _token(exp=int(time.time()) + 1)
+    assert verifier.verify(token) == 'user-1'
+    time.sleep(1.1)
+    with pytest.raises(jwt.ExpiredSignatureError):
+        verifier.verify(token)
+
+
+def test_key_set_and_remote_fallback(remote):
+    key = SECRET.encode()
+    jwks = {'keys': [{'kty': 'oct', 'kid': 'k1', 'alg': 'HS256',
+                      'k': base64.urlsafe_b64encode(key).rstrip(b'=').decode()}]}
+    assert _verifier(remote, jwks=jwks).verify(_token(headers={'kid': 'k1'})) == 'user-1'
+
+    unknown = _token(headers={'kid': 'rotated'})
+    with pytest.raises(TokenUnverifiable):
+        _verifier(remote, jwks=jwks).verify(unknown)
+    assert remote.calls == 0
+    assert _verifier(remote, jwks=jwks, remote_fallback=True).verify(unknown) == 'remote-user'
+    assert remote.calls == 1
+
+
+def test_remote_mode_caches_verified_tokens(remote):
+    verifier = _verifier(remote)
+    assert verifier.mode == 'remote'
+    token = _token()
+    assert verifier.verify(token) == verifier.verify(token) == 'remote-user'
+    assert remote.calls == 1
+
+
+def test_tampered_token_is_refused(client, login):
+    header, payload, signature = login('citizen1@example.com')['Authorization'].split()[1].split('.')
+    forged = _token(secret='not-the-project-secret-but-32-bytes').split('.')[1]
+    response = client.get('/api/issues/', headers={'Authorization': f'Bearer {header}.{forged}.{signature}'})
+    assert response.status_code == 401
+
+
+def test_rsa_key_set_without_alg(remote):
+    from cryptography.hazmat.primitives.asymmetric import rsa
+
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    jwk = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(private_key.public_key()))
+    verifier = _verifier(remote, jwks={'keys': [{**jwk, 'kid': 'rsa1'}]})
+
+    token = jwt.encode({'sub': 'user-2', 'aud': 'authenticated', 'exp': int(time.time()) + 60},
+                       private_key, algorithm='RS256', headers={'kid': 'rsa1'})
+    assert verifier.verify(token) == 'user-2'
+    assert remote.calls == 0
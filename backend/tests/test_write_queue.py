@@ -0,0 +1,97 @@
+import os
+import time
+
+import pytest
+
+import issues
+from write_queue import WriteQueue
+
+REPORT = {
+    'title': 'Streetlight out on Elm St',
+    'description': 'The streetlight at the corner has been dark for a week',
+    'category': 'electricity',
+    'location_text': 'Elm St and 3rd Ave',
+}
+
+
+@pytest.fixture
+def make_queue(app, tmp_path):
+    import app as backend
+
+    def make(directory=tmp_path, **options):
+        queue = WriteQueue(str(directory), flush_interval=0.01, workers=1, jwt_secret=backend.jwt_secret, **options)
+        queue.handlers = issues.write_queue.handlers
+        queue.start()
+        return queue
+    return make
+
+
+def _wait_for(client, headers, queue_id):
+    deadline = time.monotonic() + 5
+    while True:
+        status = client.get(f'/api/issues/queued/{queue_id}', headers=headers).get_json()
+        if status.get('status') != 'queued' or time.monotonic() > deadline:
+            return status
+        time.sleep(0.02)
+
+
+def test_queued_report_is_acknowledged_then_written(client, login, monkeypatch, make_queue, tmp_path):
+    monkeypatch.setattr(issues, 'write_queue', make_queue())
+    headers = login('citizen2@example.com')
+
+    response = client.post('/api/issues/', json=REPORT, headers=headers)
+    assert response.status_code == 202, response.get_json()
+    body = response.get_json()
+    assert body['queue_status'] == 'queued'
+    assert body['issue']['status'] == 'reported' and 'id' not in body['issue']
+
+    journal = ''.join(open(os.path.join(tmp_path, name)).read()
+                      for name in os.listdir(tmp_path) if name.endswith('.log'))
+    assert body['queue_id'] in journal
+    assert headers['Authorization'].split()[1] not in journal
+
+    status = _wait_for(client, headers, body['queue_id'])
+    assert status['status'] == 'written', status
+    assert isinstance(status['issue']['id'], int)
+    assert status['issue']['title'] == REPORT['title']
+
+
+def test_rls_decides_whether_a_queued_comment_is_written(client, login, monkeypatch, make_queue):
+    monkeypatch.setattr(issues, 'write_queue', make_queue())
+    issue = client.get('/api/issues/?limit=1', headers=login('citizen1@example.com')).get_json()['issues'][0]
+
+    for email, outcome in (('official0@example.com', 'written'), ('citizen3@example.com', 'failed')):
+        headers = login(email)
+        response = client.post(f"/api/issues/{issue['id']}/comments", json={'comment': 'Seen it too'}, headers=headers)
+        assert response.status_code == 202, response.get_json()
+        assert response.get_json()['comment']['issue_id'] == issue['id']
+        assert _wait_for(client, headers, response.get_json()['queue_id'])['status'] == outcome
+
+
+def test_status_of_a_write_pending_in_another_process(client, login, monkeypatch, make_queue):
+    # The other worker never flushes within the test; both share the journal directory
+    other = make_queue(batch_size=1000)
+    other.flush_interval = 3600
+    monkeypatch.setattr(issues, 'write_queue', other)
+    headers = login('citizen2@example.com')
+    queue_id = client.post('/api/issues/', json=REPORT, headers=headers).get_json()['queue_id']
+
+    monkeypatch.setattr(issues, 'write_queue', make_queue())
+    response = client.get(f'/api/issues/queued/{queue_id}', headers=headers)
+    assert response.status_code == 200
+    assert response.get_json()['status'] == 'queued'
+    assert client.get(f'/api/issues/queued/{queue_id}', headers=login('citizen3@example.com')).status_code == 404
+
+
+def test_status_of_a_written_row_after_a_restart(client, login, monkeypatch, make_queue, tmp_path):
+    monkeypatch.setattr(issues, 'write_queue', make_queue())
+    headers = login('citizen2@example.com')
+    queue_id = client.post('/api/issues/', json=REPORT, headers=headers).get_json()['queue_id']
+    assert _wait_for(client, headers, queue_id)['status'] == 'written'
+
+    # A worker with none of the journal left, e.g. on a fresh volume
+    monkeypatch.setattr(issues, 'write_queue', make_queue(tmp_path / 'fresh'))
+    status = client.get(f'/api/issues/queued/{queue_id}', headers=headers).get_json()
+    assert status['status'] == 'written'
+    assert status['issue']['idempotency_key'] == queue_id
+    assert client.get(f'/api/issues/queued/{queue_id}', headers=login('citizen3@example.com')).status_code == 404
@@ -0,0 +1,22 @@
+import re
+import unicodedata
+
+_WORD = re.compile(r'[a-z0-9]+')
+
+# Common words that carry no signal for matching reports against each other
+STOPWORDS = frozenset('''
+a an and are as at be been but by for from has have in is it its near of on or
+our the there this to was were with very not no
+'''.split())
+
+
+def normalize(text):
+    """Lowercase and strip accents so 'Café' and 'cafe' compare equal."""
+    if not text:
+        return ''
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+
+def tokenize(text, stopwords=STOPWORDS):
+    return [token for token in _WORD.findall(normalize(text)) if token not in stopwords]
@@ -0,0 +1,134 @@
+import hashlib
+import json
+import os
+import time
+
+import jwt
+
+import resilience
+from ttl_cache import TTLCache
+
+
+DEFAULT_ALGORITHMS = {'RSA': 'RS256', 'EC': 'ES256', 'oct': 'HS256', 'OKP': 'EdDSA'}
+
+
+class TokenUnverifiable(Exception):
+    """Raised when a token cannot be checked locally (e.g. unknown signing key)."""
+
+
+class TokenVerifier:
+    """Resolves a Supabase access token to a user id.
+
+    In `local` mode the JWT signature, expiry and audience are checked in-process
+    using either the project's JWT secret (HS256) or a locally loaded JWKS file.
+    In `remote` mode every token is checked with `supabase.auth.get_user`, which is
+    also used as a fallback in local mode when `remote_fallback` is enabled.
+    Verified tokens are cached until the earlier of the cache TTL and their `exp`.
+    """
+
+    def __init__(self, supabase_client, mode=None, jwt_secret=None, jwks=None,
+                 audience='authenticated', remote_fallback=False,
+                 cache_size=10000, cache_ttl=300, leeway=0):
+        self.supabase = supabase_client
+        self.jwt_secret = jwt_secret
+        self.jwks = jwt.PyJWKSet.from_dict(jwks) if jwks else None
+        # PyJWK (2.8) keeps the key's "alg" to itself; without one, use the key type's usual algorithm
+        self.jwk_algorithms = {key.get('kid'): key.get('alg') for key in (jwks or {}).get('keys', [])}
+        self.audience = audience
+        self.remote_fallback = remote_fallback
+        self.leeway = leeway
+        if mode is None:
+            mode = 'local' if (jwt_secret or jwks) else 'remote'
+        if mode not in ('local', 'remote'):
+            raise ValueError(f"Unknown token verification mode: {mode}")
+        if mode == 'local' and not (jwt_secret or jwks):
+            raise ValueError("Local token verification needs SUPABASE_JWT_SECRET or SUPABASE_JWKS_PATH")
+        self.mode = mode
+        self.cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+
+    @classmethod
+    def from_env(cls, supabase_client):
+        jwks = None
+        jwks_path = os.getenv('SUPABASE_JWKS_PATH')
+        if jwks_path:
+            with open(jwks_path) as f:
+                jwks = json.load(f)
+        return cls(
+            supabase_client,
+            mode=os.getenv('AUTH_VERIFY_MODE') or None,
+            jwt_secret=os.getenv('SUPABASE_JWT_SECRET'),
+            jwks=jwks,
+            audience=os.getenv('SUPABASE_JWT_AUDIENCE', 'authenticated'),
+            remote_fallback=os.getenv('AUTH_REMOTE_FALLBACK', 'false').lower() == 'true',
+            cache_size=int(os.getenv('AUTH_TOKEN_CACHE_SIZE', 10000)),
+            cache_ttl=int(os.getenv('AUTH_TOKEN_CACHE_TTL', 300)),
+            leeway=int(os.getenv('AUTH_JWT_LEEWAY', 0)),
+        )
+
+    def verify(self, token):
+        """Return the user id for `token`, raising an exception if it is not valid."""
+        cache_key = hashlib.sha256(token.encode()).digest()
+        user_id = self.cache.get(cache_key)
+        if user_id:
+            return user_id
+
+        if self.mode == 'local':
+            try:
+                user_id, exp = self._verify_locally(token)
+            except TokenUnverifiable:
+                if not self.remote_fallback:
+                    raise
+                user_id, exp = self._verify_remotely(token)
+        else:
+            user_id, exp = self._verify_remotely(token)
+
+        if not user_id:
+            raise ValueError('Token is valid but user ID is missing')
+
+        # Never keep a token around past its own expiry
+        if exp:
+            self.cache.set(cache_key, user_id, ttl=exp - time.time())
+        else:
+            self.cache.set(cache_key, user_id)
+        return user_id
+
+    def _signing_key(self, token):
+        if self.jwks is not None:
+            header = jwt.get_unverified_header(token)
+            kid = header.get('kid')
+            if kid:
+                try:
+                    signing_key = self.jwks[kid]
+                except KeyError:
+                    if not self.jwt_secret:
+                        raise TokenUnverifiable(f"No local key for kid {kid}")
+                else:
+                    algorithm = self.jwk_algorithms.get(kid) or DEFAULT_ALGORITHMS.get(signing_key.key_type)
+                    return signing_key.key, [algorithm]
+        if self.jwt_secret:
+            return self.jwt_secret, ['HS256']
+        raise TokenUnverifiable('Token has no key id matching the local key set')
+
+    def _verify_locally(self, token):
+        key, algorithms = self._signing_key(token)
+        claims = jwt.decode(
+            token,
+            key,
+            algorithms=algorithms,
+            audience=self.audience,
+            leeway=self.leeway,
+            options={'require': ['exp', 'sub']},
+        )
+        return claims.get('sub'), claims.get('exp')
+
+    def _verify_remotely(self, token):
+        user_response = resilience.auth_read('user', 'get_user', lambda: self.supabase.auth.get_user(token))
+        user = user_response.user
+        if not user:
+            raise ValueError('User not found for this token')
+        # The server has vouched for the token, so its unverified exp is safe to use as a cache bound
+        try:
+            exp = jwt.decode(token, options={'verify_signature': False}).get('exp')
+        except jwt.PyJWTError:
+            exp = None
+        return user.id, exp
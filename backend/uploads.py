@@ -0,0 +1,160 @@
+import multiprocessing
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from flask import Blueprint, request, jsonify, send_from_directory
+from auth import token_required
+import images
+from storage import storage_from_env
+
+uploads_bp = Blueprint('uploads', __name__)
+
+UPLOAD_MAX_BYTES = int(os.getenv('UPLOAD_MAX_BYTES', 10 * 1024 * 1024))
+UPLOAD_CHUNK_SIZE = 64 * 1024
+UPLOAD_WORKERS = int(os.getenv('UPLOAD_WORKERS', 2))
+
+storage = None
+_pool = None
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+def init_uploads():
+    """Set up the storage backend and the process pool that thumbnails uploads.
+
+    Call this before anything starts threads: the workers are forked here, up front,
+    so they never inherit a lock held by another thread.
+    """
+    global storage
+    storage = storage_from_env()
+    _start_pool()
+
+
+def _start_pool():
+    global _pool
+    # Spawned workers would import app.py again (clients, index loaders), so fork where possible
+    method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn'
+    _pool = ProcessPoolExecutor(max_workers=UPLOAD_WORKERS, mp_context=multiprocessing.get_context(method))
+    # Forked pools start every worker on the first task
+    _pool.submit(int).result()
+
+
+def _submit(*args):
+    global _pool
+    try:
+        return _pool.submit(images.process_upload, *args)
+    except BrokenProcessPool:
+        # A worker died (e.g. killed for memory). Forking a new pool now could copy a lock held
+        # by a request thread, and spawning one would re-import app.py, so process uploads on
+        # threads in this process until it is restarted rather than failing every upload
+        print("ERROR: upload process pool broke, processing uploads in-process from now on")
+        _pool = ThreadPoolExecutor(max_workers=UPLOAD_WORKERS, thread_name_prefix='upload')
+        return _pool.submit(images.process_upload, *args)
+
+
+def _keys(upload_id, image_format):
+    _, extension = images.FORMATS[image_format]
+    return f'incoming/{upload_id}', f'images/{upload_id}.{extension}', f'thumbs/{upload_id}.jpg'
+
+
+def _chunks(stream, first_chunk):
+    """Read the body in fixed-size chunks, enforcing UPLOAD_MAX_BYTES as it arrives."""
+    size = len(first_chunk)
+    yield first_chunk
+    while True:
+        chunk = stream.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            return
+        size += len(chunk)
+        if size > UPLOAD_MAX_BYTES:
+            raise UploadTooLarge()
+        yield chunk
+
+
+def _processing_done(incoming_key):
+    def callback(future):
+        error = future.exception()
+        if error is not None:
+            print(f"ERROR processing upload {incoming_key}: {error}")
+            # A crashed worker may not have cleaned up; without the file the upload reads as failed
+            storage.delete(incoming_key)
+    return callback
+
+
+@uploads_bp.route('/', methods=['POST'])
+@token_required
+def upload_image():
+    """Upload one photo for an issue report
+
+    The body is the raw image (or a multipart form with a `file` field). It is streamed to
+    storage in chunks rather than held in memory; the EXIF-stripped original and a thumbnail
+    are then written in the background. Pass the returned URLs as `image_url`/`thumbnail_url`
+    when reporting the issue.
+    """
+    try:
+        if request.content_length is not None and request.content_length > UPLOAD_MAX_BYTES:
+            return jsonify({'message': f'Image must be at most {UPLOAD_MAX_BYTES} bytes'}), 413
+
+        # Werkzeug spools multipart files to disk, so either way the body is never fully in memory
+        stream = request.files['file'].stream if 'file' in request.files else request.stream
+        first_chunk = stream.read(UPLOAD_CHUNK_SIZE)
+        image_format = images.sniff(first_chunk)
+        if image_format is None:
+            return jsonify({'message': 'Only JPEG, PNG and WebP images can be uploaded'}), 415
+
+        upload_id = uuid.uuid4().hex
+        incoming_key, original_key, thumbnail_key = _keys(upload_id, image_format)
+        try:
+            size = storage.save(incoming_key, _chunks(stream, first_chunk))
+        except UploadTooLarge:
+            return jsonify({'message': f'Image must be at most {UPLOAD_MAX_BYTES} bytes'}), 413
+
+        future = _submit(storage, incoming_key, original_key, thumbnail_key, image_format)
+        future.add_done_callback(_processing_done(incoming_key))
+
+        return jsonify({
+            'message': 'Upload received, processing',
+            'id': upload_id,
+            'status': 'processing',
+            'size': size,
+            'image_url': storage.url(original_key),
+            'thumbnail_url': storage.url(thumbnail_key),
+        }), 202
+
+    except Exception as e:
+        print(f"ERROR in upload_image: {e}")
+        return jsonify({'message': 'Failed to upload image', 'error': str(e)}), 500
+
+
+@uploads_bp.route('/<upload_id>', methods=['GET'])
+@token_required
+def upload_status(upload_id):
+    """Whether an upload's thumbnail and original are ready yet"""
+    try:
+        if len(upload_id) != 32 or not all(c in '0123456789abcdef' for c in upload_id):
+            return jsonify({'message': 'Invalid upload id'}), 400
+        # The thumbnail is written last, so it existing means the upload is complete
+        if storage.exists(f'thumbs/{upload_id}.jpg'):
+            status = 'ready'
+        elif storage.exists(f'incoming/{upload_id}'):
+            status = 'processing'
+        else:
+            status = 'failed'
+        return jsonify({'id': upload_id, 'status': status}), 200
+
+    except Exception as e:
+        print(f"ERROR in upload_status: {e}")
+        return jsonify({'message': 'Failed to get upload status', 'error': str(e)}), 500
+
+
+@uploads_bp.route('/files/<path:key>', methods=['GET'])
+def uploaded_file(key):
+    """Serve processed images when they are kept on the local filesystem"""
+    if not (key.startswith('images/') or key.startswith('thumbs/')):
+        return jsonify({'message': 'File not found'}), 404
+    # Names are random and never change, so browsers and CDNs can keep them
+    return send_from_directory(storage.directory(), key, max_age=31536000)
@@ -0,0 +1,497 @@
+import glob
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import jwt
+from postgrest.exceptions import APIError
+
+import admission
+import clients
+import metrics
+
+try:
+    import fcntl
+except ImportError:  # No advisory locks (Windows): a single process owns the queue directory
+    fcntl = None
+
+# Write-behind mode: new issues and comments are journaled to local disk, acknowledged with a 202
+# and a provisional id, and written to Supabase in multi-row batches by background workers.
+ENABLED = os.getenv('WRITE_BEHIND', 'false').lower() == 'true'
+QUEUE_DIR = os.getenv('WRITE_QUEUE_DIR', 'write_queue')
+# fsync each accepted write before acknowledging it (off trades durability on power loss for latency)
+FSYNC = os.getenv('WRITE_QUEUE_FSYNC', 'true').lower() == 'true'
+MAX_PENDING = int(os.getenv('WRITE_QUEUE_MAX_PENDING', 10000))
+
+# A batch is flushed once BATCH_SIZE writes are due or the oldest has waited FLUSH_INTERVAL_MS
+BATCH_SIZE = int(os.getenv('WRITE_QUEUE_BATCH_SIZE', 100))
+FLUSH_INTERVAL = float(os.getenv('WRITE_QUEUE_FLUSH_INTERVAL_MS', 200)) / 1000
+WORKERS = int(os.getenv('WRITE_QUEUE_WORKERS', 4))
+
+# Failed flushes are retried after RETRY_BASE * 2**attempt (half of it jittered), capped at RETRY_MAX
+RETRY_BASE = float(os.getenv('WRITE_QUEUE_RETRY_BASE_MS', 500)) / 1000
+RETRY_MAX = float(os.getenv('WRITE_QUEUE_RETRY_MAX_SECONDS', 60))
+
+# How long (and for how many writes) the outcome of a flushed write can be looked up, and how
+# many finished records the journal may collect before it is rewritten without the expired ones
+RESULT_TTL = int(os.getenv('WRITE_QUEUE_RESULT_TTL', 3600))
+MAX_RESULTS = int(os.getenv('WRITE_QUEUE_MAX_RESULTS', 100000))
+COMPACT_AFTER = int(os.getenv('WRITE_QUEUE_COMPACT_AFTER', 1000))
+
+TABLES = {'issue': 'issues', 'comment': 'issue_comments'}
+# Lifetime of the token a batch is written with
+FLUSH_TOKEN_LIFETIME = 300
+
+
+def _opener(path, flags):
+    # Queued records carry users' unpublished reports
+    return os.open(path, flags, 0o600)
+
+
+def _read_records(path):
+    """The records in a journal file; a line cut short by a crash mid-append is skipped."""
+    records = []
+    try:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+    except FileNotFoundError:
+        pass
+    return records
+
+
+class Journal:
+    """An append-only file of queue records, one JSON object per line.
+
+    `queued` records are written (and fsynced) before a write is acknowledged; `written` and
+    `failed` records close them. Replaying the file rebuilds the queue after a restart.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'a', encoding='utf-8', opener=_opener)
+
+    def append(self, records, sync=False):
+        self._file.write(''.join(json.dumps(record, separators=(',', ':')) + '\n' for record in records))
+        self._file.flush()
+        if sync:
+            os.fsync(self._file.fileno())
+
+    def rewrite(self, records):
+        """Atomically replace the file with `records`."""
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8', opener=_opener) as f:
+            f.write(''.join(json.dumps(record, separators=(',', ':')) + '\n' for record in records))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+        _sync_directory(os.path.dirname(self.path))
+        self._file.close()
+        self._file = open(self.path, 'a', encoding='utf-8', opener=_opener)
+
+
+def _sync_directory(path):
+    if hasattr(os, 'O_DIRECTORY'):
+        fd = os.open(path or '.', os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass  # Another process adopted it first
+
+
+class QueuedWrite:
+    """A journaled write waiting to be flushed, with its retry state."""
+
+    def __init__(self, record):
+        self.record = record
+        self.attempts = 0
+        self.due_at = time.monotonic()
+        self.last_error = None
+        self.in_flight = False
+        self.solo = False  # retried on its own after its batch was rejected
+
+    @property
+    def id(self):
+        return self.record['id']
+
+    def group_key(self):
+        record = self.record
+        return record['kind'], record['user_id'], record['id'] if self.solo else None
+
+
+def _journal_records(path, queue_id):
+    """The records in a journal file that concern `queue_id`."""
+    records = []
+    try:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                # Most lines are about other writes; skip them without parsing
+                if queue_id not in line:
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+    except FileNotFoundError:
+        pass
+    return [record for record in records if record.get('id') == queue_id]
+
+
+def _classify(error):
+    """'permanent' if the rows were rejected, otherwise 'transient'."""
+    if isinstance(error, APIError):
+        code = str(error.code or '')
+        # Invalid data (22), constraint and permission violations (23, 42) and malformed requests
+        if code[:2] in ('22', '23', '42') or code.startswith(('PGRST1', 'PGRST2')):
+            return 'permanent'
+    return 'transient'
+
+
+class WriteQueue:
+    """Journaled writes, flushed in batches per (kind, user) by a pool of workers.
+
+    Each batch is written as its user, with a short-lived token signed with the project's JWT
+    secret when the batch is flushed, so the RLS INSERT policies decide as they would for a
+    direct write. No access token is kept in the journal (a write may also outlive the one it
+    was accepted with, e.g. through a long outage).
+    Each row carries an idempotency key, so replaying a batch whose outcome was not journaled
+    before a crash cannot insert it twice.
+    """
+
+    def __init__(self, directory, batch_size=100, flush_interval=0.2, workers=4, max_pending=10000,
+                 jwt_secret=None, jwt_audience='authenticated'):
+        self.directory = directory
+        self.jwt_secret = jwt_secret
+        self.jwt_audience = jwt_audience
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.pending = OrderedDict()  # id -> QueuedWrite
+        self.results = OrderedDict()  # id -> `written`/`failed` record, oldest first
+        self.handlers = {}  # kind -> callable(row), run for each newly written row
+        self.journal = None
+        self._finished = 0  # outcomes appended since the journal was last rewritten
+        self._compact_after = COMPACT_AFTER
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='write-queue')
+        # Lock order: _journal_lock, then _condition
+        self._journal_lock = threading.Lock()
+        self._condition = threading.Condition()
+
+    # --- startup ---
+    def start(self):
+        """Take over the journals of processes that have exited, then start flushing."""
+        os.makedirs(self.directory, exist_ok=True)
+        owner = uuid.uuid4().hex if fcntl else 'local'
+        self._owner = owner
+        self._lock_file = self._lock(owner)
+        records = []
+        adopted = []
+        for lock_path in sorted(glob.glob(os.path.join(self.directory, 'journal-*.lock'))):
+            other = os.path.basename(lock_path)[len('journal-'):-len('.lock')]
+            lock_file = self._lock(other, blocking=False) if other != owner else None
+            if other != owner and lock_file is None:
+                continue  # A live process owns it
+            records.extend(_read_records(self._journal_path(other)))
+            adopted.append((other, lock_file))
+
+        self._restore(records)
+        self.journal = Journal(self._journal_path(owner))
+        with self._journal_lock:
+            self._compact()
+        for other, lock_file in adopted:
+            if other == owner:
+                continue
+            # Its records are safely in our journal now
+            _remove_quietly(self._journal_path(other))
+            _remove_quietly(os.path.join(self.directory, f'journal-{other}.lock'))
+            lock_file.close()
+        if self.pending:
+            print(f"Write queue: replaying {len(self.pending)} writes from the journal")
+        threading.Thread(target=self._run, name='write-queue', daemon=True).start()
+
+    def _journal_path(self, owner):
+        return os.path.join(self.directory, f'journal-{owner}.log')
+
+    def _lock(self, owner, blocking=True):
+        """Hold journal-<owner>.lock for as long as the returned file stays open (None if taken)."""
+        lock_file = open(os.path.join(self.directory, f'journal-{owner}.lock'), 'a')
+        if fcntl is None:
+            return lock_file
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            lock_file.close()
+            return None
+        return lock_file
+
+    def _restore(self, records):
+        for record in records:
+            if record['op'] == 'queued':
+                self.pending[record['id']] = QueuedWrite(record)
+            elif record['id'] in self.pending:
+                del self.pending[record['id']]
+                self.results[record['id']] = record
+            else:
+                self.results[record['id']] = record
+        for entry in self.pending.values():
+            metrics.WRITE_QUEUE_PENDING.inc(entry.record['kind'])
+
+    def _compact(self):
+        """Rewrite the journal with just the pending writes and recent results."""
+        self._prune_results()
+        with self._condition:
+            records = [entry.record for entry in self.pending.values()] + list(self.results.values())
+        self.journal.rewrite(records)
+        self._finished = 0
+        # Rewriting costs as much as the records kept, so let at least as many accumulate first
+        self._compact_after = max(COMPACT_AFTER, len(records))
+
+    def _prune_results(self):
+        cutoff = time.time() - RESULT_TTL
+        with self._condition:
+            while self.results and (len(self.results) > MAX_RESULTS
+                                    or next(iter(self.results.values()))['at'] < cutoff):
+                self.results.popitem(last=False)
+
+    @property
+    def running(self):
+        return self.journal is not None
+
+    # --- accepting writes ---
+    def enqueue(self, kind, user_id, row):
+        """Journal a row for `kind`'s table and return its provisional id.
+
+        The row is durable once this returns. Raises UpstreamOverloaded (reported as a 503)
+        when MAX_PENDING writes are already waiting.
+        """
+        queue_id = uuid.uuid4().hex
+        record = {
+            'op': 'queued', 'id': queue_id, 'kind': kind, 'user_id': user_id,
+            'row': {**row, 'idempotency_key': row.get('idempotency_key') or queue_id},
+            'at': time.time(),
+        }
+        with self._journal_lock:
+            if len(self.pending) >= self.max_pending:
+                admission.note_unavailable('write_queue_full', admission.RETRY_AFTER)
+                raise admission.UpstreamOverloaded('Write queue is full')
+            self.journal.append([record], sync=FSYNC)
+            with self._condition:
+                self.pending[queue_id] = QueuedWrite(record)
+                self._condition.notify()
+        metrics.WRITE_QUEUE_PENDING.inc(kind)
+        return queue_id
+
+    def status(self, queue_id, user_id, db=None):
+        """The state of one of the user's queued writes, or None if there is no such write.
+
+        Writes accepted by other processes are found in their journals; with `db` (a client for
+        the user), one whose outcome is no longer journaled (e.g. after a restart) is found in
+        its table by idempotency key.
+        """
+        with self._condition:
+            entry = self.pending.get(queue_id)
+            result = self.results.get(queue_id)
+        if entry is not None and entry.record['user_id'] == user_id:
+            return {'id': queue_id, 'kind': entry.record['kind'], 'status': 'queued',
+                    'attempts': entry.attempts, 'last_error': entry.last_error}
+        if entry is None and result is None:
+            entry, result = self._find_elsewhere(queue_id)
+            if entry is not None and entry['user_id'] == user_id:
+                return {'id': queue_id, 'kind': entry['kind'], 'status': 'queued'}
+        if result is None and db is not None:
+            result = self._find_written(db, queue_id, user_id)
+        if result is not None and result['user_id'] == user_id and result['at'] >= time.time() - RESULT_TTL:
+            status = {'id': queue_id, 'kind': result['kind'], 'status': result['op']}
+            if result['op'] == 'written':
+                status[result['kind']] = result['row']
+            else:
+                status['error'] = result['error']
+            return status
+        return None
+
+    def _find_elsewhere(self, queue_id):
+        """(queued record, outcome record) for a write in another process's journal."""
+        queued = result = None
+        for path in glob.glob(os.path.join(self.directory, 'journal-*.log')):
+            if path == self._journal_path(self._owner):
+                continue
+            for record in _journal_records(path, queue_id):
+                if record['op'] == 'queued':
+                    queued = record
+                else:
+                    result = record
+        return (None, result) if result is not None else (queued, None)
+
+    @staticmethod
+    def _find_written(db, queue_id, user_id):
+        """A `written` record for a row found in its table by idempotency key."""
+        for kind, table in TABLES.items():
+            found = db.table(table).select('*').eq('user_id', user_id).eq('idempotency_key', queue_id).limit(1).execute()
+            if found.data:
+                return {'op': 'written', 'id': queue_id, 'kind': kind, 'user_id': user_id,
+                        'row': found.data[0], 'at': time.time()}
+        return None
+
+    # --- flushing ---
+    def _next_batch(self):
+        """Wait for a batch to be due, mark it in flight and group it for writing."""
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                due, next_due = [], None
+                for entry in self.pending.values():
+                    if entry.in_flight:
+                        continue
+                    if entry.due_at <= now:
+                        due.append(entry)
+                    elif next_due is None or entry.due_at < next_due:
+                        next_due = entry.due_at
+                if due:
+                    oldest = min(entry.due_at for entry in due)
+                    if len(due) >= self.batch_size or now - oldest >= self.flush_interval:
+                        break
+                    next_due = oldest + self.flush_interval
+                self._condition.wait(None if next_due is None else max(next_due - now, 0.001))
+            groups = OrderedDict()
+            for entry in due[:self.batch_size]:
+                entry.in_flight = True
+                groups.setdefault(entry.group_key(), []).append(entry)
+        return groups
+
+    def _run(self):
+        while True:
+            groups = self._next_batch()
+            futures = [self._executor.submit(self._flush, key[0], key[1], entries)
+                       for key, entries in groups.items()]
+            for (kind, _, _), entries, future in zip(groups, groups.values(), futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    # e.g. the journal could not be written; the rows are found by key on the retry
+                    self._flush_failed(kind, entries, e)
+
+    def _user_token(self, user_id):
+        """A short-lived access token for `user_id`, as Supabase Auth would issue one."""
+        now = int(time.time())
+        return jwt.encode({'sub': user_id, 'role': 'authenticated', 'aud': self.jwt_audience,
+                           'iat': now, 'exp': now + FLUSH_TOKEN_LIFETIME}, self.jwt_secret, algorithm='HS256')
+
+    def _flush(self, kind, user_id, entries):
+        try:
+            rows, created = self._write(clients.for_token(self._user_token(user_id)), kind, user_id, entries)
+        except Exception as e:
+            self._flush_failed(kind, entries, e)
+            return
+
+        written, failed = [], []
+        for entry in entries:
+            row = rows.get(entry.record['row']['idempotency_key'])
+            if row is None:
+                failed.append((entry, 'Failed to insert. Check RLS policies.'))
+            else:
+                written.append((entry, row))
+        self._finish(written, failed)
+
+        handler = self.handlers.get(kind)
+        for entry, row in written:
+            if handler and row['idempotency_key'] in created:
+                try:
+                    handler(row)
+                except Exception as e:
+                    print(f"ERROR in write queue {kind} handler: {e}")
+
+    def _write(self, db, kind, user_id, entries):
+        """One multi-row insert; rows already written by an earlier attempt are fetched instead."""
+        table = TABLES[kind]
+        inserted = db.table(table).upsert(
+            [entry.record['row'] for entry in entries], on_conflict='user_id,idempotency_key', ignore_duplicates=True
+        ).execute()
+        rows = {row['idempotency_key']: row for row in inserted.data or []}
+        created = set(rows)
+        missing = [entry.record['row']['idempotency_key'] for entry in entries
+                   if entry.record['row']['idempotency_key'] not in rows]
+        if missing:
+            found = db.table(table).select('*').eq('user_id', user_id).in_('idempotency_key', missing).execute()
+            rows.update((row['idempotency_key'], row) for row in found.data or [])
+        return rows, created
+
+    def _flush_failed(self, kind, entries, error):
+        reason = _classify(error)
+        if reason == 'permanent' and len(entries) == 1:
+            print(f"ERROR flushing queued {kind} {entries[0].id}: {error}")
+            self._finish([], [(entries[0], str(error))])
+            return
+        if reason == 'transient':
+            print(f"ERROR flushing {len(entries)} queued {kind} writes, will retry: {error}")
+            metrics.WRITE_QUEUE_FLUSHED.inc(kind, 'retried', amount=len(entries))
+        with self._condition:
+            now = time.monotonic()
+            for entry in entries:
+                entry.in_flight = False
+                entry.last_error = str(error)
+                if reason == 'permanent':
+                    # Retry each row alone right away, so one bad row does not fail its batch
+                    entry.solo = True
+                else:
+                    delay = min(RETRY_MAX, RETRY_BASE * 2 ** entry.attempts)
+                    entry.attempts += 1
+                    entry.due_at = now + delay / 2 + random.uniform(0, delay / 2)
+            self._condition.notify()
+
+    def _finish(self, written, failed):
+        """Journal the outcomes, then drop the writes from the queue."""
+        now = time.time()
+        records = [{'op': 'written', 'id': entry.id, 'kind': entry.record['kind'],
+                    'user_id': entry.record['user_id'], 'row': row, 'at': now} for entry, row in written]
+        records += [{'op': 'failed', 'id': entry.id, 'kind': entry.record['kind'],
+                     'user_id': entry.record['user_id'], 'error': error, 'at': now} for entry, error in failed]
+        if not records:
+            return
+        with self._journal_lock:
+            # Not fsynced: if these are lost, the rows are found by idempotency key on replay
+            self.journal.append(records)
+            with self._condition:
+                for record in records:
+                    self.pending.pop(record['id'], None)
+                    self.results[record['id']] = record
+            self._finished += len(records)
+            if self._finished >= self._compact_after:
+                self._compact()
+            else:
+                self._prune_results()
+        for record in records:
+            metrics.WRITE_QUEUE_PENDING.dec(record['kind'])
+            metrics.WRITE_QUEUE_FLUSHED.inc(record['kind'], record['op'])
+
+
+write_queue = WriteQueue(QUEUE_DIR, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL, workers=WORKERS,
+                         max_pending=MAX_PENDING, jwt_audience=os.getenv('SUPABASE_JWT_AUDIENCE', 'authenticated'))
+
+
+def init_write_queue(jwt_secret=None):
+    """Replay the journal and start the flush workers (when WRITE_BEHIND is set).
+
+    Flushes are made as each write's user, so this needs the project's JWT secret.
+    """
+    if not ENABLED:
+        return
+    if not jwt_secret:
+        print("ERROR: WRITE_BEHIND needs SUPABASE_JWT_SECRET to write as each user; writes stay synchronous")
+        return
+    write_queue.jwt_secret = jwt_secret
+    write_queue.start()
@@ -201,7 +201,7 @@ const Dashboard = () => {
                     {/* Show first image if available */}
                     {issue.image_url?.length > 0 && (
                       <img
-                        src={issue.image_url[0]}
+                        src={issue.thumbnail_url?.[0] || issue.image_url[0]}
                         alt="Issue"
                         className="w-32 h-32 object-cover rounded-lg mt-2"
                       />
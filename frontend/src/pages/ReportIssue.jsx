@@ -150,8 +150,12 @@ const ReportIssue = () => {
       if (!response.ok) {
         throw new Error(result.message || 'An unknown error occurred.');
       }
-      
-      setNewIssueId(result.issue.id);
+
+      // 202: the server queued the report (write-behind mode) and has no issue id for it yet
+      const issueId = response.status === 202
+        ? await waitForQueuedIssue(result.queue_id)
+        : result.issue.id;
+      setNewIssueId(issueId);
       setCurrentStep(5);
     } catch (error) {
       console.error('Submission error:', error);
@@ -162,6 +166,27 @@ const ReportIssue = () => {
     }
   };
   
+    // Poll a queued report until it has been written; null if it is still queued after a few seconds
+  const waitForQueuedIssue = async (queueId) => {
+    for (let attempt = 0; attempt < 10; attempt++) {
+      await new Promise((resolve) => setTimeout(resolve, 500));
+      const response = await fetch(`http://localhost:5000/api/issues/queued/${queueId}`, {
+        headers: { 'Authorization': `Bearer ${token}` }
+      });
+      if (!response.ok) {
+        continue;
+      }
+      const status = await response.json();
+      if (status.status === 'written') {
+        return status.issue.id;
+      }
+      if (status.status === 'failed') {
+        throw new Error(status.error || 'Your report could not be saved.');
+      }
+    }
+    return null;
+  };
+
     const renderStepIndicator = () => (
     <div className="flex items-center justify-center mb-8">
       {[1, 2, 3, 4, 5].map((step) => (
@@ -447,7 +472,9 @@ const ReportIssue = () => {
       </div>
       <h2 className="text-2xl font-bold text-gray-900 mb-4">Report Submitted Successfully!</h2>
       <p className="text-gray-600 mb-6">
-        Your issue has been assigned ID: <span className="font-semibold text-blue-600">#{newIssueId}</span>
+        {newIssueId
+          ? <>Your issue has been assigned ID: <span className="font-semibold text-blue-600">#{newIssueId}</span></>
+          : 'Your report has been received and will be assigned an ID shortly.'}
       </p>
       <div className="bg-gray-50 rounded-lg p-4 mb-6">
         <h3 className="font-semibold text-gray-900 mb-2">Next Steps:</h3>